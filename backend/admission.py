@@ -0,0 +1,292 @@
+import asyncio
+import logging
+import math
+import os
+import re
+from collections import defaultdict
+from contextlib import asynccontextmanager
+from typing import Callable, Optional
+from urllib.parse import parse_qs
+
+import jwt
+from fastapi import HTTPException
+from starlette.responses import JSONResponse
+
+from ratelimit import TokenBuckets
+
+logger = logging.getLogger(__name__)
+
+# Admission control
+#
+# Every request is put in a route class. Each class has a concurrency limit
+# (requests wait up to `max_wait` for a slot, then get 503) and a token
+# bucket per user (or client IP for anonymous calls) that answers 429 once
+# exhausted. An event-loop lag monitor sheds low-priority work (search and
+# deep pagination) with 503 while the loop is running behind. Rejections
+# always carry Retry-After.
+#
+# Anonymous clients are keyed by the peer address. Behind a reverse proxy,
+# set TRUST_FORWARDED_FOR and FORWARDED_FOR_HOPS to the number of proxies
+# that append to X-Forwarded-For; the client is the entry that many places
+# from the right, since everything to its left is whatever the client sent.
+
+ADMISSION_ENABLED = os.environ.get('ADMISSION_ENABLED', 'true').lower() == 'true'
+TRUST_FORWARDED_FOR = os.environ.get('TRUST_FORWARDED_FOR', 'false').lower() == 'true'
+FORWARDED_FOR_HOPS = int(os.environ.get('FORWARDED_FOR_HOPS', '1'))
+LAG_SHED_THRESHOLD = float(os.environ.get('LAG_SHED_THRESHOLD', '0.2'))
+DEEP_SKIP = int(os.environ.get('DEEP_SKIP', '500'))
+
+
+class RouteClass:
+    def __init__(self, name: str, concurrency: int, max_wait: float, rate: float, burst: int):
+        self.name = name
+        self.concurrency = concurrency
+        self.max_wait = max_wait
+        self.rate = rate
+        self.burst = burst
+
+
+ROUTE_CLASSES = {
+    # bcrypt makes these CPU-bound; keep few in flight and rate-limit hard
+    "auth": RouteClass("auth", concurrency=4, max_wait=2.0, rate=0.2, burst=5),
+    "search": RouteClass("search", concurrency=8, max_wait=0.5, rate=2, burst=10),
+    "feed": RouteClass("feed", concurrency=32, max_wait=1.0, rate=10, burst=40),
+    "write": RouteClass("write", concurrency=32, max_wait=1.0, rate=5, burst=20),
+    # Sign-up form checks while typing; kept apart so they never spend the auth budget
+    "availability": RouteClass("availability", concurrency=16, max_wait=0.5, rate=2, burst=20),
+    # Poster cache misses: a database read and possibly a render each
+    "posters": RouteClass("posters", concurrency=16, max_wait=0.5, rate=10, burst=60),
+    "default": RouteClass("default", concurrency=64, max_wait=1.0, rate=20, burst=60),
+}
+
+FEED_PATHS = re.compile(r"^/api/(animations(/following|/trending)?|users/[^/]+/animations)$")
+UNLIMITED_PATHS = {"/api/stream", "/metrics", "/healthz", "/readyz"}
+# Posters are immutable and content-hashed, so cache hits skip admission;
+# the route admits its misses under the "posters" class (see guard()).
+UNLIMITED_PREFIXES = ("/api/posters/",)
+# A sampling run would hold a slot for its whole duration, and must still
+# start when the server is overloaded; only verified admins skip admission.
+ADMIN_UNLIMITED_PATHS = {"/api/admin/profiles/sample"}
+
+
+def classify(method: str, path: str, query: dict):
+    """Return (route class name, low priority) for a request."""
+    if path in ("/api/auth/register", "/api/auth/login"):
+        return "auth", False
+    if path == "/api/auth/available":
+        return "availability", False
+    if path == "/api/users/search":
+        return "search", True
+    if method == "GET" and FEED_PATHS.match(path):
+        try:
+            skip = int(query.get("skip", ["0"])[0])
+        except ValueError:
+            skip = 0
+        return "feed", skip > DEEP_SKIP
+    if method in ("POST", "PUT", "PATCH", "DELETE"):
+        return "write", False
+    return "default", False
+
+
+class Overloaded(Exception):
+    def __init__(self, status_code: int, detail: str, retry_after: float):
+        self.status_code = status_code
+        self.detail = detail
+        self.retry_after = retry_after
+
+
+class ConcurrencyLimiter:
+    def __init__(self, limit: int, max_wait: float):
+        self.limit = limit
+        self.max_wait = max_wait
+        self._semaphore = asyncio.Semaphore(limit)
+        self.in_flight = 0
+        self.waiting = 0
+
+    async def acquire(self):
+        self.waiting += 1
+        try:
+            await asyncio.wait_for(self._semaphore.acquire(), self.max_wait)
+        except asyncio.TimeoutError:
+            raise Overloaded(503, "Server busy", retry_after=1)
+        finally:
+            self.waiting -= 1
+        self.in_flight += 1
+
+    def release(self):
+        self.in_flight -= 1
+        self._semaphore.release()
+
+
+class LoopLagMonitor:
+    def __init__(self, interval: float = 0.1):
+        self.interval = interval
+        self.lag = 0.0
+        self.max_lag = 0.0
+        self._task: Optional[asyncio.Task] = None
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            started = loop.time()
+            await asyncio.sleep(self.interval)
+            lag = max(0.0, loop.time() - started - self.interval)
+            # Rise immediately, decay smoothly
+            self.lag = lag if lag > self.lag else self.lag * 0.8 + lag * 0.2
+            self.max_lag = max(self.max_lag, lag)
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+
+def forwarded_client(scope, hops: int = FORWARDED_FOR_HOPS) -> Optional[str]:
+    """The X-Forwarded-For entry `hops` from the right, or None if there are fewer."""
+    entries = [
+        entry.strip()
+        for name, value in scope.get("headers", ()) if name == b"x-forwarded-for"
+        for entry in value.decode("latin-1").split(",")
+    ]
+    if hops < 1 or len(entries) < hops:
+        return None
+    return entries[-hops] or None
+
+
+class AdmissionController:
+    def __init__(self, secret_key: str, algorithm: str, enabled: bool = ADMISSION_ENABLED,
+                 trust_forwarded_for: bool = TRUST_FORWARDED_FOR,
+                 is_admin: Optional[Callable[[Optional[str]], bool]] = None):
+        self.secret_key = secret_key
+        self.algorithm = algorithm
+        self.enabled = enabled
+        self.trust_forwarded_for = trust_forwarded_for
+        self.is_admin = is_admin
+        self.lag_monitor = LoopLagMonitor()
+        self.limiters = {name: ConcurrencyLimiter(rc.concurrency, rc.max_wait) for name, rc in ROUTE_CLASSES.items()}
+        self.buckets = {name: TokenBuckets(rc.rate, rc.burst) for name, rc in ROUTE_CLASSES.items()}
+        self.admitted = defaultdict(int)
+        self.rejected = defaultdict(int)
+
+    def client_key(self, scope, query: dict) -> str:
+        token = query.get("token", [None])[0]
+        if token:
+            try:
+                payload = jwt.decode(token, self.secret_key, algorithms=[self.algorithm])
+                return f"user:{payload.get('user_id')}"
+            except jwt.InvalidTokenError:
+                pass
+        if self.trust_forwarded_for:
+            forwarded = forwarded_client(scope)
+            if forwarded:
+                return f"ip:{forwarded}"
+        client = scope.get("client")
+        return f"ip:{client[0] if client else 'unknown'}"
+
+    def exempt(self, scope) -> bool:
+        path = scope["path"]
+        if scope["method"] == "OPTIONS" or path in UNLIMITED_PATHS or path.startswith(UNLIMITED_PREFIXES):
+            return True
+        if path in ADMIN_UNLIMITED_PATHS and self.is_admin is not None:
+            query = parse_qs(scope.get("query_string", b"").decode("latin-1"))
+            return self.is_admin(query.get("token", [None])[0])
+        return False
+
+    async def admit(self, scope, route_class: Optional[str] = None) -> str:
+        """Admit a request or raise Overloaded; returns the route class to release."""
+        query = parse_qs(scope.get("query_string", b"").decode("latin-1"))
+        if route_class is None:
+            route_class, low_priority = classify(scope["method"], scope["path"], query)
+        else:
+            low_priority = False
+
+        if low_priority and self.lag_monitor.lag > LAG_SHED_THRESHOLD:
+            self.rejected[(route_class, "shed")] += 1
+            raise Overloaded(503, "Server busy, try again shortly", retry_after=max(1, math.ceil(self.lag_monitor.lag * 5)))
+
+        wait = self.buckets[route_class].take(f"{route_class}:{self.client_key(scope, query)}")
+        if wait:
+            self.rejected[(route_class, "rate_limited")] += 1
+            raise Overloaded(429, "Too many requests", retry_after=max(1, math.ceil(wait)))
+
+        try:
+            await self.limiters[route_class].acquire()
+        except Overloaded:
+            self.rejected[(route_class, "concurrency")] += 1
+            raise
+        self.admitted[route_class] += 1
+        return route_class
+
+    def release(self, route_class: str):
+        self.limiters[route_class].release()
+
+    @asynccontextmanager
+    async def guard(self, scope, route_class: str):
+        """Admission inside a route, for work past a fast path the middleware lets through."""
+        if not self.enabled:
+            yield
+            return
+        try:
+            route_class = await self.admit(scope, route_class)
+        except Overloaded as exc:
+            raise HTTPException(status_code=exc.status_code, detail=exc.detail,
+                                headers={"Retry-After": str(int(exc.retry_after))})
+        try:
+            yield
+        finally:
+            self.release(route_class)
+
+    def metrics(self) -> str:
+        lines = [
+            "# TYPE event_loop_lag_seconds gauge",
+            f"event_loop_lag_seconds {self.lag_monitor.lag:.6f}",
+            "# TYPE event_loop_lag_max_seconds gauge",
+            f"event_loop_lag_max_seconds {self.lag_monitor.max_lag:.6f}",
+            "# TYPE admission_in_flight gauge",
+        ]
+        lines += [f'admission_in_flight{{class="{name}"}} {limiter.in_flight}' for name, limiter in self.limiters.items()]
+        lines.append("# TYPE admission_waiting gauge")
+        lines += [f'admission_waiting{{class="{name}"}} {limiter.waiting}' for name, limiter in self.limiters.items()]
+        lines.append("# TYPE admission_concurrency_limit gauge")
+        lines += [f'admission_concurrency_limit{{class="{name}"}} {limiter.limit}' for name, limiter in self.limiters.items()]
+        lines.append("# TYPE admission_rate_limit_keys gauge")
+        lines += [f'admission_rate_limit_keys{{class="{name}"}} {len(buckets)}' for name, buckets in self.buckets.items()]
+        lines.append("# TYPE admission_admitted_total counter")
+        lines += [f'admission_admitted_total{{class="{name}"}} {count}' for name, count in self.admitted.items()]
+        lines.append("# TYPE admission_rejected_total counter")
+        lines += [
+            f'admission_rejected_total{{class="{name}",reason="{reason}"}} {count}'
+            for (name, reason), count in self.rejected.items()
+        ]
+        return "\n".join(lines) + "\n"
+
+
+class AdmissionMiddleware:
+    def __init__(self, app, controller: AdmissionController):
+        self.app = app
+        self.controller = controller
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self.controller.enabled or self.controller.exempt(scope):
+            await self.app(scope, receive, send)
+            return
+
+        try:
+            route_class = await self.controller.admit(scope)
+        except Overloaded as exc:
+            response = JSONResponse(
+                {"detail": exc.detail},
+                status_code=exc.status_code,
+                headers={"Retry-After": str(int(exc.retry_after))}
+            )
+            await response(scope, receive, send)
+            return
+
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.controller.release(route_class)
@@ -0,0 +1,108 @@
+import asyncio
+import hashlib
+import logging
+import math
+import os
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+# Username/email availability
+#
+# A Bloom filter of every taken username and email answers "is this free?"
+# without touching the database when the answer is "definitely free",
+# which is what most inputs typed into the sign-up form get. A "maybe
+# taken" answer is confirmed with an indexed lookup. Each worker builds its
+# own filter at startup, adds the names it registers, and rebuilds every
+# AVAILABILITY_REFRESH seconds to pick up registrations made by other
+# workers. The filter is advisory; the unique indexes on users decide.
+
+AVAILABILITY_REFRESH = int(os.environ.get('AVAILABILITY_REFRESH', '300'))
+FALSE_POSITIVE_RATE = 0.01
+MIN_CAPACITY = 10000
+
+
+class BloomFilter:
+    def __init__(self, capacity: int, error_rate: float = FALSE_POSITIVE_RATE):
+        capacity = max(capacity, 1)
+        self.size = max(8, int(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self._bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def _positions(self, value: str):
+        digest = hashlib.blake2b(value.encode(), digest_size=16).digest()
+        first, second = int.from_bytes(digest[:8], "little"), int.from_bytes(digest[8:], "little") | 1
+        return ((first + i * second) % self.size for i in range(self.hashes))
+
+    def add(self, value: str):
+        for position in self._positions(value):
+            self._bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, value: str) -> bool:
+        return all(self._bits[position >> 3] & (1 << (position & 7)) for position in self._positions(value))
+
+
+def username_key(username: str) -> str:
+    return f"username:{username}"
+
+
+def email_key(email: str) -> str:
+    return f"email:{email}"
+
+
+class TakenNames:
+    def __init__(self, db, refresh_interval: int = AVAILABILITY_REFRESH):
+        self.db = db
+        self.refresh_interval = refresh_interval
+        self._filter: Optional[BloomFilter] = None
+        self._refresher: Optional[asyncio.Task] = None
+        self.db_checks = 0
+        self.filter_answers = 0
+
+    async def rebuild(self) -> int:
+        # Two keys per user, with room for the user count to double before the next rebuild
+        capacity = max(MIN_CAPACITY, 2 * 2 * await self.db.users.estimated_document_count())
+        bloom = BloomFilter(capacity)
+        async for user in self.db.users.find({}, {"_id": 0, "username": 1, "email": 1}).batch_size(5000):
+            bloom.add(username_key(user["username"]))
+            if user.get("email"):
+                bloom.add(email_key(user["email"]))
+        self._filter = bloom
+        return bloom.count
+
+    def add(self, username: str, email: str):
+        if self._filter is not None:
+            self._filter.add(username_key(username))
+            self._filter.add(email_key(email))
+
+    async def _taken(self, key: str, field: str, value: str) -> bool:
+        if self._filter is not None and key not in self._filter:
+            self.filter_answers += 1
+            return False
+        self.db_checks += 1
+        return await self.db.users.find_one({field: value}, {"_id": 1}) is not None
+
+    async def username_taken(self, username: str) -> bool:
+        return await self._taken(username_key(username), "username", username)
+
+    async def email_taken(self, email: str) -> bool:
+        return await self._taken(email_key(email), "email", email)
+
+    async def _refresh_loop(self):
+        while True:
+            await asyncio.sleep(self.refresh_interval)
+            try:
+                await self.rebuild()
+            except Exception:
+                logger.exception("Availability filter rebuild failed")
+
+    def start(self):
+        if self._refresher is None:
+            self._refresher = asyncio.create_task(self._refresh_loop())
+
+    async def stop(self):
+        if self._refresher is not None:
+            self._refresher.cancel()
+            self._refresher = None
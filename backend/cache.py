@@ -0,0 +1,142 @@
+import json
+import os
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Cache backends
+#
+# Every backend stores JSON-encoded values so that cached data behaves the
+# same regardless of where it lives (a worker's memory or a shared Redis).
+# Callers get a fresh decoded copy on every read and can mutate it freely.
+
+def _encode(value) -> str:
+    return json.dumps(value, default=str)
+
+def _decode(raw):
+    return None if raw is None else json.loads(raw)
+
+
+class InMemoryCache:
+    """Per-process TTL cache. Used when no shared backend is configured."""
+
+    def __init__(self, store: dict = None):
+        self._store = {} if store is None else store
+
+    def _alive(self, key):
+        entry = self._store.get(key)
+        if entry is None:
+            return None
+        raw, expires_at = entry
+        if expires_at is not None and expires_at < time.monotonic():
+            self._store.pop(key, None)
+            return None
+        return raw
+
+    async def get(self, key):
+        return _decode(self._alive(key))
+
+    async def get_many(self, keys) -> dict:
+        found = {}
+        for key in keys:
+            raw = self._alive(key)
+            if raw is not None:
+                found[key] = _decode(raw)
+        return found
+
+    async def set(self, key, value, ttl: int = None):
+        expires_at = time.monotonic() + ttl if ttl else None
+        self._store[key] = (_encode(value), expires_at)
+
+    async def set_many(self, mapping: dict, ttl: int = None):
+        for key, value in mapping.items():
+            await self.set(key, value, ttl)
+
+    async def delete(self, *keys):
+        for key in keys:
+            self._store.pop(key, None)
+
+    async def incr(self, key) -> int:
+        value = int(_decode(self._alive(key)) or 0) + 1
+        self._store[key] = (_encode(value), None)
+        return value
+
+    async def close(self):
+        pass
+
+
+class LocalSharedCache(InMemoryCache):
+    """Stand-in for a shared backend: every instance in the process sees one store.
+
+    Lets tests run several app instances (simulated workers) against a common
+    cache without a Redis server.
+    """
+
+    _shared_store: dict = {}
+
+    def __init__(self):
+        super().__init__(store=LocalSharedCache._shared_store)
+
+    @classmethod
+    def reset(cls):
+        cls._shared_store.clear()
+
+
+class RedisCache:
+    """Shared cache backed by Redis; keeps caches coherent across workers."""
+
+    def __init__(self, url: str, prefix: str = "cssanim:"):
+        try:
+            import redis.asyncio as redis
+        except ImportError as exc:
+            raise RuntimeError("CACHE_BACKEND=redis requires the 'redis' package") from exc
+        self._redis = redis.from_url(url)
+        self._prefix = prefix
+
+    def _key(self, key):
+        return self._prefix + key
+
+    async def get(self, key):
+        return _decode(await self._redis.get(self._key(key)))
+
+    async def get_many(self, keys) -> dict:
+        keys = list(keys)
+        if not keys:
+            return {}
+        values = await self._redis.mget([self._key(k) for k in keys])
+        return {k: _decode(v) for k, v in zip(keys, values) if v is not None}
+
+    async def set(self, key, value, ttl: int = None):
+        await self._redis.set(self._key(key), _encode(value), ex=ttl)
+
+    async def set_many(self, mapping: dict, ttl: int = None):
+        if not mapping:
+            return
+        pipe = self._redis.pipeline()
+        for key, value in mapping.items():
+            pipe.set(self._key(key), _encode(value), ex=ttl)
+        await pipe.execute()
+
+    async def delete(self, *keys):
+        if keys:
+            await self._redis.delete(*[self._key(k) for k in keys])
+
+    async def incr(self, key) -> int:
+        return int(await self._redis.incr(self._key(key)))
+
+    async def close(self):
+        await self._redis.close()
+
+
+def create_cache():
+    """Build the cache selected by CACHE_BACKEND (memory, local or redis)."""
+    backend = os.environ.get('CACHE_BACKEND', 'memory').lower()
+    if backend == 'redis':
+        redis_url = os.environ.get('REDIS_URL')
+        if redis_url:
+            return RedisCache(redis_url)
+        logger.warning("CACHE_BACKEND=redis but REDIS_URL is not set; falling back to memory")
+    elif backend == 'local':
+        return LocalSharedCache()
+    return InMemoryCache()
@@ -0,0 +1,302 @@
+import asyncio
+import bisect
+import logging
+import os
+import sys
+import time
+from typing import Optional
+
+from changelog import CATALOG_CHANGES
+from posters import poster_hash
+
+logger = logging.getLogger(__name__)
+
+# In-process catalogue
+#
+# Each worker keeps every hot-tier animation in memory as a __slots__
+# record, with user ids, usernames, profile pictures, categories and shape
+# types interned, so the global and category feeds and single-animation
+# reads never reach MongoDB. Records are kept in lists sorted by
+# (created_at, id), one for everything and one per category; a page is a
+# slice from the end. The catalogue follows the change log: every
+# CATALOG_POLL seconds it fetches new and restored animations, drops
+# archived ones and applies like counts written since its last token. Every
+# CATALOG_RELOAD seconds it reloads in full to pick up anything the log
+# does not carry (profile changes). Pages that run past the hot tier return
+# None so the caller can fall through to the archive. Like counts in the
+# catalogue are the stored ones, as of the last write-behind flush; reads
+# add this worker's buffered likes like they do for any other document.
+
+CATALOG_ENABLED = os.environ.get('CATALOG_ENABLED', 'true').lower() == 'true'
+CATALOG_POLL = float(os.environ.get('CATALOG_POLL', '1'))
+CATALOG_RELOAD = int(os.environ.get('CATALOG_RELOAD', '3600'))
+LOAD_BATCH = 5000
+
+
+class CatalogEntry:
+    __slots__ = ("id", "title", "css_code", "category", "shape_type", "user_id", "username",
+                 "user_profile_picture", "created_at", "likes_count", "poster_hash")
+
+    def __init__(self, doc: dict):
+        self.id = doc["id"]
+        self.title = doc["title"]
+        self.css_code = doc.get("css_code", "")
+        self.category = sys.intern(doc.get("category") or "")
+        self.shape_type = sys.intern(doc.get("shape_type") or "")
+        self.user_id = sys.intern(doc.get("user_id") or "")
+        self.username = sys.intern(doc.get("username") or "")
+        self.user_profile_picture = sys.intern(doc.get("user_profile_picture") or "")
+        created_at = doc["created_at"]
+        self.created_at = created_at if isinstance(created_at, str) else created_at.isoformat()
+        self.likes_count = doc.get("likes_count", 0)
+        self.poster_hash = poster_hash(self.css_code, self.shape_type)
+
+    def to_dict(self) -> dict:
+        return {
+            "id": self.id, "title": self.title, "css_code": self.css_code, "category": self.category,
+            "shape_type": self.shape_type, "user_id": self.user_id, "username": self.username,
+            "user_profile_picture": self.user_profile_picture, "created_at": self.created_at,
+            "likes_count": self.likes_count, "poster_hash": self.poster_hash,
+        }
+
+
+def _key(entry: CatalogEntry) -> tuple:
+    return entry.created_at, entry.id
+
+
+class CatalogIndex:
+    """Animations by id and in time order, overall and per category."""
+
+    def __init__(self, entries=()):
+        self.by_id = {}
+        self.by_time = []
+        self.by_category = {}
+        for entry in entries:
+            self.by_id[entry.id] = entry
+        self.by_time = sorted(self.by_id.values(), key=_key)
+        for entry in self.by_time:
+            self.by_category.setdefault(entry.category, []).append(entry)
+
+    def __len__(self):
+        return len(self.by_time)
+
+    def add(self, entry: CatalogEntry):
+        if entry.id in self.by_id:
+            return
+        self.by_id[entry.id] = entry
+        bisect.insort(self.by_time, entry, key=_key)
+        bisect.insort(self.by_category.setdefault(entry.category, []), entry, key=_key)
+
+    def remove(self, animation_id: str):
+        entry = self.by_id.pop(animation_id, None)
+        if entry is None:
+            return
+        for entries in (self.by_time, self.by_category[entry.category]):
+            del entries[bisect.bisect_left(entries, _key(entry), key=_key)]
+
+    def page(self, skip: int, limit: int, category: Optional[str] = None) -> Optional[list]:
+        """Newest first; None when the page reaches past the oldest animation held."""
+        entries = self.by_category.get(category, []) if category else self.by_time
+        end = len(entries) - skip
+        start = end - limit
+        if start < 0:
+            return None
+        return [entry.to_dict() for entry in reversed(entries[start:end])]
+
+
+class Catalog:
+    def __init__(self, db, changelog, projection: dict, poll_interval: float = CATALOG_POLL,
+                 reload_interval: int = CATALOG_RELOAD, enabled: bool = CATALOG_ENABLED):
+        self.db = db
+        self.changelog = changelog
+        self.projection = projection
+        self.poll_interval = poll_interval
+        self.reload_interval = reload_interval
+        self.enabled = enabled
+        self.index: Optional[CatalogIndex] = None
+        self.token = 0
+        self._loaded_at = float("-inf")
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def ready(self) -> bool:
+        return self.index is not None
+
+    # Reads
+
+    def page(self, skip: int, limit: int, category: Optional[str] = None) -> Optional[list]:
+        return self.index.page(skip, limit, category) if self.index is not None else None
+
+    def get_many(self, ids: list) -> dict:
+        if self.index is None:
+            return {}
+        return {animation_id: self.index.by_id[animation_id].to_dict()
+                for animation_id in ids if animation_id in self.index.by_id}
+
+    # Updates
+
+    async def load(self):
+        # Take the token first so changes made during the load are replayed afterwards
+        token = await self.changelog.head()
+        entries = []
+        async for doc in self.db.animations.find({}, self.projection).batch_size(LOAD_BATCH):
+            entries.append(CatalogEntry(doc))
+        self.index = CatalogIndex(entries)
+        self.token = token
+        self._loaded_at = time.monotonic()
+        logger.info("Loaded %d animations into the catalogue", len(self.index))
+
+    def add(self, doc: dict):
+        if self.index is not None:
+            self.index.add(CatalogEntry(doc))
+
+    def remove(self, animation_id: str):
+        if self.index is not None:
+            self.index.remove(animation_id)
+
+    def set_likes(self, animation_id: str, likes_count: int):
+        entry = self.index.by_id.get(animation_id) if self.index is not None else None
+        if entry is not None:
+            entry.likes_count = likes_count
+
+    async def catch_up(self):
+        more = True
+        while more:
+            entries, token, reset, more = await self.changelog.since(self.token, types=CATALOG_CHANGES)
+            if reset:
+                await self.load()
+                return
+            # Entries apply in order; a later archival or restore wins
+            added = [entry["animation_id"] for entry in entries if entry["type"] in ("insert", "restore")]
+            docs = {}
+            if added:
+                found = await self.db.animations.find({"id": {"$in": added}}, self.projection).to_list(len(added))
+                docs = {doc["id"]: doc for doc in found}
+            for entry in entries:
+                if entry["type"] in ("insert", "restore") and entry["animation_id"] in docs:
+                    self.add(docs[entry["animation_id"]])
+                elif entry["type"] == "archive":
+                    for animation_id in entry["animation_ids"]:
+                        self.remove(animation_id)
+                elif entry["type"] == "likes":
+                    self.set_likes(entry["animation_id"], entry["likes_count"])
+            self.token = token
+
+    async def _run(self):
+        while True:
+            try:
+                if time.monotonic() - self._loaded_at > self.reload_interval:
+                    await self.load()
+                else:
+                    await self.catch_up()
+            except Exception:
+                logger.exception("Catalogue refresh failed")
+            await asyncio.sleep(self.poll_interval)
+
+    def start(self):
+        if self.enabled and self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+
+# Benchmark: memory per 100k animations and read latency against MongoDB
+
+def benchmark(count: int, repeats: int) -> dict:
+    import random
+    import tracemalloc
+    import uuid
+    from datetime import datetime, timedelta, timezone
+    from seed_animations import animations as seeds
+
+    def fresh(value: str) -> str:
+        # A new string object, as every document decoded from BSON carries its own
+        return (value + ".")[:-1]
+
+    rng = random.Random(47)
+    started = datetime.now(timezone.utc)
+    users = [(str(uuid.uuid4()), f"user{i:05d}") for i in range(count // 20 + 1)]
+
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    entries = []
+    for i in range(count):
+        seed = rng.choice(seeds)
+        user_id, username = rng.choice(users)
+        entries.append(CatalogEntry({
+            "id": str(uuid.uuid4()), "title": f"{seed['title']} {i}", "css_code": fresh(seed["css_code"]),
+            "category": fresh(seed["category"]), "shape_type": fresh(seed["shape_type"]),
+            "user_id": fresh(user_id), "username": fresh(username), "user_profile_picture": "",
+            "created_at": (started - timedelta(minutes=i)).isoformat(), "likes_count": rng.randint(0, 50),
+        }))
+    index = CatalogIndex(entries)
+    del entries
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    size = sum(stat.size_diff for stat in after.compare_to(before, "filename"))
+
+    def timed(read) -> float:
+        read()
+        begun = time.perf_counter()
+        for _ in range(repeats):
+            read()
+        return (time.perf_counter() - begun) / repeats * 1000
+
+    some_id = index.by_time[len(index) // 2].id
+    return {
+        "animations": len(index),
+        "mb_per_100k": round(size / len(index) * 100000 / 2 ** 20, 1),
+        "feed_page_ms": round(timed(lambda: index.page(0, 50)), 4),
+        "deep_page_ms": round(timed(lambda: index.page(len(index) // 2, 50)), 4),
+        "category_page_ms": round(timed(lambda: index.page(0, 50, "Rotate")), 4),
+        "get_ms": round(timed(lambda: index.by_id[some_id].to_dict()), 4),
+    }
+
+
+async def database_latency(db, projection: dict, repeats: int) -> dict:
+    async def timed(read) -> float:
+        await read()
+        begun = time.perf_counter()
+        for _ in range(repeats):
+            await read()
+        return (time.perf_counter() - begun) / repeats * 1000
+
+    some = await db.animations.find_one({}, {"_id": 0, "id": 1})
+    return {
+        "feed_page_ms": round(await timed(lambda: db.animations.find({}, projection)
+                                          .sort("created_at", -1).limit(50).to_list(50)), 3),
+        "category_page_ms": round(await timed(lambda: db.animations.find({"category": "Rotate"}, projection)
+                                              .sort("created_at", -1).limit(50).to_list(50)), 3),
+        "get_ms": round(await timed(lambda: db.animations.find_one({"id": some["id"]}, projection)), 3)
+        if some else None,
+    }
+
+
+if __name__ == "__main__":
+    import argparse
+    import json
+    from pathlib import Path
+    from dotenv import load_dotenv
+
+    load_dotenv(Path(__file__).parent / '.env')
+
+    parser = argparse.ArgumentParser(description="Measure catalogue memory and read latency")
+    parser.add_argument("--count", type=int, default=100000)
+    parser.add_argument("--repeats", type=int, default=200)
+    parser.add_argument("--compare-db", action="store_true", help="Also time the same reads against MONGO_URL")
+    args = parser.parse_args()
+
+    report = {"catalogue": benchmark(args.count, args.repeats)}
+    if args.compare_db:
+        from motor.motor_asyncio import AsyncIOMotorClient
+        from server import ANIMATION_PROJECTION
+
+        async def main():
+            client = AsyncIOMotorClient(os.environ['MONGO_URL'])
+            return await database_latency(client[os.environ['DB_NAME']], ANIMATION_PROJECTION, args.repeats)
+
+        report["database"] = asyncio.run(main())
+    print(json.dumps(report, indent=2))
@@ -0,0 +1,145 @@
+import asyncio
+import logging
+import os
+from typing import Optional
+
+from pymongo import DeleteOne, UpdateOne
+
+logger = logging.getLogger(__name__)
+
+# Categories
+#
+# The set of valid categories lives in the `categories` collection and is
+# held in memory as a snapshot, so validating a new animation never costs a
+# database round trip. `category_counts` keeps one counter per
+# (category, shape_type) over both tiers, incremented on create, which
+# serves the facets. Every worker may seed and rebuild the counters at
+# startup, so both only upsert per key and never empty the collection; a
+# rebuild adds the difference between its count and the counter it read,
+# so creates that land while it runs are not overwritten.
+
+DEFAULT_CATEGORIES = [
+    "Fade",
+    "Slide",
+    "Rotate",
+    "Bounce",
+    "Scale",
+    "Special Effects"
+]
+REFRESH_INTERVAL = int(os.environ.get('CATEGORY_REFRESH_INTERVAL', '60'))
+
+
+class CategoryCatalog:
+    def __init__(self, db):
+        self.db = db
+        self._names = tuple(DEFAULT_CATEGORIES)
+        self._valid = frozenset(DEFAULT_CATEGORIES)
+        self._refresher: Optional[asyncio.Task] = None
+
+    async def ensure_indexes(self):
+        await self.db.categories.create_index("name", unique=True)
+        await self.db.category_counts.create_index([("category", 1), ("shape_type", 1)], unique=True)
+
+    async def seed(self):
+        await self.db.categories.bulk_write([
+            UpdateOne({"name": name}, {"$setOnInsert": {"name": name, "position": position}}, upsert=True)
+            for position, name in enumerate(DEFAULT_CATEGORIES)
+        ], ordered=False)
+        if not await self.db.category_counts.find_one({}, {"_id": 1}):
+            await self.rebuild_counts()
+
+    async def refresh(self):
+        docs = await self.db.categories.find({}, {"_id": 0, "name": 1}).sort("position", 1).to_list(None)
+        names = tuple(doc["name"] for doc in docs)
+        if names:
+            self._names = names
+            self._valid = frozenset(names)
+
+    def names(self) -> list:
+        return list(self._names)
+
+    def is_valid(self, category: str) -> bool:
+        return category in self._valid
+
+    async def record_created(self, category: str, shape_type: str):
+        await self.db.category_counts.update_one(
+            {"category": category, "shape_type": shape_type},
+            {"$inc": {"count": 1}},
+            upsert=True
+        )
+
+    async def facets(self) -> list:
+        rows = await self.db.category_counts.find({}, {"_id": 0}).to_list(None)
+        by_category = {name: {"category": name, "count": 0, "shape_types": {}} for name in self._names}
+        for row in rows:
+            facet = by_category.setdefault(
+                row["category"], {"category": row["category"], "count": 0, "shape_types": {}}
+            )
+            facet["count"] += row["count"]
+            facet["shape_types"][row["shape_type"]] = row["count"]
+        return list(by_category.values())
+
+    async def rebuild_counts(self) -> int:
+        # Counted over both tiers, since category feeds reach archived animations too
+        read = await self.db.category_counts.find({}, {"category": 1, "shape_type": 1, "count": 1}).to_list(None)
+        totals = {}
+        for collection in (self.db.animations, self.db.animations_archive):
+            rows = await collection.aggregate([
+                {"$group": {"_id": {"category": "$category", "shape_type": "$shape_type"}, "count": {"$sum": 1}}}
+            ]).to_list(None)
+            for row in rows:
+                key = (row["_id"]["category"], row["_id"]["shape_type"])
+                totals[key] = totals.get(key, 0) + row["count"]
+
+        # Applied as a correction to what was read, so creates counted since are kept
+        existing = {(doc["category"], doc["shape_type"]): doc for doc in read}
+        operations = [
+            UpdateOne({"category": category, "shape_type": shape_type},
+                      {"$inc": {"count": count - existing.get((category, shape_type), {}).get("count", 0)}},
+                      upsert=True)
+            for (category, shape_type), count in totals.items()
+            if count != existing.get((category, shape_type), {}).get("count")
+        ]
+        # Keys with no animations left; matching the count read leaves any that a create has touched since
+        operations += [
+            DeleteOne({"_id": doc["_id"], "count": doc["count"]})
+            for key, doc in existing.items() if key not in totals
+        ]
+        if operations:
+            await self.db.category_counts.bulk_write(operations, ordered=False)
+        return len(totals)
+
+    async def _refresh_forever(self):
+        while True:
+            await asyncio.sleep(REFRESH_INTERVAL)
+            try:
+                await self.refresh()
+            except Exception:
+                logger.exception("Category refresh failed")
+
+    def start(self):
+        if self._refresher is None:
+            self._refresher = asyncio.create_task(self._refresh_forever())
+
+    async def stop(self):
+        if self._refresher is not None:
+            self._refresher.cancel()
+            self._refresher = None
+
+
+if __name__ == "__main__":
+    from pathlib import Path
+    from dotenv import load_dotenv
+    from motor.motor_asyncio import AsyncIOMotorClient
+
+    load_dotenv(Path(__file__).parent / '.env')
+
+    async def main():
+        client = AsyncIOMotorClient(os.environ['MONGO_URL'])
+        catalog = CategoryCatalog(client[os.environ['DB_NAME']])
+        await catalog.ensure_indexes()
+        await catalog.seed()
+        print(f"✓ Rebuilt {await catalog.rebuild_counts()} category/shape counters")
+        client.close()
+
+    asyncio.run(main())
@@ -0,0 +1,157 @@
+import asyncio
+import logging
+import os
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+
+from pymongo import ReturnDocument
+
+logger = logging.getLogger(__name__)
+
+# Change log for incremental sync
+#
+# Writes that change what a feed shows append an entry to `changes` under a
+# sequence number taken from `counters`: new animations, like counts (one
+# entry per animation per write-behind flush, with the count stored after
+# it) and follows/unfollows (kept per user). Moves between the hot and
+# archive tiers are logged too, for the in-process catalogue only. The
+# entries of one write (all like counts of a flush) share a single counter
+# update and a single insert_many. Failures are raised to the caller.
+# A client that has cached its feeds calls /api/sync with the last token it
+# got and receives only what changed since. Sequence numbers are handed out
+# before the entry is written, so a newer entry can land before an older
+# one; a read stops at a gap until the entry after it is SYNC_SETTLE
+# seconds old, after which the gap is taken to be a write that never
+# finished. Every TRIM_INTERVAL seconds entries older than CHANGELOG_TTL are
+# deleted, after the `floor` in `counters` has been raised past them; a
+# token below the floor gets `reset` and the client reloads in full. (A TTL
+# index would remove entries without leaving a floor, and a token ahead of
+# a sequence number that was never written could not be told apart from one
+# whose entries had expired.)
+
+CHANGELOG_TTL = int(os.environ.get('CHANGELOG_TTL', str(7 * 24 * 3600)))
+SYNC_SETTLE = float(os.environ.get('SYNC_SETTLE', '2'))
+TRIM_INTERVAL = 60
+MAX_SYNC_ENTRIES = 1000
+FEED_CHANGES = ["insert", "likes"]
+CATALOG_CHANGES = FEED_CHANGES + ["archive", "restore"]
+
+
+class ChangeLog:
+    def __init__(self, db, trim_interval: float = TRIM_INTERVAL):
+        self.db = db
+        self.trim_interval = trim_interval
+        self._trimmer: Optional[asyncio.Task] = None
+
+    @property
+    def changes(self):
+        return self.db.changes
+
+    async def ensure_indexes(self):
+        await self.changes.create_index("seq", unique=True)
+        if "expireAfterSeconds" in (await self.changes.index_information()).get("at_1", {}):
+            # Entries used to expire through a TTL index
+            await self.changes.drop_index("at_1")
+        await self.changes.create_index("at")
+
+    # Writes
+
+    async def _append(self, *entries: dict):
+        """Write `entries` under consecutive sequence numbers taken in one counter update."""
+        if not entries:
+            return
+        counter = await self.db.counters.find_one_and_update(
+            {"_id": "changes"}, {"$inc": {"seq": len(entries)}},
+            upsert=True, return_document=ReturnDocument.AFTER
+        )
+        first = counter["seq"] - len(entries) + 1
+        at = datetime.now(timezone.utc)
+        await self.changes.insert_many([{"seq": first + i, "at": at, **entry} for i, entry in enumerate(entries)])
+
+    async def animation_created(self, animation_id: str, user_id: str):
+        await self._append({"type": "insert", "animation_id": animation_id, "user_id": user_id})
+
+    async def likes_changed(self, changes: list):
+        """One entry per (animation_id, delta, likes_count): the stored count and the change since the previous entry."""
+        await self._append(*[
+            {"type": "likes", "animation_id": animation_id, "delta": delta, "likes_count": likes_count}
+            for animation_id, delta, likes_count in changes
+        ])
+
+    async def animations_archived(self, animation_ids: list):
+        await self._append({"type": "archive", "animation_ids": animation_ids})
+
+    async def animation_restored(self, animation_id: str):
+        await self._append({"type": "restore", "animation_id": animation_id})
+
+    async def follow_changed(self, user_id: str, target_id: str, following: bool):
+        await self._append({"type": "follow" if following else "unfollow", "user_id": user_id, "target_id": target_id})
+
+    # Reads
+
+    async def head(self) -> int:
+        counter = await self.db.counters.find_one({"_id": "changes"})
+        return counter["seq"] if counter else 0
+
+    async def since(self, seq: int, user_id: Optional[str] = None, types: list = FEED_CHANGES) -> tuple:
+        """(entries, new token, reset, more) for changes of `types` and `user_id`'s follows after `seq`."""
+        counter = await self.db.counters.find_one({"_id": "changes"}) or {}
+        if seq < counter.get("floor", 0):
+            # Entries after the token have been trimmed
+            return [], counter["seq"], True, False
+
+        query = {"seq": {"$gt": seq}}
+        if user_id:
+            query["$or"] = [{"type": {"$in": types}}, {"user_id": user_id}]
+        else:
+            query["type"] = {"$in": types}
+        # The user filter hides other people's follows, so gaps are judged on all entries
+        docs = await self.changes.find(
+            {"seq": {"$gt": seq}}, {"_id": 0, "seq": 1, "at": 1}
+        ).sort("seq", 1).limit(MAX_SYNC_ENTRIES + 1).to_list(MAX_SYNC_ENTRIES + 1)
+        more = len(docs) > MAX_SYNC_ENTRIES
+        settled = seq
+        now = time.time()
+        for doc in docs[:MAX_SYNC_ENTRIES]:
+            if doc["seq"] != settled + 1:
+                written_at = doc["at"].replace(tzinfo=timezone.utc).timestamp()
+                if now - written_at < SYNC_SETTLE:
+                    more = False
+                    break
+            settled = doc["seq"]
+        if settled == seq:
+            return [], seq, False, False
+
+        query["seq"]["$lte"] = settled
+        entries = await self.changes.find(query, {"_id": 0, "at": 0}).sort("seq", 1).to_list(None)
+        return entries, settled, False, more
+
+    # Trimming
+
+    async def trim(self, ttl: int = CHANGELOG_TTL) -> int:
+        """Delete entries older than `ttl` seconds, raising the floor past them first."""
+        cutoff = datetime.now(timezone.utc) - timedelta(seconds=ttl)
+        newest = await self.changes.find_one({"at": {"$lt": cutoff}}, {"_id": 0, "seq": 1}, sort=[("seq", -1)])
+        if newest is None:
+            return 0
+        await self.db.counters.update_one({"_id": "changes"}, {"$max": {"floor": newest["seq"]}})
+        result = await self.changes.delete_many({"seq": {"$lte": newest["seq"]}})
+        return result.deleted_count
+
+    async def _trim_forever(self):
+        while True:
+            await asyncio.sleep(self.trim_interval)
+            try:
+                await self.trim()
+            except Exception:
+                logger.exception("Change log trim failed")
+
+    def start(self):
+        if self._trimmer is None:
+            self._trimmer = asyncio.create_task(self._trim_forever())
+
+    async def stop(self):
+        if self._trimmer is not None:
+            self._trimmer.cancel()
+            self._trimmer = None
@@ -0,0 +1,15 @@
+import re
+
+# CSS patterns shared by the poster renderer and the similarity features
+#
+# Animations are user-written CSS; neither consumer needs a full parser,
+# only the @keyframes blocks of a stylesheet, the stops inside a block and
+# the declarations inside a stop. Nested braces deeper than a stop are not
+# matched.
+
+# name, body
+KEYFRAMES = re.compile(r"@keyframes\s+([\w-]+)\s*\{((?:[^{}]*\{[^{}]*\})*)\s*\}", re.S)
+# selectors ("from, 50%"), declarations
+STOP = re.compile(r"((?:from|to|\d+(?:\.\d+)?%)(?:\s*,\s*(?:from|to|\d+(?:\.\d+)?%))*)\s*\{([^{}]*)\}", re.S)
+# property, value
+DECLARATION = re.compile(r"([\w-]+)\s*:\s*([^;]+)")
@@ -0,0 +1,40 @@
+class DeferredDatabase:
+    """Stands in for the Motor database until connect() runs in the worker's startup.
+
+    Modules can hold on to this object at import time; attribute access is
+    forwarded to the real database once it exists.
+    """
+
+    def __init__(self):
+        self._client = None
+        self._db = None
+
+    def connect(self, mongo_url: str, db_name: str, **kwargs):
+        from motor.motor_asyncio import AsyncIOMotorClient
+
+        self._client = AsyncIOMotorClient(mongo_url, **kwargs)
+        self._db = self._client[db_name]
+
+    @property
+    def connected(self) -> bool:
+        return self._db is not None
+
+    @property
+    def client(self):
+        return self._client
+
+    def close(self):
+        if self._client is not None:
+            self._client.close()
+
+    def __getattr__(self, name):
+        if name.startswith("_"):
+            raise AttributeError(name)
+        if self._db is None:
+            raise RuntimeError("Database used before startup connected it")
+        return getattr(self._db, name)
+
+    def __getitem__(self, name):
+        if self._db is None:
+            raise RuntimeError("Database used before startup connected it")
+        return self._db[name]
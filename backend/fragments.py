@@ -0,0 +1,140 @@
+import json
+import os
+from collections import OrderedDict
+from typing import Callable, List
+
+# Encoded animation fragments
+#
+# Feed responses are mostly the same animations encoded over and over for
+# every viewer, css_code and all. The fragment cache keeps each animation's
+# JSON encoding without its closing brace and without the fields that change
+# between requests: likes_count, liked_by_me and likes. A response is
+# assembled by appending those fields to the cached fragments and joining
+# the results. Entries are keyed by id and a revision, a hash of the
+# animation's other fields, so any write to them produces a new entry and
+# the stale one ages out of the LRU, which holds at most
+# FRAGMENT_CACHE_BYTES of fragments.
+
+FRAGMENT_CACHE_BYTES = int(os.environ.get('FRAGMENT_CACHE_BYTES', str(32 * 2 ** 20)))
+MUTABLE_FIELDS = {"likes", "likes_count", "liked_by_me"}
+REVISION_FIELDS = ("title", "css_code", "category", "shape_type", "user_id", "username",
+                   "user_profile_picture", "created_at", "poster_hash")
+
+
+def revision(anim: dict) -> int:
+    return hash(tuple(anim.get(field) for field in REVISION_FIELDS))
+
+
+def mutable_tail(anim: dict) -> bytes:
+    tail = b',"likes_count":%d' % anim.get("likes_count", 0)
+    if anim.get("liked_by_me") is not None:
+        tail += b',"liked_by_me":true' if anim["liked_by_me"] else b',"liked_by_me":false'
+    if anim.get("likes") is not None:
+        tail += b',"likes":' + json.dumps(anim["likes"], ensure_ascii=False, separators=(",", ":")).encode()
+    return tail + b"}"
+
+
+class FragmentCache:
+    def __init__(self, encode_fragment: Callable[[dict], bytes], max_bytes: int = FRAGMENT_CACHE_BYTES):
+        """`encode_fragment` returns an animation's JSON without MUTABLE_FIELDS and the closing brace."""
+        self.encode_fragment = encode_fragment
+        self.max_bytes = max_bytes
+        self._fragments = OrderedDict()
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+
+    def fragment(self, anim: dict) -> bytes:
+        key = (anim["id"], revision(anim))
+        fragment = self._fragments.get(key)
+        if fragment is not None:
+            self._fragments.move_to_end(key)
+            self.hits += 1
+            return fragment
+        self.misses += 1
+        fragment = self.encode_fragment(anim)
+        self._fragments[key] = fragment
+        self.size += len(fragment)
+        while self.size > self.max_bytes and self._fragments:
+            _, evicted = self._fragments.popitem(last=False)
+            self.size -= len(evicted)
+        return fragment
+
+    def encode(self, anim: dict) -> bytes:
+        return self.fragment(anim) + mutable_tail(anim)
+
+    def encode_list(self, animations: List[dict]) -> bytes:
+        return b"[" + b",".join(self.encode(anim) for anim in animations) + b"]"
+
+
+# Benchmark: serialization CPU per feed response, fragments vs response_model
+
+def benchmark(page_size: int, repeats: int, viewer: bool) -> dict:
+    import random
+    import time
+    import uuid
+    from datetime import datetime, timedelta, timezone
+    from typing import List as ListType
+
+    from fastapi.responses import JSONResponse
+    from pydantic import TypeAdapter
+    from seed_animations import animations as seeds
+    from server import AnimationView, encode_fragment, prepare_animation
+
+    rng = random.Random(48)
+    started = datetime.now(timezone.utc)
+
+    def page() -> list:
+        # Fresh dicts every request, as a feed route gets them
+        animations = []
+        for i in range(page_size):
+            seed = seeds[i % len(seeds)]
+            anim = prepare_animation({
+                "id": str(uuid.UUID(int=i)), "title": seed["title"], "css_code": seed["css_code"],
+                "category": seed["category"], "shape_type": seed["shape_type"], "user_id": "system-user-001",
+                "username": "CSSMaster", "user_profile_picture": "",
+                "created_at": (started - timedelta(minutes=i)).isoformat(), "likes_count": rng.randint(0, 50),
+            })
+            if viewer:
+                anim["liked_by_me"] = rng.random() < 0.3
+            animations.append(anim)
+        return animations
+
+    adapter = TypeAdapter(ListType[AnimationView])
+
+    def response_model(animations: list) -> bytes:
+        # What FastAPI does for response_model=List[AnimationView], response_model_exclude_none=True
+        validated = adapter.validate_python(animations)
+        return JSONResponse(adapter.dump_python(validated, mode="json", exclude_none=True)).body
+
+    fragments = FragmentCache(encode_fragment)
+    pages = [page() for _ in range(repeats)]
+    assert json.loads(response_model(pages[0])) == json.loads(fragments.encode_list(pages[0]))
+
+    def cpu(encode) -> float:
+        begun = time.process_time()
+        for animations in pages:
+            encode(animations)
+        return (time.process_time() - begun) / repeats * 1e6
+
+    baseline = cpu(response_model)
+    cached = cpu(fragments.encode_list)
+    return {
+        "animations_per_response": len(pages[0]),
+        "response_model_us": round(baseline),
+        "fragments_us": round(cached),
+        "speedup": round(baseline / cached, 1),
+        "response_bytes": len(fragments.encode_list(pages[0])),
+        "cached_bytes": fragments.size,
+    }
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Compare feed serialization CPU with and without fragments")
+    parser.add_argument("--page-size", type=int, default=50)
+    parser.add_argument("--repeats", type=int, default=500)
+    parser.add_argument("--anonymous", action="store_true", help="No viewer, so no liked_by_me")
+    args = parser.parse_args()
+    print(json.dumps(benchmark(args.page_size, args.repeats, not args.anonymous), indent=2))
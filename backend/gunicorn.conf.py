@@ -0,0 +1,43 @@
+# Production launcher: gunicorn managing N uvicorn workers.
+#
+#   cd backend && gunicorn -c gunicorn.conf.py server:app
+#
+# Each worker runs the app's startup hook (Mongo connect, index check, seed
+# data, category list and first feed pages) before it starts accepting
+# connections; /readyz reports 503 until then.
+#
+# Cache invalidation and live updates only reach other workers through
+# Redis, so more than one worker requires CACHE_BACKEND=redis and
+# REDIS_URL; the launcher refuses to start otherwise. Without
+# WEB_CONCURRENCY the worker count is capped at MAX_DEFAULT_WORKERS.
+import multiprocessing
+import os
+
+MAX_DEFAULT_WORKERS = 4
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '8000')}"
+workers = int(os.environ.get('WEB_CONCURRENCY', min(multiprocessing.cpu_count() * 2 + 1, MAX_DEFAULT_WORKERS)))
+worker_class = "uvicorn.workers.UvicornWorker"
+
+# The app checks the worker count too (see realtime.create_broker)
+os.environ['WEB_CONCURRENCY'] = str(workers)
+
+if workers > 1 and not (os.environ.get('CACHE_BACKEND', '').lower() == 'redis' and os.environ.get('REDIS_URL')):
+    raise RuntimeError(
+        f"{workers} workers need a shared cache and broker: set CACHE_BACKEND=redis and REDIS_URL, "
+        "or WEB_CONCURRENCY=1"
+    )
+
+# The app is imported once in the master and shared by the forked workers.
+# Safe because the Mongo client is only created in each worker's startup hook.
+preload_app = os.environ.get('PRELOAD_APP', 'true').lower() == 'true'
+
+timeout = int(os.environ.get('WORKER_TIMEOUT', '60'))
+graceful_timeout = int(os.environ.get('GRACEFUL_TIMEOUT', '30'))
+keepalive = 5
+max_requests = int(os.environ.get('MAX_REQUESTS', '0'))
+max_requests_jitter = int(os.environ.get('MAX_REQUESTS_JITTER', '0'))
+
+accesslog = "-"
+errorlog = "-"
+loglevel = os.environ.get('LOG_LEVEL', 'info')
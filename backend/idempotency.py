@@ -0,0 +1,143 @@
+import hashlib
+import json
+import logging
+import os
+import time
+import uuid
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from typing import Awaitable, Callable, Optional
+
+from fastapi import HTTPException
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from pymongo.errors import DuplicateKeyError
+
+logger = logging.getLogger(__name__)
+
+# Idempotency keys
+#
+# Clients may send an `Idempotency-Key` header with a write. The first
+# request claims the key by inserting a pending record into
+# `idempotency_keys` (unique per user, operation and key); when the write
+# succeeds the response is stored on the record and in a per-worker LRU.
+# A retry with the same key gets the stored response back without touching
+# the write path again. A retry that arrives while the first request is
+# still running gets 409, and reusing a key for a different request body
+# gets 422. Failed writes release the key so they can be retried. A pending
+# claim is a lease of IDEMPOTENCY_LEASE seconds, a little longer than a
+# worker may spend on a request; a worker killed mid-request leaves the
+# lease to expire, and the next retry takes it over. Only the current
+# holder can complete or release a claim. Records expire through a TTL
+# index after IDEMPOTENCY_TTL seconds.
+
+IDEMPOTENCY_TTL = int(os.environ.get('IDEMPOTENCY_TTL', str(24 * 3600)))
+IDEMPOTENCY_LEASE = int(os.environ.get('IDEMPOTENCY_LEASE', str(int(os.environ.get('WORKER_TIMEOUT', '60')) + 5)))
+IDEMPOTENCY_LRU_SIZE = int(os.environ.get('IDEMPOTENCY_LRU_SIZE', '10000'))
+MAX_KEY_LENGTH = 255
+REPLAY_HEADER = "Idempotent-Replayed"
+
+
+def fingerprint(payload) -> str:
+    encoded = json.dumps(jsonable_encoder(payload), sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(encoded.encode()).hexdigest()
+
+
+class IdempotencyStore:
+    def __init__(self, db, ttl: int = IDEMPOTENCY_TTL, lru_size: int = IDEMPOTENCY_LRU_SIZE,
+                 lease: int = IDEMPOTENCY_LEASE):
+        self.db = db
+        self.ttl = ttl
+        self.lease = lease
+        self.lru_size = lru_size
+        # record key -> (fingerprint, status_code, body, expires_at)
+        self._recent = OrderedDict()
+        self.replays = 0
+
+    @property
+    def records(self):
+        return self.db.idempotency_keys
+
+    async def ensure_indexes(self):
+        await self.records.create_index("key", unique=True)
+        await self.records.create_index("created_at", expireAfterSeconds=self.ttl)
+
+    def _remember(self, key: str, request_hash: str, status_code: int, body):
+        self._recent.pop(key, None)
+        self._recent[key] = (request_hash, status_code, body, time.monotonic() + self.ttl)
+        if len(self._recent) > self.lru_size:
+            self._recent.popitem(last=False)
+
+    def _recall(self, key: str):
+        entry = self._recent.get(key)
+        if entry is None:
+            return None
+        if entry[3] < time.monotonic():
+            del self._recent[key]
+            return None
+        self._recent.move_to_end(key)
+        return entry[:3]
+
+    def _replay(self, request_hash: str, stored_hash: str, status_code: int, body) -> JSONResponse:
+        if stored_hash != request_hash:
+            raise HTTPException(status_code=422, detail="Idempotency-Key was already used for a different request")
+        self.replays += 1
+        return JSONResponse(body, status_code=status_code, headers={REPLAY_HEADER: "true"})
+
+    async def run(self, idempotency_key: Optional[str], scope: str, payload,
+                  handler: Callable[[], Awaitable], status_code: int = 200):
+        """Run `handler` once per (scope, idempotency_key); replay its response afterwards.
+
+        `scope` should identify the caller and the operation, e.g.
+        "<user_id>:like:<animation_id>", so keys never collide across users.
+        """
+        if not idempotency_key:
+            return await handler()
+        if len(idempotency_key) > MAX_KEY_LENGTH:
+            raise HTTPException(status_code=400, detail=f"Idempotency-Key must be at most {MAX_KEY_LENGTH} characters")
+
+        key = f"{scope}:{idempotency_key}"
+        request_hash = fingerprint(payload)
+        recent = self._recall(key)
+        if recent:
+            return self._replay(request_hash, *recent)
+
+        now = datetime.now(timezone.utc)
+        claim = {
+            "fingerprint": request_hash,
+            "state": "pending",
+            "claim": uuid.uuid4().hex,
+            "expires_at": now + timedelta(seconds=self.lease),
+            "created_at": now,
+        }
+        try:
+            await self.records.insert_one({"key": key, **claim})
+        except DuplicateKeyError:
+            # Take over a pending claim whose holder has outlived its lease
+            taken = await self.records.find_one_and_update(
+                {"key": key, "state": "pending", "expires_at": {"$lt": now}}, {"$set": claim}
+            )
+            if taken is None:
+                record = await self.records.find_one({"key": key}, {"_id": 0})
+                # A missing record expired between the insert and the read; the next retry claims it
+                if record is None or record["state"] != "done":
+                    raise HTTPException(status_code=409, detail="Request with this Idempotency-Key is still in progress",
+                                        headers={"Retry-After": "1"})
+                self._remember(key, record["fingerprint"], record["status_code"], record["response"])
+                return self._replay(request_hash, record["fingerprint"], record["status_code"], record["response"])
+
+        held = {"key": key, "claim": claim["claim"]}
+        try:
+            result = await handler()
+        except BaseException:
+            await self.records.delete_one({**held, "state": "pending"})
+            raise
+
+        body = jsonable_encoder(result)
+        await self.records.update_one(
+            held,
+            {"$set": {"state": "done", "status_code": status_code, "response": body},
+             "$unset": {"expires_at": ""}}
+        )
+        self._remember(key, request_hash, status_code, body)
+        return result
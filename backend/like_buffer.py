@@ -0,0 +1,210 @@
+import asyncio
+import logging
+import os
+from typing import Optional
+
+from pymongo import UpdateOne
+
+logger = logging.getLogger(__name__)
+
+# Write-behind like buffer
+#
+# With LIKE_WRITE_BEHIND enabled, like/unlike intents are recorded here
+# instead of being written to the animation document one by one. For each
+# (animation, user) the buffer keeps the state the user wants and the state
+# the database had when the first intent arrived; a toggle back to the
+# database state cancels the entry. Flushes turn the remaining entries into
+# at most two updates per animation ($addToSet/$pull with $each/$in).
+# Reads patch their documents through apply(), so counts stay correct for
+# requests served by this worker while intents are pending. A flush moves
+# the pending entries to an in-flight layer that stays visible to reads and
+# toggles until its write has committed; a toggle of an in-flight entry is
+# recorded against the state being written. A failed or cancelled write
+# puts the in-flight entries back under the ones recorded meanwhile. A full
+# buffer wakes the flusher early rather than starting a flush of its own,
+# and stop() lets a running flush finish before the final one.
+
+WRITE_BEHIND = os.environ.get('LIKE_WRITE_BEHIND', 'false').lower() == 'true'
+FLUSH_INTERVAL = float(os.environ.get('LIKE_FLUSH_INTERVAL', '1.0'))
+FLUSH_MAX_PENDING = int(os.environ.get('LIKE_FLUSH_MAX_PENDING', '500'))
+
+
+class LikeBuffer:
+    def __init__(self, db, enabled: bool = WRITE_BEHIND,
+                 flush_interval: float = FLUSH_INTERVAL, max_pending: int = FLUSH_MAX_PENDING):
+        self.db = db
+        self.enabled = enabled
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        # animation_id -> {user_id: (wanted, stored)}
+        self._pending = {}
+        # Entries of the flush being written, same layout
+        self._in_flight = {}
+        self._categories = {}
+        self._size = 0
+        self._flush_lock = asyncio.Lock()
+        self._full = asyncio.Event()
+        self._flusher: Optional[asyncio.Task] = None
+        self._on_flush = []
+
+    def on_flush(self, callback):
+        """Register `async callback(flushed)` run once after each flush.
+
+        `flushed` holds an (animation_id, category, added, removed) tuple per
+        animation; `added` and `removed` list the users whose like or unlike
+        was written.
+        """
+        self._on_flush.append(callback)
+
+    def toggle(self, animation_id: str, user_id: str, stored_liked: bool, category: str = None) -> bool:
+        """Record a like toggle and return the new liked state."""
+        entries = self._pending.setdefault(animation_id, {})
+        if category is not None:
+            self._categories[animation_id] = category
+        in_flight = self._in_flight.get(animation_id, {}).get(user_id)
+        if in_flight is not None:
+            # The database will hold the in-flight state once the write lands
+            stored_liked = in_flight[0]
+        wanted, stored = entries.get(user_id, (stored_liked, stored_liked))
+        wanted = not wanted
+        if wanted == stored:
+            del entries[user_id]
+            self._size -= 1
+            if not entries:
+                del self._pending[animation_id]
+        else:
+            if user_id not in entries:
+                self._size += 1
+            entries[user_id] = (wanted, stored)
+        if self._size >= self.max_pending:
+            self._full.set()
+        return wanted
+
+    def _layers(self, animation_id: str) -> list:
+        # Oldest first: the in-flight write, then what was recorded since
+        return [entries for entries in (self._in_flight.get(animation_id), self._pending.get(animation_id)) if entries]
+
+    def count_delta(self, animation_id: str) -> int:
+        return sum(1 if wanted else -1 for entries in self._layers(animation_id) for wanted, _ in entries.values())
+
+    def apply(self, anim: dict) -> dict:
+        layers = self._layers(anim.get('id'))
+        if not layers:
+            return anim
+        if 'likes' in anim:
+            likes = anim['likes']
+            for entries in layers:
+                likes = [user_id for user_id in likes if entries.get(user_id, (True,))[0]]
+                likes.extend(user_id for user_id, (wanted, _) in entries.items() if wanted and user_id not in likes)
+            anim['likes'] = likes
+            anim['likes_count'] = len(likes)
+        else:
+            anim['likes_count'] = anim.get('likes_count', 0) + self.count_delta(anim['id'])
+        return anim
+
+    def liked(self, animation_id: str, user_id: str, stored: bool) -> bool:
+        """Whether user_id likes the animation, given what the database says."""
+        for entries in reversed(self._layers(animation_id)):
+            entry = entries.get(user_id)
+            if entry:
+                return entry[0]
+        return stored
+
+    @property
+    def pending_count(self) -> int:
+        return self._size
+
+    async def flush(self) -> int:
+        async with self._flush_lock:
+            pending, self._pending = self._pending, {}
+            categories, self._categories = self._categories, {}
+            self._size = 0
+            if not pending:
+                return 0
+            self._in_flight = pending
+
+            operations = []
+            for animation_id, entries in pending.items():
+                added = [user_id for user_id, (wanted, _) in entries.items() if wanted]
+                removed = [user_id for user_id, (wanted, _) in entries.items() if not wanted]
+                if added:
+                    operations.append(UpdateOne({"id": animation_id}, {"$addToSet": {"likes": {"$each": added}}}))
+                if removed:
+                    operations.append(UpdateOne({"id": animation_id}, {"$pull": {"likes": {"$in": removed}}}))
+            try:
+                await self.db.animations.bulk_write(operations, ordered=False)
+            except BaseException:
+                # Failed or cancelled; the write may still land, and replaying it is harmless
+                self._restore(pending, categories)
+                raise
+            finally:
+                self._in_flight = {}
+
+            flushed = [
+                (animation_id, categories.get(animation_id),
+                 [user_id for user_id, (wanted, _) in entries.items() if wanted],
+                 [user_id for user_id, (wanted, _) in entries.items() if not wanted])
+                for animation_id, entries in pending.items()
+            ]
+            for callback in self._on_flush:
+                try:
+                    await callback(flushed)
+                except Exception:
+                    logger.exception("Like flush callback failed for %d animations", len(flushed))
+            return len(operations)
+
+    def _restore(self, pending: dict, categories: dict):
+        # Intents recorded during the failed flush are newer and win, but were
+        # recorded against the state that was not written after all
+        for animation_id, entries in pending.items():
+            current = self._pending.setdefault(animation_id, {})
+            for user_id, (wanted, stored) in entries.items():
+                if user_id not in current:
+                    current[user_id] = (wanted, stored)
+                    self._size += 1
+                elif current[user_id][0] == stored:
+                    del current[user_id]
+                    self._size -= 1
+                else:
+                    current[user_id] = (current[user_id][0], stored)
+            if not current:
+                del self._pending[animation_id]
+        for animation_id, category in categories.items():
+            self._categories.setdefault(animation_id, category)
+
+    async def _flush_quietly(self):
+        try:
+            await self.flush()
+        except Exception:
+            logger.exception("Like buffer flush failed; will retry")
+
+    async def _flush_forever(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._full.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._full.clear()
+            await self._flush_quietly()
+
+    def start(self):
+        if self.enabled and self._flusher is None:
+            self._flusher = asyncio.create_task(self._flush_forever())
+
+    async def stop(self):
+        if self._flusher is not None:
+            # Not in the middle of a write: that flush finishes first
+            async with self._flush_lock:
+                self._flusher.cancel()
+            await asyncio.gather(self._flusher, return_exceptions=True)
+            self._flusher = None
+        for attempt in range(3):
+            if not self._pending:
+                return
+            try:
+                await self.flush()
+            except Exception:
+                logger.exception("Shutdown flush attempt %d failed", attempt + 1)
+                await asyncio.sleep(0.5 * (attempt + 1))
+        if self._pending:
+            logger.error("Lost %d buffered like intents on shutdown", self._size)
@@ -0,0 +1,133 @@
+import logging
+import os
+from datetime import datetime, timezone
+from typing import Optional
+
+from pymongo.errors import DuplicateKeyError
+
+logger = logging.getLogger(__name__)
+
+# Notifications
+#
+# Likes and follows are grouped when they are written: each notification
+# document covers one recipient, one kind of event, one target (an
+# animation, or the recipient for follows) and one NOTIFICATION_WINDOW-long
+# time window, and counts the distinct people who acted in it. The same
+# person liking, unliking and liking again is only counted once. A group
+# that gains activity becomes unread again and moves to the top. The unread
+# count is counted from the (user_id, read) index rather than kept in a
+# counter, so groups that expire NOTIFICATION_TTL seconds after their last
+# activity drop out of it with them; reading a page is a single range scan
+# over (user_id, updated_at, id).
+
+NOTIFICATION_WINDOW = int(os.environ.get('NOTIFICATION_WINDOW', '3600'))
+NOTIFICATION_TTL = int(os.environ.get('NOTIFICATION_TTL', str(30 * 24 * 3600)))
+RECENT_ACTORS = 3
+MAX_PAGE = 50
+
+
+def _window(now: datetime) -> int:
+    return int(now.timestamp()) // NOTIFICATION_WINDOW
+
+
+def encode_cursor(doc: dict) -> str:
+    return f"{doc['updated_at'].isoformat()}|{doc['id']}"
+
+
+def decode_cursor(cursor: str) -> tuple:
+    updated_at, _, notification_id = cursor.partition("|")
+    return datetime.fromisoformat(updated_at), notification_id
+
+
+def summary(kind: str, usernames: list, count: int, target_title: Optional[str]) -> str:
+    if not usernames:
+        who = f"{count} {'person' if count == 1 else 'people'}"
+    elif count <= len(usernames):
+        who = usernames[0] if count == 1 else ", ".join(usernames[:-1]) + " and " + usernames[-1]
+    else:
+        others = count - len(usernames)
+        who = ", ".join(usernames) + f" and {others} {'other' if others == 1 else 'others'}"
+    if kind == "like":
+        return f"{who} liked {target_title}"
+    return f"{who} started following you"
+
+
+class NotificationCenter:
+    def __init__(self, db):
+        self.db = db
+
+    async def ensure_indexes(self):
+        await self.db.notifications.create_index(
+            [("user_id", 1), ("kind", 1), ("target_id", 1), ("window", 1)], unique=True
+        )
+        await self.db.notifications.create_index([("user_id", 1), ("updated_at", -1), ("id", -1)])
+        await self.db.notifications.create_index([("user_id", 1), ("read", 1)])
+        await self.db.notifications.create_index("updated_at", expireAfterSeconds=NOTIFICATION_TTL)
+
+    # Writes
+
+    async def _record(self, user_id: str, kind: str, target_id: str, actor_id: str,
+                      target_title: Optional[str] = None):
+        if user_id == actor_id:
+            return
+        now = datetime.now(timezone.utc)
+        try:
+            await self.db.notifications.update_one(
+                {
+                    "user_id": user_id, "kind": kind, "target_id": target_id,
+                    "window": _window(now), "actor_ids": {"$ne": actor_id}
+                },
+                {
+                    "$inc": {"count": 1},
+                    "$addToSet": {"actor_ids": actor_id},
+                    "$push": {"recent_actors": {"$each": [actor_id], "$position": 0, "$slice": RECENT_ACTORS}},
+                    "$set": {"updated_at": now, "read": False},
+                    "$setOnInsert": {"id": f"{kind}:{target_id}:{_window(now)}", "target_title": target_title},
+                },
+                upsert=True
+            )
+        except DuplicateKeyError:
+            # This person is already counted in the group
+            return
+
+    async def like(self, owner_id: str, actor_id: str, animation_id: str, title: str):
+        try:
+            await self._record(owner_id, "like", animation_id, actor_id, title)
+        except Exception:
+            logger.exception("Could not record like notification for %s", animation_id)
+
+    async def follow(self, user_id: str, actor_id: str):
+        try:
+            await self._record(user_id, "follow", user_id, actor_id)
+        except Exception:
+            logger.exception("Could not record follow notification for %s", user_id)
+
+    # Reads
+
+    async def unread(self, user_id: str) -> int:
+        return await self.db.notifications.count_documents({"user_id": user_id, "read": False})
+
+    async def page(self, user_id: str, limit: int = 20, cursor: Optional[str] = None) -> tuple:
+        """Newest-first groups after `cursor`; returns (groups, next cursor or None)."""
+        limit = max(1, min(limit, MAX_PAGE))
+        query = {"user_id": user_id}
+        if cursor:
+            updated_at, notification_id = decode_cursor(cursor)
+            query["$or"] = [
+                {"updated_at": {"$lt": updated_at}},
+                {"updated_at": updated_at, "id": {"$lt": notification_id}},
+            ]
+        docs = await self.db.notifications.find(
+            query, {"_id": 0, "actor_ids": 0}
+        ).sort([("updated_at", -1), ("id", -1)]).limit(limit + 1).to_list(limit + 1)
+        for doc in docs:
+            doc["updated_at"] = doc["updated_at"].replace(tzinfo=timezone.utc)
+        next_cursor = encode_cursor(docs[limit - 1]) if len(docs) > limit else None
+        return docs[:limit], next_cursor
+
+    async def mark_read(self, user_id: str, ids: Optional[list] = None) -> int:
+        query = {"user_id": user_id, "read": False}
+        if ids is not None:
+            query["id"] = {"$in": ids}
+        await self.db.notifications.update_many(query, {"$set": {"read": True}})
+        return 0 if ids is None else await self.unread(user_id)
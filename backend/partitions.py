@@ -0,0 +1,233 @@
+import logging
+import os
+import time
+from datetime import datetime, timezone
+from typing import Optional
+
+from pymongo import UpdateOne
+
+logger = logging.getLogger(__name__)
+
+# Time-bucketed feeds
+#
+# Every animation carries `bucket`, the month it was created in ("2026-10"),
+# and `animations` is indexed on (bucket, created_at) and (bucket, category,
+# created_at), which is also the shard key layout if the collection is ever
+# sharded. Feed reads go through PartitionRouter.find_page: buckets are
+# scanned newest first and the scan stops as soon as the page is full, so a
+# page only touches the index ranges of the last few months however large
+# the catalogue grows. Deep pages skip whole buckets by their counts instead
+# of walking their index entries; counts of past months are cached for
+# BUCKET_COUNT_TTL seconds, the current month is always counted. Moving
+# animations between the hot and archive tiers changes past months' counts,
+# so the tiering code reports the buckets it touched: this router drops
+# their counts at once, and a generation in `counters` makes every other
+# process drop its cached counts at its next refresh (BUCKET_REFRESH).
+# Queries other than the global and category feeds are passed through
+# untouched.
+#
+# Existing databases are migrated with `python partitions.py migrate`.
+# Until no animation lacks a bucket, the router passes everything through.
+
+BUCKET_REFRESH = int(os.environ.get('BUCKET_REFRESH', '60'))
+BUCKET_COUNT_TTL = int(os.environ.get('BUCKET_COUNT_TTL', '300'))
+PARTITIONED_FIELDS = {"category"}
+MIGRATION_BATCH = 1000
+
+
+def bucket_of(created_at) -> str:
+    if isinstance(created_at, datetime):
+        return created_at.strftime("%Y-%m")
+    return created_at[:7]
+
+
+def current_bucket() -> str:
+    return bucket_of(datetime.now(timezone.utc))
+
+
+class PartitionRouter:
+    def __init__(self, db):
+        self.db = db
+        self.ready = False
+        self._buckets = []
+        self._buckets_at = float("-inf")
+        # (bucket, category) -> (count, expires_at)
+        self._counts = {}
+        self._generation = None
+
+    async def ensure_indexes(self):
+        await self.db.animations.create_index([("bucket", -1), ("created_at", -1)])
+        await self.db.animations.create_index([("bucket", -1), ("category", 1), ("created_at", -1)])
+
+    async def refresh(self):
+        self.ready = await self.db.animations.find_one({"bucket": None}, {"_id": 1}) is None
+        if self.ready:
+            self._buckets = sorted(await self.db.animations.distinct("bucket"), reverse=True)
+        counter = await self.db.counters.find_one({"_id": "partitions"})
+        generation = counter["generation"] if counter else 0
+        if generation != self._generation:
+            self._counts.clear()
+            self._generation = generation
+        self._buckets_at = time.monotonic()
+
+    async def buckets(self) -> list:
+        """Newest first, always including the current month."""
+        if time.monotonic() - self._buckets_at > BUCKET_REFRESH:
+            await self.refresh()
+        current = current_bucket()
+        if not self._buckets or self._buckets[0] < current:
+            return [current] + self._buckets
+        return self._buckets
+
+    def routes(self, query: dict) -> bool:
+        return set(query) <= PARTITIONED_FIELDS and all(isinstance(value, str) for value in query.values())
+
+    async def count(self, bucket: str, query: dict) -> int:
+        key = (bucket, query.get("category"))
+        cached = self._counts.get(key)
+        now = time.monotonic()
+        if cached and cached[1] > now and bucket != current_bucket():
+            return cached[0]
+        count = await self.db.animations.count_documents({"bucket": bucket, **query})
+        self._counts[key] = (count, now + BUCKET_COUNT_TTL)
+        return count
+
+    async def buckets_changed(self, buckets: set):
+        """Animations in `buckets` moved between tiers; their cached counts are stale."""
+        for key in [key for key in self._counts if key[0] in buckets]:
+            del self._counts[key]
+        await self.db.counters.update_one({"_id": "partitions"}, {"$inc": {"generation": 1}}, upsert=True)
+
+    async def find_page(self, query: dict, skip: int, limit: int, projection: Optional[dict] = None) -> list:
+        """A created_at-descending page, read bucket by bucket from the newest."""
+        projection = projection or {"_id": 0}
+        buckets = await self.buckets()
+        if not self.ready or not self.routes(query):
+            return await self.db.animations.find(
+                query, projection
+            ).sort("created_at", -1).skip(skip).limit(limit).to_list(limit)
+
+        page = []
+        for bucket in buckets:
+            if skip:
+                count = await self.count(bucket, query)
+                if skip >= count:
+                    skip -= count
+                    continue
+            remaining = limit - len(page)
+            page += await self.db.animations.find(
+                {"bucket": bucket, **query}, projection
+            ).sort("created_at", -1).skip(skip).limit(remaining).to_list(remaining)
+            skip = 0
+            if len(page) == limit:
+                break
+        return page
+
+    # Migration
+
+    async def migrate(self, batch_size: int = MIGRATION_BATCH) -> int:
+        """Set `bucket` on every animation that lacks one; safe to rerun."""
+        await self.ensure_indexes()
+        migrated = 0
+        while True:
+            docs = await self.db.animations.find(
+                {"bucket": None}, {"_id": 1, "created_at": 1}
+            ).limit(batch_size).to_list(batch_size)
+            if not docs:
+                break
+            result = await self.db.animations.bulk_write([
+                UpdateOne({"_id": doc["_id"]}, {"$set": {"bucket": bucket_of(doc["created_at"])}})
+                for doc in docs
+            ], ordered=False)
+            migrated += result.modified_count
+            logger.info("Assigned buckets to %d animations", migrated)
+        await self.refresh()
+        return migrated
+
+
+# Benchmark: feed latency for growing catalogues, bucketed vs a single index
+
+async def benchmark(db, sizes: list, per_month: int, repeats: int) -> list:
+    import random
+    import uuid
+    from datetime import timedelta
+
+    router = PartitionRouter(db)
+    categories = ["Fade", "Slide", "Rotate", "Bounce", "Scale", "Special Effects"]
+    await db.animations.drop()
+    await db.animations.create_index([("created_at", -1)])
+    await db.animations.create_index([("category", 1), ("created_at", -1)])
+    await router.ensure_indexes()
+
+    rng = random.Random(45)
+    now = datetime.now(timezone.utc)
+    total, rows = 0, []
+    for size in sizes:
+        # A steady per_month posting rate: a bigger catalogue reaches further
+        # into the past, while the recent months the feed reads stay the same
+        covered, span = timedelta(days=30 * total / per_month), timedelta(days=30 * size / per_month)
+        docs = []
+        for _ in range(size - total):
+            created_at = now - covered - (span - covered) * rng.random()
+            docs.append({
+                "id": str(uuid.uuid4()), "title": "Benchmark", "css_code": "",
+                "category": rng.choice(categories), "shape_type": "cube",
+                "user_id": "bench", "username": "bench", "created_at": created_at.isoformat(),
+                "bucket": bucket_of(created_at), "likes": [],
+            })
+        for start in range(0, len(docs), 10000):
+            await db.animations.insert_many(docs[start:start + 10000], ordered=False)
+        total = size
+        await router.refresh()
+
+        for name, query, skip in (("feed", {}, 0), ("category", {"category": "Rotate"}, 0), ("page 40", {}, 2000)):
+            timings = {}
+            for label, read in (
+                ("single", lambda: db.animations.find(query, {"_id": 0}).sort("created_at", -1)
+                    .skip(skip).limit(50).to_list(50)),
+                ("bucketed", lambda: router.find_page(query, skip, 50)),
+            ):
+                await read()
+                started = time.perf_counter()
+                for _ in range(repeats):
+                    await read()
+                timings[label] = (time.perf_counter() - started) / repeats * 1000
+            rows.append({"animations": size, "read": name, **{k: round(v, 2) for k, v in timings.items()}})
+    return rows
+
+
+if __name__ == "__main__":
+    import argparse
+    import asyncio
+    import json
+    from pathlib import Path
+    from dotenv import load_dotenv
+    from motor.motor_asyncio import AsyncIOMotorClient
+
+    load_dotenv(Path(__file__).parent / '.env')
+
+    parser = argparse.ArgumentParser(description="Assign month buckets to animations, or benchmark bucketed feeds")
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("migrate", help="Set `bucket` on animations that lack one and create the bucket indexes")
+    bench = commands.add_parser("bench", help="Compare feed latency on a scratch database as it grows")
+    bench.add_argument("--db", default="css_animations_partition_bench")
+    bench.add_argument("--sizes", default="10000,100000,1000000")
+    bench.add_argument("--per-month", type=int, default=5000, help="Animations posted per month")
+    bench.add_argument("--repeats", type=int, default=50)
+    args = parser.parse_args()
+
+    async def main():
+        client = AsyncIOMotorClient(os.environ['MONGO_URL'])
+        if args.command == "migrate":
+            migrated = await PartitionRouter(client[os.environ['DB_NAME']]).migrate()
+            print(f"✓ Assigned buckets to {migrated} animations")
+        else:
+            rows = await benchmark(client[args.db], [int(size) for size in args.sizes.split(",")],
+                                   args.per_month, args.repeats)
+            await client.drop_database(args.db)
+            print(f"{'animations':>12} {'read':>10} {'single ms':>10} {'bucketed ms':>12}")
+            for row in rows:
+                print(f"{row['animations']:>12} {row['read']:>10} {row['single']:>10} {row['bucketed']:>12}")
+            print(json.dumps(rows))
+
+    asyncio.run(main())
@@ -0,0 +1,245 @@
+import hashlib
+import math
+import re
+import time
+from collections import OrderedDict
+from typing import Optional
+
+from css import DECLARATION, KEYFRAMES, STOP
+from ratelimit import TokenBuckets
+
+# Static poster frames
+#
+# Feed cards show a small SVG rendered here instead of running every CSS
+# animation at once. The renderer reads the @keyframes used by the card's
+# `animation`, interpolates opacity and transform linearly between stops
+# (easing is ignored) and draws the card's shape at fixed points of the
+# cycle: one frame for the poster, STRIP_FRAMES frames side by side for the
+# sprite strip. Transforms are reduced to translate/rotate/scale/skew; 3D
+# rotations become foreshortening. URLs carry a hash of the CSS, the shape
+# and RENDERER_VERSION, so responses can be cached forever and change
+# whenever any of them does. Renders are memoized per hash and rate-limited.
+
+RENDERER_VERSION = 1
+FRAME_WIDTH, FRAME_HEIGHT = 320, 180
+STRIP_FRAMES = 8
+POSTER_TIMES = (0.5, 0.75, 0.25, 1.0, 0.0)
+RENDER_RATE, RENDER_BURST = 50, 200
+MEMO_SIZE = 2048
+
+# Mirrors the shapes drawn by AnimationPreview (small variant)
+SHAPES = {
+    "cube": {"width": 80, "height": 80, "radius": 8, "colors": ("#667eea", "#764ba2")},
+    "square": {"width": 80, "height": 80, "radius": 0, "colors": ("#f093fb", "#f5576c")},
+    "circle": {"width": 80, "height": 80, "radius": 40, "colors": ("#4facfe", "#00f2fe")},
+    "rectangle": {"width": 120, "height": 80, "radius": 8, "colors": ("#43e97b", "#38f9d7")},
+}
+
+ANIMATION_NAME = re.compile(r"animation(?:-name)?\s*:\s*([^;}]+)", re.I)
+FUNCTION = re.compile(r"([\w]+)\(([^)]*)\)")
+LENGTH = re.compile(r"(-?\d*\.?\d+)\s*(px|%|deg|rad|turn|grad)?")
+
+# tx, ty, sx, sy, rotate, skew x, skew y, rotate x, rotate y
+IDENTITY = (0.0, 0.0, 1.0, 1.0, 0.0, 0.0, 0.0, 0.0, 0.0)
+
+
+def poster_hash(css_code: str, shape_type: str) -> str:
+    digest = hashlib.sha256(f"{RENDERER_VERSION}\0{shape_type}\0{css_code}".encode())
+    return digest.hexdigest()[:20]
+
+
+def _number(token: str, size: float = 0.0) -> float:
+    match = LENGTH.match(token.strip())
+    if not match:
+        return 0.0
+    value, unit = float(match.group(1)), match.group(2)
+    if not math.isfinite(value):
+        # Hundreds of digits overflow to inf, which the SVG would carry as nan
+        return 0.0
+    if unit == "%":
+        return value / 100 * size
+    if unit == "rad":
+        return math.degrees(value)
+    if unit == "turn":
+        return value * 360
+    if unit == "grad":
+        return value * 0.9
+    return value
+
+
+def parse_transform(value: str, width: float, height: float) -> tuple:
+    tx, ty, sx, sy, rotate, skew_x, skew_y, rotate_x, rotate_y = IDENTITY
+    for name, raw_args in FUNCTION.findall(value):
+        name = name.lower()
+        args = [arg for arg in re.split(r"[\s,]+", raw_args.strip()) if arg]
+        if not args:
+            continue
+        if name in ("translate", "translate3d"):
+            tx += _number(args[0], width)
+            ty += _number(args[1], height) if len(args) > 1 else 0
+        elif name == "translatex":
+            tx += _number(args[0], width)
+        elif name == "translatey":
+            ty += _number(args[0], height)
+        elif name in ("scale", "scale3d"):
+            sx *= _number(args[0])
+            sy *= _number(args[1]) if len(args) > 1 else _number(args[0])
+        elif name == "scalex":
+            sx *= _number(args[0])
+        elif name == "scaley":
+            sy *= _number(args[0])
+        elif name in ("rotate", "rotatez"):
+            rotate += _number(args[0])
+        elif name == "rotatex":
+            rotate_x += _number(args[0])
+        elif name == "rotatey":
+            rotate_y += _number(args[0])
+        elif name == "rotate3d" and len(args) == 4:
+            x, y, z = (_number(arg) for arg in args[:3])
+            norm = math.sqrt(x * x + y * y + z * z) or 1.0
+            angle = _number(args[3])
+            rotate_x += angle * x / norm
+            rotate_y += angle * y / norm
+            rotate += angle * z / norm
+        elif name == "skew":
+            skew_x += _number(args[0])
+            skew_y += _number(args[1]) if len(args) > 1 else 0
+        elif name == "skewx":
+            skew_x += _number(args[0])
+        elif name == "skewy":
+            skew_y += _number(args[0])
+    return (tx, ty, sx, sy, rotate, skew_x, skew_y, rotate_x, rotate_y)
+
+
+def parse_keyframes(css_code: str, width: float, height: float) -> dict:
+    """{"opacity": [(offset, value)], "transform": [(offset, components)]} for the card's animation."""
+    blocks = {name: body for name, body in KEYFRAMES.findall(css_code)}
+    if not blocks:
+        return {"opacity": [], "transform": []}
+    body = next(iter(blocks.values()))
+    for declaration in ANIMATION_NAME.findall(css_code):
+        used = [token for token in declaration.split() if token in blocks]
+        if used:
+            body = blocks[used[0]]
+            break
+
+    tracks = {"opacity": [], "transform": []}
+    for selectors, declarations in STOP.findall(body):
+        offsets = []
+        for selector in selectors.split(","):
+            selector = selector.strip().lower()
+            offsets.append(0.0 if selector == "from" else 1.0 if selector == "to" else float(selector[:-1]) / 100)
+        for name, value in DECLARATION.findall(declarations):
+            name, value = name.lower(), value.strip()
+            if name == "opacity":
+                parsed = min(1.0, max(0.0, _number(value) if value else 1.0))
+            elif name == "transform":
+                parsed = IDENTITY if value == "none" else parse_transform(value, width, height)
+            else:
+                continue
+            tracks[name].extend((offset, parsed) for offset in offsets)
+    for name in tracks:
+        tracks[name].sort(key=lambda point: point[0])
+    return tracks
+
+
+def _sample(track: list, t: float, default):
+    if not track:
+        return default
+    points = list(track)
+    if points[0][0] > 0:
+        points.insert(0, (0.0, default))
+    if points[-1][0] < 1:
+        points.append((1.0, default))
+    for (start, a), (end, b) in zip(points, points[1:]):
+        if start <= t <= end:
+            f = 0.0 if end == start else (t - start) / (end - start)
+            if isinstance(a, tuple):
+                return tuple(x + (y - x) * f for x, y in zip(a, b))
+            return a + (b - a) * f
+    return points[-1][1]
+
+
+def sample(tracks: dict, t: float) -> tuple:
+    return _sample(tracks["opacity"], t, 1.0), _sample(tracks["transform"], t, IDENTITY)
+
+
+def _visibility(opacity: float, components: tuple) -> float:
+    tx, ty, sx, sy, _, _, _, rotate_x, rotate_y = components
+    on_canvas = abs(tx) < FRAME_WIDTH / 2 and abs(ty) < FRAME_HEIGHT / 2
+    foreshortening = abs(math.cos(math.radians(rotate_x)) * math.cos(math.radians(rotate_y)))
+    return opacity * min(1.0, abs(sx * sy) * foreshortening) * on_canvas
+
+
+def _frame(shape: dict, opacity: float, components: tuple) -> str:
+    tx, ty, sx, sy, rotate, skew_x, skew_y, rotate_x, rotate_y = components
+    sx *= math.cos(math.radians(rotate_y))
+    sy *= math.cos(math.radians(rotate_x))
+    width, height = shape["width"], shape["height"]
+    return (
+        f'<g opacity="{opacity:.3f}" transform="translate({FRAME_WIDTH / 2 + tx:.2f} {FRAME_HEIGHT / 2 + ty:.2f}) '
+        f'rotate({rotate:.2f}) skewX({skew_x:.2f}) skewY({skew_y:.2f}) scale({sx:.3f} {sy:.3f})">'
+        f'<rect x="{-width / 2}" y="{-height / 2}" width="{width}" height="{height}" '
+        f'rx="{shape["radius"]}" fill="url(#fill)"/></g>'
+    )
+
+
+def render_svg(css_code: str, shape_type: str, frames: int = 1) -> str:
+    """A poster (frames=1) or a horizontal strip of `frames` evenly spaced frames."""
+    shape = SHAPES.get(shape_type, SHAPES["cube"])
+    tracks = parse_keyframes(css_code, shape["width"], shape["height"])
+    if frames == 1:
+        samples = [sample(tracks, t) for t in POSTER_TIMES]
+        good = [s for s in samples if _visibility(*s) >= 0.5]
+        samples = [good[0] if good else max(samples, key=lambda s: _visibility(*s))]
+    else:
+        samples = [sample(tracks, i / frames) for i in range(frames)]
+
+    start, end = shape["colors"]
+    width = FRAME_WIDTH * len(samples)
+    body = "".join(
+        f'<svg x="{i * FRAME_WIDTH}" width="{FRAME_WIDTH}" height="{FRAME_HEIGHT}" overflow="hidden">'
+        f'{_frame(shape, opacity, components)}</svg>'
+        for i, (opacity, components) in enumerate(samples)
+    )
+    return (
+        f'<svg xmlns="http://www.w3.org/2000/svg" width="{width}" height="{FRAME_HEIGHT}" '
+        f'viewBox="0 0 {width} {FRAME_HEIGHT}">'
+        f'<defs><linearGradient id="fill" x1="0" y1="0" x2="1" y2="1">'
+        f'<stop offset="0" stop-color="{start}"/><stop offset="1" stop-color="{end}"/>'
+        f'</linearGradient></defs>{body}</svg>'
+    )
+
+
+class PosterRenderer:
+    """Memoizes rendered SVGs per (hash, frames) and rate-limits fresh renders."""
+
+    def __init__(self, rate: float = RENDER_RATE, burst: int = RENDER_BURST, memo_size: int = MEMO_SIZE):
+        self._bucket = TokenBuckets(rate, burst, max_keys=1)
+        self._memo = OrderedDict()
+        self.memo_size = memo_size
+        self.renders = 0
+
+    def cached(self, key: str) -> Optional[str]:
+        svg = self._memo.get(key)
+        if svg is not None:
+            self._memo.move_to_end(key)
+        return svg
+
+    def remember(self, key: str, svg: str):
+        self._memo[key] = svg
+        if len(self._memo) > self.memo_size:
+            self._memo.popitem(last=False)
+
+    def render(self, key: str, css_code: str, shape_type: str, frames: int = 1) -> tuple:
+        """Return (svg, 0) or (None, seconds to wait) when the render budget is spent."""
+        svg = self.cached(key)
+        if svg is not None:
+            return svg, 0
+        wait = self._bucket.take("render", time.monotonic())
+        if wait:
+            return None, wait
+        svg = render_svg(css_code, shape_type, frames)
+        self.renders += 1
+        self.remember(key, svg)
+        return svg, 0
@@ -0,0 +1,250 @@
+import asyncio
+import cProfile
+import logging
+import os
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from pathlib import Path
+from typing import Optional
+from urllib.parse import parse_qs
+
+import jwt
+
+logger = logging.getLogger(__name__)
+
+# Admin profiling
+#
+# Off unless PROFILE_ADMINS lists user ids; with it empty the middleware is a
+# single flag check. An admin request carrying `X-Profile: cprofile` (or
+# `pyinstrument`, when installed) runs under that profiler and the result is
+# written to PROFILE_DIR; the response names the file in `X-Profile-Id`.
+# cProfile writes .pstats (flameprof, snakeviz, gprof2dot), pyinstrument
+# writes a speedscope JSON. Both profile the event loop thread, so cProfile
+# also counts whatever other requests ran while this one was awaiting; one
+# capture runs at a time and further requests go through unprofiled.
+#
+# sample() records whole-process stacks for a few seconds: a thread samples
+# what the loop thread is executing ("cpu;...") and the loop itself records
+# where every task is suspended ("await;..."), which is where Mongo and
+# Redis waits show up. Samples are written as folded stacks, one
+# "frame;frame;frame count" line per distinct stack, ready for
+# flamegraph.pl or speedscope. The newest MAX_PROFILES files are kept.
+
+PROFILE_ADMINS = frozenset(filter(None, os.environ.get('PROFILE_ADMINS', '').split(',')))
+PROFILE_DIR = Path(os.environ.get('PROFILE_DIR', '/tmp/css-animations-profiles'))
+SAMPLE_INTERVAL = float(os.environ.get('PROFILE_SAMPLE_INTERVAL', '0.005'))
+MAX_SAMPLE_SECONDS = 60
+MAX_PROFILES = 50
+PROFILE_HEADER = b"x-profile"
+PROFILERS = ("cprofile", "pyinstrument")
+PROFILE_NAME = re.compile(r"^[\w.-]+$")
+
+
+def frame_label(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})"
+
+
+def thread_stack(frame) -> list:
+    """Root-first labels for a thread's current frame."""
+    labels = []
+    while frame is not None:
+        labels.append(frame_label(frame))
+        frame = frame.f_back
+    labels.reverse()
+    return labels
+
+
+def task_stack(task) -> list:
+    """Outermost-first labels for the coroutine chain a task is suspended in."""
+    labels = []
+    awaitable = task.get_coro()
+    while awaitable is not None:
+        frame = getattr(awaitable, "cr_frame", None) or getattr(awaitable, "gi_frame", None)
+        if frame is None:
+            break
+        labels.append(frame_label(frame))
+        awaitable = getattr(awaitable, "cr_await", None) or getattr(awaitable, "gi_yieldfrom", None)
+    return labels
+
+
+def folded(counts: Counter) -> str:
+    return "".join(f"{stack} {count}\n" for stack, count in counts.most_common())
+
+
+class Profiler:
+    def __init__(self, secret_key: str, algorithm: str, admins=PROFILE_ADMINS,
+                 directory: Path = PROFILE_DIR, interval: float = SAMPLE_INTERVAL):
+        self.secret_key = secret_key
+        self.algorithm = algorithm
+        self.admins = frozenset(admins)
+        self.directory = Path(directory)
+        self.interval = interval
+        self._capturing = False
+        self._sampling = asyncio.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.admins)
+
+    @property
+    def sampling(self) -> bool:
+        return self._sampling.locked()
+
+    def is_admin(self, token: Optional[str]) -> bool:
+        if not token or not self.enabled:
+            return False
+        try:
+            payload = jwt.decode(token, self.secret_key, algorithms=[self.algorithm])
+        except jwt.InvalidTokenError:
+            return False
+        return payload.get("user_id") in self.admins
+
+    # Storage
+
+    def new_name(self, kind: str, label: str, extension: str) -> str:
+        slug = re.sub(r"[^\w]+", "-", label).strip("-")[:60] or "root"
+        return f"{time.strftime('%Y%m%dT%H%M%S')}-{os.getpid()}-{kind}-{slug}.{extension}"
+
+    def save(self, name: str, content) -> Path:
+        self.directory.mkdir(parents=True, exist_ok=True)
+        path = self.directory / name
+        if isinstance(content, str):
+            content = content.encode()
+        path.write_bytes(content)
+        self._prune()
+        return path
+
+    def _prune(self):
+        for old in self.list()[MAX_PROFILES:]:
+            (self.directory / old["name"]).unlink(missing_ok=True)
+
+    def list(self) -> list:
+        if not self.directory.is_dir():
+            return []
+        entries = [
+            {"name": path.name, "size": stat.st_size, "created_at": stat.st_mtime}
+            for path in self.directory.iterdir() if path.is_file()
+            for stat in (path.stat(),)
+        ]
+        return sorted(entries, key=lambda entry: entry["created_at"], reverse=True)
+
+    def path(self, name: str) -> Optional[Path]:
+        if not PROFILE_NAME.match(name):
+            return None
+        path = self.directory / name
+        return path if path.is_file() else None
+
+    # Per-request capture
+
+    def start_capture(self, kind: str):
+        """A started profiler for one request, or None when one is already running."""
+        if self._capturing:
+            return None
+        if kind == "pyinstrument":
+            from pyinstrument import Profiler as Pyinstrument
+            profile = Pyinstrument(interval=self.interval, async_mode="enabled")
+            profile.start()
+        else:
+            profile = cProfile.Profile()
+            profile.enable()
+        self._capturing = True
+        return profile
+
+    def finish_capture(self, kind: str, profile, name: str):
+        self._capturing = False
+        if kind == "pyinstrument":
+            from pyinstrument.renderers import SpeedscopeRenderer
+            profile.stop()
+            self.save(name, profile.output(renderer=SpeedscopeRenderer()))
+        else:
+            profile.disable()
+            self.directory.mkdir(parents=True, exist_ok=True)
+            profile.dump_stats(str(self.directory / name))
+            self._prune()
+
+    # Whole-process sampling
+
+    def _sample_thread(self, thread_id: int, stop: threading.Event, counts: Counter):
+        me = threading.get_ident()
+        while not stop.wait(self.interval):
+            frame = sys._current_frames().get(thread_id)
+            if frame is not None and thread_id != me:
+                counts["cpu;" + ";".join(thread_stack(frame))] += 1
+
+    async def sample(self, seconds: float) -> tuple:
+        """Sample for `seconds`; returns (stored file name, sample count)."""
+        seconds = max(0.1, min(seconds, MAX_SAMPLE_SECONDS))
+        async with self._sampling:
+            loop = asyncio.get_running_loop()
+            cpu, waits = Counter(), Counter()
+            stop = threading.Event()
+            sampler = threading.Thread(
+                target=self._sample_thread, args=(threading.get_ident(), stop, cpu),
+                name="profile-sampler", daemon=True
+            )
+            sampler.start()
+            current = asyncio.current_task()
+            deadline = loop.time() + seconds
+            try:
+                while loop.time() < deadline:
+                    for task in asyncio.all_tasks():
+                        if task is not current:
+                            stack = task_stack(task)
+                            if stack:
+                                waits["await;" + ";".join(stack)] += 1
+                    # Task stacks are cheap to walk but not free; record them less often than CPU samples
+                    await asyncio.sleep(self.interval * 4)
+            finally:
+                stop.set()
+                await loop.run_in_executor(None, sampler.join)
+
+            name = self.new_name("sample", f"{seconds:g}s", "folded")
+            self.save(name, folded(cpu + waits))
+            return name, sum(cpu.values()) + sum(waits.values())
+
+
+class ProfilingMiddleware:
+    def __init__(self, app, profiler: Profiler):
+        self.app = app
+        self.profiler = profiler
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self.profiler.enabled:
+            await self.app(scope, receive, send)
+            return
+
+        kind = next((value.decode("latin-1").strip().lower()
+                     for name, value in scope.get("headers", ()) if name == PROFILE_HEADER), None)
+        if kind not in PROFILERS:
+            await self.app(scope, receive, send)
+            return
+        query = parse_qs(scope.get("query_string", b"").decode("latin-1"))
+        if not self.profiler.is_admin(query.get("token", [None])[0]):
+            await self.app(scope, receive, send)
+            return
+
+        try:
+            profile = self.profiler.start_capture(kind)
+        except ImportError:
+            logger.warning("X-Profile: %s requested but it is not installed", kind)
+            profile = None
+        if profile is None:
+            await self.app(scope, receive, send)
+            return
+
+        extension = "speedscope.json" if kind == "pyinstrument" else "pstats"
+        name = self.profiler.new_name(kind, f"{scope['method']} {scope['path']}", extension)
+
+        async def send_with_id(message):
+            if message["type"] == "http.response.start":
+                message = {**message, "headers": [*message.get("headers", []), (b"x-profile-id", name.encode())]}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_id)
+        finally:
+            self.profiler.finish_capture(kind, profile, name)
@@ -0,0 +1,38 @@
+import time
+from collections import OrderedDict
+
+# Token buckets
+#
+# Shared by admission control (one bucket per client and route class) and
+# the poster renderer (one bucket for the whole worker). Each bucket holds
+# up to `burst` tokens and refills at `rate` per second.
+
+MAX_TRACKED_KEYS = 50000
+
+
+class TokenBuckets:
+    """Token bucket per key; least recently seen keys are evicted past max_keys."""
+
+    def __init__(self, rate: float, burst: int, max_keys: int = MAX_TRACKED_KEYS):
+        self.rate = rate
+        self.burst = burst
+        self.max_keys = max_keys
+        self._buckets = OrderedDict()
+
+    def take(self, key: str, now: float = None) -> float:
+        """Consume one token; return 0 on success or the seconds until one is available."""
+        now = time.monotonic() if now is None else now
+        tokens, updated_at = self._buckets.pop(key, (self.burst, now))
+        tokens = min(self.burst, tokens + (now - updated_at) * self.rate)
+        if tokens >= 1:
+            tokens -= 1
+            wait = 0.0
+        else:
+            wait = (1 - tokens) / self.rate
+        self._buckets[key] = (tokens, now)
+        if len(self._buckets) > self.max_keys:
+            self._buckets.popitem(last=False)
+        return wait
+
+    def __len__(self):
+        return len(self._buckets)
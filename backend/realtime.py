@@ -0,0 +1,217 @@
+import asyncio
+import json
+import logging
+import os
+from collections import defaultdict
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+# Live updates
+#
+# Writes report like changes and new posts to the hub, which coalesces them
+# for COALESCE_INTERVAL and then publishes one message per animation / feed
+# through the broker. Every worker's hub receives broker messages and fans
+# them out to its own connections. Only RedisBroker reaches other worker
+# processes, so with more than one worker (WEB_CONCURRENCY) the hub refuses
+# to start without it. Each connection owns a bounded send buffer; a slow
+# client loses its oldest messages (they are snapshots, a newer one
+# supersedes them) instead of holding up the publisher.
+
+COALESCE_INTERVAL = float(os.environ.get('REALTIME_COALESCE_INTERVAL', '0.25'))
+SEND_BUFFER_SIZE = int(os.environ.get('REALTIME_SEND_BUFFER', '100'))
+HEARTBEAT_INTERVAL = 15
+
+
+def animation_topic(animation_id: str) -> str:
+    return f"animation:{animation_id}"
+
+
+def feed_topic(feed: str) -> str:
+    return f"feed:{feed}"
+
+
+class Subscription:
+    def __init__(self, topics, maxsize: int = SEND_BUFFER_SIZE):
+        self.topics = frozenset(topics)
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize)
+        self.dropped = 0
+
+    def offer(self, message: dict):
+        if self.queue.full():
+            self.queue.get_nowait()
+            self.dropped += 1
+        self.queue.put_nowait(message)
+
+
+class PubSub:
+    """In-process topic fan-out to subscriptions."""
+
+    def __init__(self):
+        self._subscribers = defaultdict(set)
+
+    def subscribe(self, topics, maxsize: int = SEND_BUFFER_SIZE) -> Subscription:
+        subscription = Subscription(topics, maxsize)
+        for topic in subscription.topics:
+            self._subscribers[topic].add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        for topic in subscription.topics:
+            subscribers = self._subscribers.get(topic)
+            if subscribers is not None:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._subscribers[topic]
+
+    def publish(self, topic: str, message: dict) -> int:
+        subscribers = self._subscribers.get(topic, ())
+        for subscription in subscribers:
+            subscription.offer(message)
+        return len(subscribers)
+
+    @property
+    def connection_count(self) -> int:
+        return len({s for subscribers in self._subscribers.values() for s in subscribers})
+
+
+class LocalBroker:
+    """Stand-in for a cross-worker broker: delivers to every hub in this process."""
+
+    _hubs: set = set()
+
+    async def start(self, deliver):
+        self._deliver = deliver
+        LocalBroker._hubs.add(self)
+
+    async def publish(self, topic: str, message: dict):
+        payload = json.loads(json.dumps(message))
+        for broker in list(LocalBroker._hubs):
+            broker._deliver(topic, payload)
+
+    async def stop(self):
+        LocalBroker._hubs.discard(self)
+
+
+class RedisBroker:
+    """Redis pub/sub broker shared by every worker."""
+
+    channel = "cssanim:realtime"
+
+    def __init__(self, url: str):
+        try:
+            import redis.asyncio as redis
+        except ImportError as exc:
+            raise RuntimeError("Realtime over Redis requires the 'redis' package") from exc
+        self._redis = redis.from_url(url)
+        self._listener: Optional[asyncio.Task] = None
+
+    async def start(self, deliver):
+        pubsub = self._redis.pubsub()
+        await pubsub.subscribe(self.channel)
+
+        async def listen():
+            async for item in pubsub.listen():
+                if item.get("type") != "message":
+                    continue
+                envelope = json.loads(item["data"])
+                deliver(envelope["topic"], envelope["message"])
+
+        self._listener = asyncio.create_task(listen())
+
+    async def publish(self, topic: str, message: dict):
+        await self._redis.publish(self.channel, json.dumps({"topic": topic, "message": message}))
+
+    async def stop(self):
+        if self._listener is not None:
+            self._listener.cancel()
+        await self._redis.close()
+
+
+def create_broker():
+    """Redis when the shared cache is Redis; the in-process stand-in only serves one worker."""
+    if os.environ.get('CACHE_BACKEND', '').lower() == 'redis' and os.environ.get('REDIS_URL'):
+        return RedisBroker(os.environ['REDIS_URL'])
+    if int(os.environ.get('WEB_CONCURRENCY', '1')) > 1:
+        raise RuntimeError("Live updates across workers need Redis: set CACHE_BACKEND=redis and REDIS_URL")
+    return LocalBroker()
+
+
+class RealtimeHub:
+    def __init__(self, broker=None):
+        self.pubsub = PubSub()
+        self.broker = broker or create_broker()
+        self._likes = {}
+        self._new_posts = defaultdict(int)
+        self._flusher: Optional[asyncio.Task] = None
+
+    # Writers
+
+    def like_changed(self, animation_id: str, delta: int, likes_count: int):
+        pending = self._likes.setdefault(animation_id, {"delta": 0, "likes_count": likes_count})
+        pending["delta"] += delta
+        pending["likes_count"] = likes_count
+
+    def animation_created(self, animation_id: str, user_id: str, category: str):
+        for feed in ("all", f"user:{user_id}", f"category:{category}"):
+            self._new_posts[feed] += 1
+
+    async def flush(self):
+        likes, self._likes = self._likes, {}
+        new_posts, self._new_posts = self._new_posts, defaultdict(int)
+        for animation_id, pending in likes.items():
+            await self.broker.publish(animation_topic(animation_id), {
+                "type": "likes",
+                "animation_id": animation_id,
+                "delta": pending["delta"],
+                "likes_count": pending["likes_count"],
+            })
+        for feed, count in new_posts.items():
+            await self.broker.publish(feed_topic(feed), {"type": "new_posts", "feed": feed, "count": count})
+
+    # Readers
+
+    def subscribe(self, topics) -> Subscription:
+        return self.pubsub.subscribe(topics)
+
+    def unsubscribe(self, subscription: Subscription):
+        self.pubsub.unsubscribe(subscription)
+
+    async def stream(self, subscription: Subscription, is_disconnected):
+        """Server-Sent Events for one connection."""
+        try:
+            yield "retry: 5000\n\n"
+            while not await is_disconnected():
+                try:
+                    message = await asyncio.wait_for(subscription.queue.get(), HEARTBEAT_INTERVAL)
+                except asyncio.TimeoutError:
+                    yield ": keep-alive\n\n"
+                    continue
+                if subscription.dropped:
+                    yield f"event: lagged\ndata: {json.dumps({'dropped': subscription.dropped})}\n\n"
+                    subscription.dropped = 0
+                yield f"event: {message['type']}\ndata: {json.dumps(message)}\n\n"
+        finally:
+            self.unsubscribe(subscription)
+
+    # Lifecycle
+
+    async def _flush_forever(self):
+        while True:
+            await asyncio.sleep(COALESCE_INTERVAL)
+            try:
+                await self.flush()
+            except Exception:
+                logger.exception("Realtime flush failed")
+
+    async def start(self):
+        await self.broker.start(self.pubsub.publish)
+        if self._flusher is None:
+            self._flusher = asyncio.create_task(self._flush_forever())
+
+    async def stop(self):
+        if self._flusher is not None:
+            self._flusher.cancel()
+            self._flusher = None
+        await self.flush()
+        await self.broker.stop()
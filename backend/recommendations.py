@@ -0,0 +1,225 @@
+import asyncio
+import logging
+import math
+import os
+from datetime import datetime, timezone
+
+from pymongo import ReplaceOne, UpdateOne
+
+logger = logging.getLogger(__name__)
+
+# Who-to-follow recommendations
+#
+# An offline job loads the follow graph and the likes into sparse matrices:
+# F[i, j] = 1 when user i follows user j, L[i, a] = 1 when user i liked
+# animation a. For a user u the candidates are scored by
+#   FOLLOW_WEIGHT * (F[u] @ F)     people followed by the people u follows
+# + COLIKE_WEIGHT * (L[u] @ W @ L.T) people who liked the same animations,
+# where W down-weights animations liked by many users (idf). The top-K per
+# user are written to the `recommendations` collection. follow/unfollow
+# marks both users dirty. `--incremental` recomputes the rows of the dirty
+# users and of their followers (whose second hop just changed), loading
+# only the part of the graph those rows read: the targets, the people they
+# follow and those people's follows, and everyone who liked an animation a
+# target liked.
+
+TOP_K = 20
+FOLLOW_WEIGHT = 1.0
+COLIKE_WEIGHT = 0.5
+WRITE_BATCH = 500
+USER_PROJECTION = {"_id": 0, "id": 1, "username": 1, "profile_picture": 1, "following": 1}
+
+
+def _linalg():
+    # NumPy/SciPy are only needed by the batch job; the API server imports
+    # this module for mark_dirty/suggestions and should not pay for them.
+    import numpy as np
+    from scipy import sparse
+    return np, sparse
+
+
+async def mark_dirty(db, *user_ids: str):
+    now = datetime.now(timezone.utc).isoformat()
+    await db.recommendation_dirty.bulk_write([
+        UpdateOne({"user_id": user_id}, {"$set": {"user_id": user_id, "marked_at": now}}, upsert=True)
+        for user_id in user_ids
+    ], ordered=False)
+
+
+class FollowGraph:
+    def __init__(self, users: list, liked_animations: list):
+        np, sparse = _linalg()
+        self.user_ids = [user["id"] for user in users]
+        self.users = {user["id"]: user for user in users}
+        self.index = {user_id: i for i, user_id in enumerate(self.user_ids)}
+        n = len(self.user_ids)
+
+        rows, cols = [], []
+        for user in users:
+            i = self.index[user["id"]]
+            for followed_id in user.get("following", []):
+                j = self.index.get(followed_id)
+                if j is not None and j != i:
+                    rows.append(i)
+                    cols.append(j)
+        self.follows = sparse.csr_matrix(
+            (np.ones(len(rows), dtype=np.float32), (rows, cols)), shape=(n, n)
+        )
+        self.follows.sum_duplicates()
+        self.follows.data[:] = 1
+
+        rows, cols, weights = [], [], []
+        for a, anim in enumerate(liked_animations):
+            likers = [self.index[user_id] for user_id in set(anim.get("likes", [])) if user_id in self.index]
+            if len(likers) < 2:
+                continue
+            weight = 1.0 / math.log(1 + len(likers))
+            rows.extend(likers)
+            cols.extend([a] * len(likers))
+            weights.extend([weight] * len(likers))
+        self.likes = sparse.csr_matrix(
+            (np.array(weights, dtype=np.float32), (rows, cols)), shape=(n, max(len(liked_animations), 1))
+        )
+        self.likes_binary = self.likes.copy()
+        self.likes_binary.data[:] = 1
+
+    def recommend(self, user_ids: list, top_k: int = TOP_K) -> dict:
+        np, _ = _linalg()
+        rows = [self.index[user_id] for user_id in user_ids if user_id in self.index]
+        if not rows:
+            return {}
+        mutual = (self.follows[rows] @ self.follows).tocsr()
+        colike_score = (self.likes[rows] @ self.likes_binary.T).tocsr()
+        shared_likes = (self.likes_binary[rows] @ self.likes_binary.T).tocsr()
+        scores = (FOLLOW_WEIGHT * mutual + COLIKE_WEIGHT * colike_score).tocsr()
+
+        results = {}
+        for r, i in enumerate(rows):
+            start, end = scores.indptr[r], scores.indptr[r + 1]
+            candidates = scores.indices[start:end]
+            values = scores.data[start:end]
+            already = set(self.follows.indices[self.follows.indptr[i]:self.follows.indptr[i + 1]])
+            keep = np.array([c != i and c not in already for c in candidates], dtype=bool)
+            candidates, values = candidates[keep], values[keep]
+            if len(candidates) > top_k:
+                best = np.argpartition(-values, top_k)[:top_k]
+                candidates, values = candidates[best], values[best]
+            order = np.argsort(-values, kind="stable")
+            suggestions = []
+            for c, score in zip(candidates[order], values[order]):
+                candidate = self.users[self.user_ids[c]]
+                suggestions.append({
+                    "user_id": candidate["id"],
+                    "username": candidate["username"],
+                    "profile_picture": candidate.get("profile_picture", ""),
+                    "score": round(float(score), 4),
+                    "mutual_follows": int(mutual[r, c]),
+                    "shared_likes": int(shared_likes[r, c]),
+                })
+            results[self.user_ids[i]] = suggestions
+        return results
+
+
+class RecommendationJob:
+    def __init__(self, db):
+        self.db = db
+
+    async def ensure_indexes(self):
+        await self.db.recommendations.create_index("user_id", unique=True)
+        await self.db.recommendation_dirty.create_index("user_id", unique=True)
+
+    async def load_graph(self) -> FollowGraph:
+        users = await self.db.users.find({}, USER_PROJECTION).to_list(None)
+        liked_animations = await self.db.animations.find(
+            {"likes.1": {"$exists": True}}, {"_id": 0, "likes": 1}
+        ).to_list(None)
+        return FollowGraph(users, liked_animations)
+
+    async def _load_users(self, users: dict, user_ids: set, with_following: bool):
+        user_ids = user_ids - users.keys()
+        if not user_ids:
+            return
+        projection = dict(USER_PROJECTION)
+        if not with_following:
+            # Their own follows are not read by any target's row
+            del projection["following"]
+        async for doc in self.db.users.find({"id": {"$in": list(user_ids)}}, projection):
+            users[doc["id"]] = doc
+
+    async def load_neighbourhood(self, user_ids: list) -> tuple:
+        """(graph, targets): the dirty users plus their followers, and the graph their rows read."""
+        dirty = await self.db.users.find({"id": {"$in": user_ids}}, {"_id": 0, "followers": 1}).to_list(None)
+        targets = set(user_ids) | {follower for doc in dirty for follower in doc.get("followers", [])}
+
+        users = {}
+        await self._load_users(users, targets, with_following=True)
+        followed = {followed_id for doc in users.values() for followed_id in doc.get("following", [])}
+        await self._load_users(users, followed, with_following=True)
+        candidates = {followed_id for doc in users.values() for followed_id in doc.get("following", [])}
+        await self._load_users(users, candidates, with_following=False)
+
+        liked_animations = await self.db.animations.find(
+            {"likes": {"$in": list(targets)}, "likes.1": {"$exists": True}}, {"_id": 0, "likes": 1}
+        ).to_list(None)
+        colikers = {user_id for anim in liked_animations for user_id in anim["likes"]}
+        await self._load_users(users, colikers, with_following=False)
+        return FollowGraph(list(users.values()), liked_animations), sorted(targets)
+
+    async def _write(self, results: dict):
+        computed_at = datetime.now(timezone.utc).isoformat()
+        operations = [
+            ReplaceOne(
+                {"user_id": user_id},
+                {"user_id": user_id, "suggestions": suggestions, "computed_at": computed_at},
+                upsert=True
+            )
+            for user_id, suggestions in results.items()
+        ]
+        for start in range(0, len(operations), WRITE_BATCH):
+            await self.db.recommendations.bulk_write(operations[start:start + WRITE_BATCH], ordered=False)
+
+    async def run(self, incremental: bool = False) -> int:
+        started_at = datetime.now(timezone.utc).isoformat()
+        if incremental:
+            dirty = await self.db.recommendation_dirty.find({}, {"_id": 0, "user_id": 1}).to_list(None)
+            if not dirty:
+                return 0
+            graph, user_ids = await self.load_neighbourhood([doc["user_id"] for doc in dirty])
+        else:
+            graph = await self.load_graph()
+            user_ids = graph.user_ids
+
+        count = 0
+        for start in range(0, len(user_ids), WRITE_BATCH):
+            results = graph.recommend(user_ids[start:start + WRITE_BATCH])
+            await self._write(results)
+            count += len(results)
+
+        # Users marked again while the job ran stay dirty for the next run
+        await self.db.recommendation_dirty.delete_many({"marked_at": {"$lte": started_at}})
+        return count
+
+    async def suggestions(self, user_id: str, limit: int = 10) -> list:
+        doc = await self.db.recommendations.find_one(
+            {"user_id": user_id}, {"_id": 0, "suggestions": {"$slice": limit}}
+        )
+        return doc["suggestions"] if doc else []
+
+
+if __name__ == "__main__":
+    import sys
+    from pathlib import Path
+    from dotenv import load_dotenv
+    from motor.motor_asyncio import AsyncIOMotorClient
+
+    load_dotenv(Path(__file__).parent / '.env')
+
+    async def main(incremental: bool):
+        client = AsyncIOMotorClient(os.environ['MONGO_URL'])
+        job = RecommendationJob(client[os.environ['DB_NAME']])
+        await job.ensure_indexes()
+        count = await job.run(incremental=incremental)
+        print(f"✓ Computed suggestions for {count} users{' (incremental)' if incremental else ''}")
+        client.close()
+
+    asyncio.run(main("--incremental" in sys.argv))
@@ -1,19 +1,23 @@
 import asyncio
-from motor.motor_asyncio import AsyncIOMotorClient
 import os
 from dotenv import load_dotenv
 from pathlib import Path
 import uuid
 from datetime import datetime, timezone
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError, DuplicateKeyError
+from partitions import bucket_of
 
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
 
-mongo_url = os.environ['MONGO_URL']
-db_name = os.environ['DB_NAME']
+# Seed animations get ids derived from their title, so every process agrees
+# on them and concurrent seeding collides on the unique id index instead of
+# inserting duplicates.
+SEED_NAMESPACE = uuid.UUID("6f1c3e0a-4d2b-5a8e-9c7f-0b1d2e3f4a5b")
 
-client = AsyncIOMotorClient(mongo_url)
-db = client[db_name]
+def seed_id(title: str) -> str:
+    return str(uuid.uuid5(SEED_NAMESPACE, title))
 
 # Create a default system user for pre-populated animations
 system_user = {
@@ -31,7 +35,6 @@ system_user = {
 animations = [
     # FADE Category
     {
-        "id": str(uuid.uuid4()),
         "title": "Fade In",
         "css_code": """@keyframes fadeIn {
   0% { opacity: 0; }
@@ -51,7 +54,6 @@ animations = [
         "likes_count": 0
     },
     {
-        "id": str(uuid.uuid4()),
         "title": "Fade Out",
         "css_code": """@keyframes fadeOut {
   0% { opacity: 1; }
@@ -71,7 +73,6 @@ animations = [
         "likes_count": 0
     },
     {
-        "id": str(uuid.uuid4()),
         "title": "Fade Slide Up",
         "css_code": """@keyframes fadeSlideUp {
   0% { 
@@ -97,7 +98,6 @@ animations = [
         "likes_count": 0
     },
     {
-        "id": str(uuid.uuid4()),
         "title": "Fade Zoom",
         "css_code": """@keyframes fadeZoom {
   0% { 
@@ -125,7 +125,6 @@ animations = [
     
     # SLIDE Category
     {
-        "id": str(uuid.uuid4()),
         "title": "Slide In Left",
         "css_code": """@keyframes slideInLeft {
   0% { 
@@ -151,7 +150,6 @@ animations = [
         "likes_count": 0
     },
     {
-        "id": str(uuid.uuid4()),
         "title": "Slide In Right",
         "css_code": """@keyframes slideInRight {
   0% { 
@@ -177,7 +175,6 @@ animations = [
         "likes_count": 0
     },
     {
-        "id": str(uuid.uuid4()),
         "title": "Slide Down",
         "css_code": """@keyframes slideDown {
   0% { 
@@ -203,7 +200,6 @@ animations = [
         "likes_count": 0
     },
     {
-        "id": str(uuid.uuid4()),
         "title": "Slide Up",
         "css_code": """@keyframes slideUp {
   0% { 
@@ -231,7 +227,6 @@ animations = [
     
     # ROTATE Category
     {
-        "id": str(uuid.uuid4()),
         "title": "Spin Clockwise",
         "css_code": """@keyframes spinClockwise {
   0% { transform: rotate(0deg); }
@@ -251,7 +246,6 @@ animations = [
         "likes_count": 0
     },
     {
-        "id": str(uuid.uuid4()),
         "title": "Flip Horizontal",
         "css_code": """@keyframes flipHorizontal {
   0% { transform: rotateY(0deg); }
@@ -271,7 +265,6 @@ animations = [
         "likes_count": 0
     },
     {
-        "id": str(uuid.uuid4()),
         "title": "Flip Vertical",
         "css_code": """@keyframes flipVertical {
   0% { transform: rotateX(0deg); }
@@ -291,7 +284,6 @@ animations = [
         "likes_count": 0
     },
     {
-        "id": str(uuid.uuid4()),
         "title": "Rotate 3D",
         "css_code": """@keyframes rotate3D {
   0% { transform: rotate3d(1, 1, 1, 0deg); }
@@ -312,7 +304,6 @@ animations = [
         "likes_count": 0
     },
     {
-        "id": str(uuid.uuid4()),
         "title": "Wobble Rotate",
         "css_code": """@keyframes wobbleRotate {
   0% { transform: rotate(0deg); }
@@ -336,7 +327,6 @@ animations = [
     
     # BOUNCE Category
     {
-        "id": str(uuid.uuid4()),
         "title": "Bounce",
         "css_code": """@keyframes bounce {
   0%, 20%, 50%, 80%, 100% {
@@ -363,7 +353,6 @@ animations = [
         "likes_count": 0
     },
     {
-        "id": str(uuid.uuid4()),
         "title": "Rubber Band",
         "css_code": """@keyframes rubberBand {
   0% { transform: scale(1); }
@@ -388,7 +377,6 @@ animations = [
         "likes_count": 0
     },
     {
-        "id": str(uuid.uuid4()),
         "title": "Shake",
         "css_code": """@keyframes shake {
   0%, 100% { transform: translateX(0); }
@@ -409,7 +397,6 @@ animations = [
         "likes_count": 0
     },
     {
-        "id": str(uuid.uuid4()),
         "title": "Jello",
         "css_code": """@keyframes jello {
   0%, 100% { transform: skewX(0deg) skewY(0deg); }
@@ -433,7 +420,6 @@ animations = [
         "likes_count": 0
     },
     {
-        "id": str(uuid.uuid4()),
         "title": "Swing",
         "css_code": """@keyframes swing {
   20% { transform: rotate(15deg); }
@@ -459,7 +445,6 @@ animations = [
     
     # SCALE Category
     {
-        "id": str(uuid.uuid4()),
         "title": "Zoom In",
         "css_code": """@keyframes zoomIn {
   0% { 
@@ -485,7 +470,6 @@ animations = [
         "likes_count": 0
     },
     {
-        "id": str(uuid.uuid4()),
         "title": "Zoom Out",
         "css_code": """@keyframes zoomOut {
   0% { 
@@ -511,7 +495,6 @@ animations = [
         "likes_count": 0
     },
     {
-        "id": str(uuid.uuid4()),
         "title": "Pulse",
         "css_code": """@keyframes pulse {
   0% { transform: scale(1); }
@@ -532,7 +515,6 @@ animations = [
         "likes_count": 0
     },
     {
-        "id": str(uuid.uuid4()),
         "title": "Heartbeat",
         "css_code": """@keyframes heartbeat {
   0%, 100% { transform: scale(1); }
@@ -555,7 +537,6 @@ animations = [
         "likes_count": 0
     },
     {
-        "id": str(uuid.uuid4()),
         "title": "Expand Vertical",
         "css_code": """@keyframes expandVertical {
   0% { transform: scaleY(0); }
@@ -577,7 +558,6 @@ animations = [
     
     # SPECIAL EFFECTS Category
     {
-        "id": str(uuid.uuid4()),
         "title": "Glow Pulse",
         "css_code": """@keyframes glowPulse {
   0%, 100% {
@@ -602,7 +582,6 @@ animations = [
         "likes_count": 0
     },
     {
-        "id": str(uuid.uuid4()),
         "title": "Shimmer",
         "css_code": """@keyframes shimmer {
   0% {
@@ -633,7 +612,6 @@ animations = [
         "likes_count": 0
     },
     {
-        "id": str(uuid.uuid4()),
         "title": "Wave",
         "css_code": """@keyframes wave {
   0%, 100% {
@@ -661,7 +639,6 @@ animations = [
         "likes_count": 0
     },
     {
-        "id": str(uuid.uuid4()),
         "title": "Flash",
         "css_code": """@keyframes flash {
   0%, 50%, 100% {
@@ -685,7 +662,6 @@ animations = [
         "likes_count": 0
     },
     {
-        "id": str(uuid.uuid4()),
         "title": "Color Change",
         "css_code": """@keyframes colorChange {
   0% { filter: hue-rotate(0deg); }
@@ -705,7 +681,6 @@ animations = [
         "likes_count": 0
     },
     {
-        "id": str(uuid.uuid4()),
         "title": "Float",
         "css_code": """@keyframes float {
   0%, 100% {
@@ -729,7 +704,6 @@ animations = [
         "likes_count": 0
     },
     {
-        "id": str(uuid.uuid4()),
         "title": "Blur In",
         "css_code": """@keyframes blurIn {
   0% {
@@ -755,7 +729,6 @@ animations = [
         "likes_count": 0
     },
     {
-        "id": str(uuid.uuid4()),
         "title": "Neon Glow",
         "css_code": """@keyframes neonGlow {
   0%, 100% {
@@ -785,7 +758,46 @@ animations = [
     }
 ]
 
-async def seed_database():
+for animation in animations:
+    animation["id"] = seed_id(animation["title"])
+
+async def ensure_seed_data(db) -> int:
+    """Idempotently insert the system user and any seed animations missing from both tiers."""
+    try:
+        await db.users.update_one({"id": system_user["id"]}, {"$setOnInsert": system_user}, upsert=True)
+    except DuplicateKeyError:
+        pass
+    
+    # Seeds nobody liked get archived; those are not missing either
+    titles = [animation["title"] for animation in animations]
+    existing_titles = set()
+    for collection in (db.animations, db.animations_archive):
+        existing = await collection.find(
+            {"user_id": system_user["id"], "title": {"$in": titles}},
+            {"_id": 0, "title": 1}
+        ).to_list(len(titles))
+        existing_titles.update(doc["title"] for doc in existing)
+    missing = [animation for animation in animations if animation["title"] not in existing_titles]
+    if not missing:
+        return 0
+    
+    try:
+        result = await db.animations.bulk_write([
+            UpdateOne(
+                {"user_id": system_user["id"], "title": animation["title"]},
+                {"$setOnInsert": {**animation, "bucket": bucket_of(animation["created_at"])}},
+                upsert=True
+            )
+            for animation in missing
+        ], ordered=False)
+        return result.upserted_count
+    except BulkWriteError as exc:
+        # Another worker seeded the same animations concurrently
+        if any(error.get("code") != 11000 for error in exc.details.get("writeErrors", [])):
+            raise
+        return exc.details.get("nUpserted", 0)
+
+async def seed_database(db):
     print("Starting database seeding...")
     
     # Check if system user already exists
@@ -809,7 +821,9 @@ async def seed_database():
             return
     
     # Insert animations
-    await db.animations.insert_many(animations)
+    await db.animations.insert_many([
+        {**animation, "bucket": bucket_of(animation["created_at"])} for animation in animations
+    ])
     print(f"✓ Inserted {len(animations)} animations")
     
     print("\n" + "="*50)
@@ -822,5 +836,8 @@ async def seed_database():
     print(f"  Password: admin123")
 
 if __name__ == "__main__":
-    asyncio.run(seed_database())
+    from motor.motor_asyncio import AsyncIOMotorClient
+    
+    client = AsyncIOMotorClient(os.environ['MONGO_URL'])
+    asyncio.run(seed_database(client[os.environ['DB_NAME']]))
     client.close()
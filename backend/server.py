@@ -1,7 +1,14 @@
-from fastapi import FastAPI, APIRouter, HTTPException, status
+# Must run before the other imports so they are timed (STARTUP_PROFILE=1)
+import startup_profile
+startup_profile.install()
+
+from fastapi import FastAPI, APIRouter, Header, HTTPException, Request, status
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import FileResponse, JSONResponse, PlainTextResponse, Response, StreamingResponse
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
-from motor.motor_asyncio import AsyncIOMotorClient
+import asyncio
+import math
 import os
 import logging
 from pathlib import Path
@@ -9,25 +16,90 @@ from pydantic import BaseModel, Field, ConfigDict, EmailStr
 from typing import List, Optional
 import uuid
 from datetime import datetime, timezone
-from passlib.context import CryptContext
+from functools import lru_cache
 import jwt
 from jwt.exceptions import InvalidTokenError
+from cache import create_cache
+from trending import TrendingEngine, HALF_LIVES, DEFAULT_WINDOW
+from categories import CategoryCatalog
+from realtime import RealtimeHub, animation_topic, feed_topic
+from like_buffer import LikeBuffer
+from admission import AdmissionController, AdmissionMiddleware
+from database import DeferredDatabase
+from recommendations import RecommendationJob, mark_dirty
+from similarity import SimilarityIndex, animation_features, build_index
+from tiering import ArchiveTier
+from partitions import PartitionRouter, bucket_of
+from idempotency import IdempotencyStore
+from posters import PosterRenderer, STRIP_FRAMES, poster_hash
+from notifications import NotificationCenter, summary
+from bloom import TakenNames
+from changelog import ChangeLog
+from catalog import Catalog
+from fragments import FragmentCache, MUTABLE_FIELDS
+from streaming import stream_json, wants_ndjson
+from profiling import Profiler, ProfilingMiddleware
+from pymongo.errors import DuplicateKeyError, OperationFailure
+from seed_animations import ensure_seed_data
+from startup_profile import phase
 
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
 
-# MongoDB connection
-mongo_url = os.environ['MONGO_URL']
-client = AsyncIOMotorClient(mongo_url)
-db = client[os.environ['DB_NAME']]
+# MongoDB connection (opened in the worker's startup hook)
+db = DeferredDatabase()
+SEED_ON_STARTUP = os.environ.get('SEED_ON_STARTUP', 'true').lower() == 'true'
+trending = TrendingEngine(db)
+category_catalog = CategoryCatalog(db)
+realtime = RealtimeHub()
+like_buffer = LikeBuffer(db)
+recommendations = RecommendationJob(db)
+similarity_index = SimilarityIndex()
+partitions = PartitionRouter(db)
+changelog = ChangeLog(db)
+archive_tier = ArchiveTier(db, partitions, changelog)
+idempotency = IdempotencyStore(db)
+posters = PosterRenderer()
+notifications = NotificationCenter(db)
+taken_names = TakenNames(db)
+
+# Password hashing (the bcrypt backend is loaded during startup)
+@lru_cache(maxsize=1)
+def pwd_context():
+    from passlib.context import CryptContext
+    return CryptContext(schemes=["bcrypt"], deprecated="auto")
 
-# Password hashing
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+def load_password_backend():
+    pwd_context().handler("bcrypt").get_backend()
 SECRET_KEY = os.environ.get('SECRET_KEY', 'your-secret-key-change-in-production')
 ALGORITHM = "HS256"
 
+# Shared cache (in-memory per worker by default, Redis when configured)
+cache = create_cache()
+FEED_CACHE_TTL = int(os.environ.get('FEED_CACHE_TTL', '30'))
+WARM_FEED_PAGES = int(os.environ.get('WARM_FEED_PAGES', '2'))
+DEFAULT_FEED_LIMIT = 50
+ENTITY_CACHE_TTL = int(os.environ.get('ENTITY_CACHE_TTL', '300'))
+MAX_BATCH_IDS = 300
+STREAM_BATCH_SIZE = 100
+# User listings longer than this are streamed instead of built in memory
+MAX_USER_ANIMATIONS = 1000
+MAX_STREAM_ANIMATIONS = 100
+MAX_STREAM_FEEDS = 10
+# Animation reads ship the like count, not the likes array
+ANIMATION_PROJECTION = {
+    "_id": 0, "id": 1, "title": 1, "css_code": 1, "category": 1, "shape_type": 1,
+    "user_id": 1, "username": 1, "user_profile_picture": 1, "created_at": 1,
+    "likes_count": {"$size": {"$ifNull": ["$likes", []]}}
+}
+catalog = Catalog(db, changelog, ANIMATION_PROJECTION)
+POSTER_CACHE_TTL = int(os.environ.get('POSTER_CACHE_TTL', str(24 * 3600)))
+
 # Create the main app
 app = FastAPI()
+app.state.ready = False
+profiler = Profiler(SECRET_KEY, ALGORITHM)
+admission = AdmissionController(SECRET_KEY, ALGORITHM, is_admin=profiler.is_admin)
 api_router = APIRouter(prefix="/api")
 
 # Models
@@ -78,6 +150,12 @@ class Animation(BaseModel):
     created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
     likes: List[str] = []
     likes_count: int = 0
+    poster_hash: Optional[str] = None
+
+class AnimationView(Animation):
+    # likes is only sent when asked for; liked_by_me only with a viewer token
+    likes: Optional[List[str]] = None
+    liked_by_me: Optional[bool] = None
 
 class AnimationCreate(BaseModel):
     title: str
@@ -89,12 +167,66 @@ class TokenResponse(BaseModel):
     token: str
     user: User
 
+class BatchRequest(BaseModel):
+    ids: List[str]
+
+class AnimationBatch(BaseModel):
+    animations: List[AnimationView]
+    missing: List[str]
+
+class LikeCountChange(BaseModel):
+    id: str
+    likes_count: int
+    delta: int
+
+class Tombstone(BaseModel):
+    type: str
+    id: str
+
+class SyncResponse(BaseModel):
+    token: int
+    reset: bool = False
+    more: bool = False
+    inserts: List[AnimationView] = []
+    following_inserts: List[str] = []
+    counts: List[LikeCountChange] = []
+    followed: List[str] = []
+    tombstones: List[Tombstone] = []
+
+class UserProfileBatch(BaseModel):
+    users: List[UserProfile]
+    missing: List[str]
+
+class NotificationActor(BaseModel):
+    id: str
+    username: str
+    profile_picture: Optional[str] = ""
+
+class Notification(BaseModel):
+    id: str
+    kind: str
+    target_id: str
+    target_title: Optional[str] = None
+    count: int
+    actors: List[NotificationActor]
+    summary: str
+    read: bool
+    updated_at: datetime
+
+class NotificationPage(BaseModel):
+    notifications: List[Notification]
+    unread: int
+    next_cursor: Optional[str] = None
+
+class MarkReadRequest(BaseModel):
+    ids: Optional[List[str]] = None
+
 # Helper functions
 def hash_password(password: str) -> str:
-    return pwd_context.hash(password)
+    return pwd_context().hash(password)
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
-    return pwd_context.verify(plain_password, hashed_password)
+    return pwd_context().verify(plain_password, hashed_password)
 
 def create_token(user_id: str) -> str:
     return jwt.encode({"user_id": user_id}, SECRET_KEY, algorithm=ALGORITHM)
@@ -106,36 +238,197 @@ def decode_token(token: str) -> str:
     except InvalidTokenError:
         raise HTTPException(status_code=401, detail="Invalid token")
 
+def prepare_animation(anim: dict) -> dict:
+    if isinstance(anim['created_at'], str):
+        anim['created_at'] = datetime.fromisoformat(anim['created_at'])
+    if 'likes' in anim and not anim.get('archived'):
+        # Reads projected with ANIMATION_PROJECTION carry likes_count instead;
+        # archived animations keep only their like count
+        anim['likes_count'] = len(anim['likes'])
+    if not anim.get('poster_hash'):
+        anim['poster_hash'] = poster_hash(anim.get('css_code', ''), anim.get('shape_type', ''))
+    return like_buffer.apply(anim)
+
+async def ensure_unique_index(collection, field: str):
+    # Registration relies on this index to reject duplicates, so a worker
+    # must not start without it
+    try:
+        await collection.create_index(field, unique=True)
+    except OperationFailure as exc:
+        if exc.code == 11000:
+            raise RuntimeError(f"Cannot enforce unique {collection.name}.{field}, duplicates exist: {exc}")
+        if exc.code not in (85, 86):
+            raise
+        # A non-unique index on the field from an older deployment; keep it
+        # unless the unique one can replace it
+        duplicate = await collection.aggregate([
+            {"$group": {"_id": f"${field}", "count": {"$sum": 1}}},
+            {"$match": {"count": {"$gt": 1}}},
+            {"$limit": 1},
+        ]).to_list(1)
+        if duplicate:
+            raise RuntimeError(f"Cannot enforce unique {collection.name}.{field}, duplicates exist: {duplicate[0]['_id']!r}")
+        try:
+            await collection.drop_index(f"{field}_1")
+        except OperationFailure as exc:
+            # Another worker starting up dropped it first
+            if exc.code != 27:
+                raise
+        await ensure_unique_index(collection, field)
+
+async def ensure_indexes():
+    await db.users.create_index("id", unique=True)
+    await ensure_unique_index(db.users, "username")
+    await ensure_unique_index(db.users, "email")
+    await db.animations.create_index("id", unique=True)
+    await db.animations.create_index([("created_at", -1)])
+    await db.animations.create_index([("user_id", 1), ("created_at", -1)])
+    await db.animations.create_index([("category", 1), ("created_at", -1)])
+
+# Feed pages are cached under a generation number; bumping the generation
+# invalidates every cached page at once, on every worker sharing the cache.
+# Only new posts bump it. Likes do not: like counts in a cached page may lag
+# by up to FEED_CACHE_TTL, and clients get live counts from /api/stream.
+async def feed_cache_key(limit: int, skip: int, category: Optional[str] = None) -> str:
+    generation = await cache.get("feed:generation") or 0
+    return f"feed:{generation}:{category or '*'}:{limit}:{skip}"
+
+async def invalidate_feeds():
+    await cache.incr("feed:generation")
+
+async def load_feed_page(limit: int, skip: int, category: Optional[str] = None) -> list:
+    animations = catalog.page(skip, limit, category)
+    if animations is not None:
+        return animations
+    
+    key = await feed_cache_key(limit, skip, category)
+    animations = await cache.get(key)
+    if animations is None:
+        query = {"category": category} if category else {}
+        animations = await archive_tier.find_page(query, skip, limit, ANIMATION_PROJECTION)
+        await cache.set(key, animations, ttl=FEED_CACHE_TTL)
+    return animations
+
+# Single documents are cached by id; batch and single reads share the entries
+async def load_animations(ids: List[str]) -> dict:
+    found = catalog.get_many(ids)
+    if len(found) == len(ids):
+        return found
+    
+    cached = await cache.get_many([f"animation:{animation_id}" for animation_id in ids if animation_id not in found])
+    found.update((doc['id'], doc) for doc in cached.values())
+    missing = [animation_id for animation_id in ids if animation_id not in found]
+    if missing:
+        docs = await db.animations.find({"id": {"$in": missing}}, ANIMATION_PROJECTION).to_list(len(missing))
+        if len(docs) < len(missing):
+            hot_ids = {doc['id'] for doc in docs}
+            docs += await archive_tier.find_by_ids([animation_id for animation_id in missing if animation_id not in hot_ids])
+        await cache.set_many({f"animation:{doc['id']}": doc for doc in docs}, ttl=ENTITY_CACHE_TTL)
+        found.update((doc['id'], doc) for doc in docs)
+    return found
+
+async def load_user_profiles(ids: List[str]) -> dict:
+    cached = await cache.get_many([f"user_profile:{user_id}" for user_id in ids])
+    found = {doc['id']: doc for doc in cached.values()}
+    missing = [user_id for user_id in ids if user_id not in found]
+    if missing:
+        users = await db.users.find(
+            {"id": {"$in": missing}},
+            {
+                "_id": 0, "id": 1, "username": 1, "email": 1, "bio": 1, "profile_picture": 1, "joined_date": 1,
+                "followers_count": {"$size": {"$ifNull": ["$followers", []]}},
+                "following_count": {"$size": {"$ifNull": ["$following", []]}}
+            }
+        ).to_list(len(missing))
+        counts = await db.animations.aggregate([
+            {"$match": {"user_id": {"$in": [user['id'] for user in users]}}},
+            {"$group": {"_id": "$user_id", "count": {"$sum": 1}}}
+        ]).to_list(None)
+        animations_counts = {row['_id']: row['count'] for row in counts}
+        archived_counts = await archive_tier.count_by_user([user['id'] for user in users])
+        for user in users:
+            user['animations_count'] = animations_counts.get(user['id'], 0) + archived_counts.get(user['id'], 0)
+        await cache.set_many({f"user_profile:{user['id']}": user for user in users}, ttl=ENTITY_CACHE_TTL)
+        found.update((user['id'], user) for user in users)
+    return found
+
+async def present_animations(animations: List[dict], viewer_id: Optional[str] = None, include_likes: bool = False) -> List[dict]:
+    """Add liked_by_me for the viewer and, when asked for, the likes arrays of prepared animations."""
+    ids = [anim['id'] for anim in animations]
+    if viewer_id and ids:
+        liked = await db.animations.find(
+            {"id": {"$in": ids}, "likes": viewer_id}, {"_id": 0, "id": 1}
+        ).to_list(len(ids))
+        liked_ids = {doc['id'] for doc in liked}
+        for anim in animations:
+            anim['liked_by_me'] = like_buffer.liked(anim['id'], viewer_id, anim['id'] in liked_ids)
+    if include_likes and ids:
+        docs = await db.animations.find({"id": {"$in": ids}}, {"_id": 0, "id": 1, "likes": 1}).to_list(len(ids))
+        likes = {doc['id']: doc.get('likes', []) for doc in docs}
+        for anim in animations:
+            anim['likes'] = likes.get(anim['id'], [])
+            like_buffer.apply(anim)
+    return animations
+
+# Responses are assembled from cached per-animation JSON fragments
+def encode_fragment(anim: dict) -> bytes:
+    # Without the fields patched in per response, and without the closing brace
+    return AnimationView(**anim).model_dump_json(exclude=MUTABLE_FIELDS, exclude_none=True).encode()[:-1]
+
+fragments = FragmentCache(encode_fragment)
+
+def animations_response(animations: List[dict]) -> Response:
+    return Response(fragments.encode_list(animations), media_type="application/json")
+
+def viewer_from(token: Optional[str]) -> Optional[str]:
+    return decode_token(token) if token else None
+
+async def invalidate_animation(animation_id: str):
+    await cache.delete(f"animation:{animation_id}")
+
+async def invalidate_user_profiles(*user_ids: str):
+    await cache.delete(*[f"user_profile:{user_id}" for user_id in user_ids])
+
+def check_batch(ids: List[str]) -> List[str]:
+    if len(ids) > MAX_BATCH_IDS:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_BATCH_IDS} ids per batch")
+    return list(dict.fromkeys(ids))
+
 # Auth Routes
 @api_router.post("/auth/register", response_model=TokenResponse)
 async def register(user_input: UserCreate):
-    # Check if username exists
-    existing_user = await db.users.find_one({"username": user_input.username})
-    if existing_user:
-        raise HTTPException(status_code=400, detail="Username already exists")
-    
-    # Check if email exists
-    existing_email = await db.users.find_one({"email": user_input.email})
-    if existing_email:
-        raise HTTPException(status_code=400, detail="Email already exists")
-    
-    # Create user
+    # Create user; the unique indexes on username and email reject duplicates
     user_dict = user_input.model_dump(exclude={"password"})
     user = User(**user_dict)
     
     doc = user.model_dump()
-    doc['password'] = hash_password(user_input.password)
+    doc['password'] = await run_in_threadpool(hash_password, user_input.password)
     doc['joined_date'] = doc['joined_date'].isoformat()
     
-    await db.users.insert_one(doc)
+    try:
+        await db.users.insert_one(doc)
+    except DuplicateKeyError as exc:
+        if "email" in (exc.details or {}).get("keyPattern", {}) or "email_1" in str(exc):
+            raise HTTPException(status_code=400, detail="Email already exists")
+        raise HTTPException(status_code=400, detail="Username already exists")
+    taken_names.add(user.username, user.email)
     
     token = create_token(user.id)
     return TokenResponse(token=token, user=user)
 
+@api_router.get("/auth/available")
+async def check_available(username: Optional[str] = None, email: Optional[str] = None):
+    result = {}
+    if username is not None:
+        result["username"] = not await taken_names.username_taken(username)
+    if email is not None:
+        result["email"] = not await taken_names.email_taken(email)
+    return result
+
 @api_router.post("/auth/login", response_model=TokenResponse)
 async def login(credentials: UserLogin):
     user_doc = await db.users.find_one({"username": credentials.username})
-    if not user_doc or not verify_password(credentials.password, user_doc['password']):
+    if not user_doc or not await run_in_threadpool(verify_password, credentials.password, user_doc['password']):
         raise HTTPException(status_code=401, detail="Invalid credentials")
     
     if isinstance(user_doc['joined_date'], str):
@@ -171,28 +464,23 @@ async def search_users(q: str):
     
     return users
 
+@api_router.post("/users/batch", response_model=UserProfileBatch)
+async def get_user_profiles_batch(request: BatchRequest):
+    ids = check_batch(request.ids)
+    found = await load_user_profiles(ids)
+    
+    return UserProfileBatch(
+        users=[found[user_id] for user_id in ids if user_id in found],
+        missing=[user_id for user_id in ids if user_id not in found]
+    )
+
 @api_router.get("/users/{user_id}", response_model=UserProfile)
 async def get_user_profile(user_id: str):
-    user_doc = await db.users.find_one({"id": user_id}, {"_id": 0, "password": 0})
+    user_doc = (await load_user_profiles([user_id])).get(user_id)
     if not user_doc:
         raise HTTPException(status_code=404, detail="User not found")
     
-    if isinstance(user_doc['joined_date'], str):
-        user_doc['joined_date'] = datetime.fromisoformat(user_doc['joined_date'])
-    
-    animations_count = await db.animations.count_documents({"user_id": user_id})
-    
-    return UserProfile(
-        id=user_doc['id'],
-        username=user_doc['username'],
-        email=user_doc['email'],
-        bio=user_doc.get('bio', ''),
-        profile_picture=user_doc.get('profile_picture', ''),
-        joined_date=user_doc['joined_date'],
-        followers_count=len(user_doc.get('followers', [])),
-        following_count=len(user_doc.get('following', [])),
-        animations_count=animations_count
-    )
+    return UserProfile(**user_doc)
 
 @api_router.post("/users/{user_id}/follow")
 async def follow_user(user_id: str, token: str):
@@ -208,18 +496,23 @@ async def follow_user(user_id: str, token: str):
     )
     
     # Add to target user's followers
-    await db.users.update_one(
+    result = await db.users.update_one(
         {"id": user_id},
         {"$addToSet": {"followers": current_user_id}}
     )
     
+    await invalidate_user_profiles(current_user_id, user_id)
+    await mark_dirty(db, current_user_id, user_id)
+    if result.modified_count:
+        await changelog.follow_changed(current_user_id, user_id, True)
+        await notifications.follow(user_id, current_user_id)
     return {"success": True}
 
 @api_router.post("/users/{user_id}/unfollow")
 async def unfollow_user(user_id: str, token: str):
     current_user_id = decode_token(token)
     
-    await db.users.update_one(
+    result = await db.users.update_one(
         {"id": current_user_id},
         {"$pull": {"following": user_id}}
     )
@@ -229,39 +522,50 @@ async def unfollow_user(user_id: str, token: str):
         {"$pull": {"followers": current_user_id}}
     )
     
+    await invalidate_user_profiles(current_user_id, user_id)
+    await mark_dirty(db, current_user_id, user_id)
+    if result.modified_count:
+        await changelog.follow_changed(current_user_id, user_id, False)
     return {"success": True}
 
-@api_router.get("/users/{user_id}/animations", response_model=List[Animation])
-async def get_user_animations(user_id: str):
-    animations = await db.animations.find(
-        {"user_id": user_id},
-        {"_id": 0}
-    ).sort("created_at", -1).to_list(1000)
+@api_router.get("/users/{user_id}/suggestions")
+async def get_user_suggestions(user_id: str, limit: int = 10):
+    return {"suggestions": await recommendations.suggestions(user_id, min(limit, 50))}
+
+@api_router.get("/users/{user_id}/animations", response_model=List[AnimationView], response_model_exclude_none=True)
+async def get_user_animations(request: Request, user_id: str, token: Optional[str] = None, include_likes: bool = False,
+                              stream: bool = False):
+    viewer_id = viewer_from(token)
+    ndjson = wants_ndjson(request.headers.get("accept"))
     
-    for anim in animations:
-        if isinstance(anim['created_at'], str):
-            anim['created_at'] = datetime.fromisoformat(anim['created_at'])
-        anim['likes_count'] = len(anim.get('likes', []))
+    # The whole catalogue, written out one cursor batch at a time
+    async def encoded_batches():
+        batches = archive_tier.iter_batches({"user_id": user_id}, ANIMATION_PROJECTION, STREAM_BATCH_SIZE)
+        async for batch in batches:
+            animations = await present_animations([prepare_animation(anim) for anim in batch], viewer_id, include_likes)
+            yield [fragments.encode(anim) for anim in animations]
     
-    return animations
+    if stream or ndjson:
+        return stream_json(encoded_batches(), ndjson)
+    
+    animations = await archive_tier.find_page({"user_id": user_id}, 0, MAX_USER_ANIMATIONS + 1, ANIMATION_PROJECTION)
+    if len(animations) > MAX_USER_ANIMATIONS:
+        # Too many to build in memory; the same JSON array, streamed, rather than a truncated list
+        return stream_json(encoded_batches())
+    
+    return animations_response(await present_animations([prepare_animation(anim) for anim in animations], viewer_id, include_likes))
 
 # Animation Routes
-@api_router.get("/animations", response_model=List[Animation])
-async def get_all_animations(limit: int = 50, skip: int = 0):
-    animations = await db.animations.find(
-        {},
-        {"_id": 0}
-    ).sort("created_at", -1).skip(skip).limit(limit).to_list(limit)
-    
-    for anim in animations:
-        if isinstance(anim['created_at'], str):
-            anim['created_at'] = datetime.fromisoformat(anim['created_at'])
-        anim['likes_count'] = len(anim.get('likes', []))
-    
-    return animations
+@api_router.get("/animations", response_model=List[AnimationView], response_model_exclude_none=True)
+async def get_all_animations(limit: int = DEFAULT_FEED_LIMIT, skip: int = 0, category: Optional[str] = None,
+                             token: Optional[str] = None, include_likes: bool = False):
+    viewer_id = viewer_from(token)
+    animations = await load_feed_page(limit, skip, category)
+    return animations_response(await present_animations([prepare_animation(anim) for anim in animations], viewer_id, include_likes))
 
-@api_router.get("/animations/following", response_model=List[Animation])
-async def get_following_animations(token: str, limit: int = 50, skip: int = 0):
+@api_router.get("/animations/following", response_model=List[AnimationView], response_model_exclude_none=True)
+async def get_following_animations(token: str, limit: int = DEFAULT_FEED_LIMIT, skip: int = 0, category: Optional[str] = None,
+                                   include_likes: bool = False):
     user_id = decode_token(token)
     user_doc = await db.users.find_one({"id": user_id})
     
@@ -269,22 +573,28 @@ async def get_following_animations(token: str, limit: int = 50, skip: int = 0):
         raise HTTPException(status_code=404, detail="User not found")
     
     following_ids = user_doc.get('following', [])
+    query = {"user_id": {"$in": following_ids}}
+    if category:
+        query["category"] = category
     
-    animations = await db.animations.find(
-        {"user_id": {"$in": following_ids}},
-        {"_id": 0}
-    ).sort("created_at", -1).skip(skip).limit(limit).to_list(limit)
-    
-    for anim in animations:
-        if isinstance(anim['created_at'], str):
-            anim['created_at'] = datetime.fromisoformat(anim['created_at'])
-        anim['likes_count'] = len(anim.get('likes', []))
+    animations = await archive_tier.find_page(query, skip, limit, ANIMATION_PROJECTION)
     
-    return animations
+    return animations_response(await present_animations([prepare_animation(anim) for anim in animations], user_id, include_likes))
 
 @api_router.post("/animations", response_model=Animation)
-async def create_animation(animation_input: AnimationCreate, token: str):
+async def create_animation(animation_input: AnimationCreate, token: str,
+                           idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key")):
     user_id = decode_token(token)
+    
+    return await idempotency.run(
+        idempotency_key, f"{user_id}:create_animation", animation_input,
+        lambda: insert_animation(animation_input, user_id)
+    )
+
+async def insert_animation(animation_input: AnimationCreate, user_id: str) -> Animation:
+    if not category_catalog.is_valid(animation_input.category):
+        raise HTTPException(status_code=400, detail="Unknown category")
+    
     user_doc = await db.users.find_one({"id": user_id})
     
     if not user_doc:
@@ -299,32 +609,139 @@ async def create_animation(animation_input: AnimationCreate, token: str):
     
     doc = animation.model_dump()
     doc['created_at'] = doc['created_at'].isoformat()
+    doc['bucket'] = bucket_of(doc['created_at'])
     
     await db.animations.insert_one(doc)
+    await changelog.animation_created(animation.id, user_id)
+    catalog.add(doc)
+    await category_catalog.record_created(animation.category, animation.shape_type)
+    await invalidate_feeds()
+    await invalidate_user_profiles(user_id)
+    realtime.animation_created(animation.id, user_id, animation.category)
+    try:
+        await run_in_threadpool(similarity_index.add, animation.id, animation_features(doc))
+    except Exception:
+        logger.exception("Could not add %s to the similarity index", animation.id)
     
     return animation
 
-@api_router.get("/animations/{animation_id}", response_model=Animation)
-async def get_animation(animation_id: str):
-    animation_doc = await db.animations.find_one({"id": animation_id}, {"_id": 0})
+@api_router.get("/animations/trending", response_model=List[AnimationView], response_model_exclude_none=True)
+async def get_trending_animations(window: str = DEFAULT_WINDOW, category: Optional[str] = None, limit: int = 20, skip: int = 0,
+                                  token: Optional[str] = None, include_likes: bool = False):
+    if window not in HALF_LIVES:
+        raise HTTPException(status_code=400, detail=f"Unknown window, expected one of: {', '.join(HALF_LIVES)}")
+    
+    ranked = await trending.top(window, category, limit, skip)
+    ids = [animation_id for animation_id, _ in ranked]
+    # Long windows can still rank animations that have since been archived
+    by_id = await load_animations(ids)
+    
+    ranked_animations = [prepare_animation(by_id[animation_id]) for animation_id in ids if animation_id in by_id]
+    return animations_response(await present_animations(ranked_animations, viewer_from(token), include_likes))
+
+@api_router.post("/animations/batch", response_model=AnimationBatch, response_model_exclude_none=True)
+async def get_animations_batch(request: BatchRequest, token: Optional[str] = None, include_likes: bool = False):
+    viewer_id = viewer_from(token)
+    ids = check_batch(request.ids)
+    found = await load_animations(ids)
+    
+    animations = [prepare_animation(found[animation_id]) for animation_id in ids if animation_id in found]
+    return AnimationBatch(
+        animations=await present_animations(animations, viewer_id, include_likes),
+        missing=[animation_id for animation_id in ids if animation_id not in found]
+    )
+
+@api_router.get("/animations/{animation_id}", response_model=AnimationView, response_model_exclude_none=True)
+async def get_animation(animation_id: str, token: Optional[str] = None, include_likes: bool = False):
+    viewer_id = viewer_from(token)
+    animation_doc = (await load_animations([animation_id])).get(animation_id)
     if not animation_doc:
         raise HTTPException(status_code=404, detail="Animation not found")
     
-    if isinstance(animation_doc['created_at'], str):
-        animation_doc['created_at'] = datetime.fromisoformat(animation_doc['created_at'])
+    [animation] = await present_animations([prepare_animation(animation_doc)], viewer_id, include_likes)
+    return Response(fragments.encode(animation), media_type="application/json")
+
+@api_router.get("/animations/{animation_id}/similar", response_model=List[AnimationView], response_model_exclude_none=True)
+async def get_similar_animations(animation_id: str, limit: int = 8, token: Optional[str] = None):
+    animation_doc = (await load_animations([animation_id])).get(animation_id)
+    if not animation_doc:
+        raise HTTPException(status_code=404, detail="Animation not found")
     
-    animation_doc['likes_count'] = len(animation_doc.get('likes', []))
+    ranked = await run_in_threadpool(
+        similarity_index.query, animation_features(animation_doc), min(limit, 50), animation_id
+    )
+    ids = [similar_id for similar_id, _ in ranked]
+    found = await load_animations(ids)
     
-    return Animation(**animation_doc)
+    similar = [prepare_animation(found[similar_id]) for similar_id in ids if similar_id in found]
+    return animations_response(await present_animations(similar, viewer_from(token)))
+
+@api_router.get("/posters/{animation_id}/{filename}")
+async def get_poster(animation_id: str, filename: str, request: Request):
+    # <hash>.svg is the poster frame, <hash>.strip.svg the sprite strip
+    requested_hash, _, kind = filename.partition(".")
+    if kind not in ("svg", "strip.svg"):
+        raise HTTPException(status_code=404, detail="Poster not found")
+    frames = 1 if kind == "svg" else STRIP_FRAMES
+    key = f"{requested_hash}:{frames}"
+    
+    svg = posters.cached(key) or await cache.get(f"poster:{key}")
+    if svg is None:
+        # Hits skip admission; misses (including 404s) read the database and may render
+        async with admission.guard(request.scope, "posters"):
+            animation_doc = (await load_animations([animation_id])).get(animation_id)
+            if not animation_doc or poster_hash(animation_doc['css_code'], animation_doc['shape_type']) != requested_hash:
+                raise HTTPException(status_code=404, detail="Poster not found")
+            svg, wait = posters.render(key, animation_doc['css_code'], animation_doc['shape_type'], frames)
+            if svg is None:
+                raise HTTPException(status_code=429, detail="Poster rendering busy", headers={"Retry-After": str(math.ceil(wait))})
+            await cache.set(f"poster:{key}", svg, POSTER_CACHE_TTL)
+    else:
+        posters.remember(key, svg)
+    
+    return Response(svg, media_type="image/svg+xml", headers={"Cache-Control": "public, max-age=31536000, immutable"})
+
+async def find_for_like(animation_id: str, projection: Optional[dict] = None) -> dict:
+    animation_doc = await db.animations.find_one({"id": animation_id}, projection)
+    if animation_doc:
+        return animation_doc
+    
+    # Liking or unliking an archived animation brings it back to the hot tier
+    restored = await archive_tier.restore(animation_id)
+    if restored is None:
+        raise HTTPException(status_code=404, detail="Animation not found")
+    catalog.add(restored)
+    await invalidate_animation(animation_id)
+    return await db.animations.find_one({"id": animation_id}, projection)
 
 @api_router.post("/animations/{animation_id}/like")
-async def like_animation(animation_id: str, token: str):
+async def like_animation(animation_id: str, token: str,
+                         idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key")):
     user_id = decode_token(token)
     
-    animation_doc = await db.animations.find_one({"id": animation_id})
-    if not animation_doc:
-        raise HTTPException(status_code=404, detail="Animation not found")
+    return await idempotency.run(
+        idempotency_key, f"{user_id}:like:{animation_id}", None,
+        lambda: toggle_like(animation_id, user_id)
+    )
+
+async def toggle_like(animation_id: str, user_id: str) -> dict:
+    if like_buffer.enabled:
+        # Write-behind: read the stored state without shipping the likes array
+        likes_field = {"$ifNull": ["$likes", []]}
+        animation_doc = await find_for_like(
+            animation_id,
+            {"_id": 0, "category": 1, "user_id": 1, "title": 1,
+             "likes_count": {"$size": likes_field}, "liked": {"$in": [user_id, likes_field]}}
+        )
+        
+        liked = like_buffer.toggle(animation_id, user_id, animation_doc['liked'], animation_doc.get('category'))
+        likes_count = animation_doc['likes_count'] + like_buffer.count_delta(animation_id)
+        realtime.like_changed(animation_id, 1 if liked else -1, likes_count)
+        if liked:
+            await notifications.like(animation_doc['user_id'], user_id, animation_id, animation_doc['title'])
+        return {"liked": liked, "likes_count": likes_count}
     
+    animation_doc = await find_for_like(animation_id)
     likes = animation_doc.get('likes', [])
     
     if user_id in likes:
@@ -333,31 +750,211 @@ async def like_animation(animation_id: str, token: str):
             {"id": animation_id},
             {"$pull": {"likes": user_id}}
         )
-        return {"liked": False, "likes_count": len(likes) - 1}
+        liked, likes_count = False, len(likes) - 1
     else:
         # Like
         await db.animations.update_one(
             {"id": animation_id},
             {"$addToSet": {"likes": user_id}}
         )
-        return {"liked": True, "likes_count": len(likes) + 1}
+        liked, likes_count = True, len(likes) + 1
+    
+    await trending.record_likes(animation_id, animation_doc.get('category'),
+                                liked_by=[user_id] if liked else [], unliked_by=[] if liked else [user_id])
+    await invalidate_animation(animation_id)
+    await changelog.likes_changed([(animation_id, 1 if liked else -1, likes_count)])
+    catalog.set_likes(animation_id, likes_count)
+    realtime.like_changed(animation_id, 1 if liked else -1, likes_count)
+    if liked:
+        await notifications.like(animation_doc['user_id'], user_id, animation_id, animation_doc['title'])
+    return {"liked": liked, "likes_count": likes_count}
+
+async def likes_flushed(flushed: List[tuple]):
+    for animation_id, category, added, removed in flushed:
+        await trending.record_likes(animation_id, category, liked_by=added, unliked_by=removed)
+        await invalidate_animation(animation_id)
+    # One change log entry per animation and flush, carrying the stored count
+    deltas = {animation_id: len(added) - len(removed) for animation_id, _, added, removed in flushed}
+    docs = await db.animations.find(
+        {"id": {"$in": list(deltas)}}, {"_id": 0, "id": 1, "likes_count": {"$size": {"$ifNull": ["$likes", []]}}}
+    ).to_list(len(deltas))
+    await changelog.likes_changed([(doc['id'], deltas[doc['id']], doc['likes_count']) for doc in docs])
+    for doc in docs:
+        catalog.set_likes(doc['id'], doc['likes_count'])
+
+like_buffer.on_flush(likes_flushed)
+
+# Incremental sync
+@api_router.get("/sync", response_model=SyncResponse, response_model_exclude_none=True)
+async def sync_changes(since: Optional[int] = None, token: Optional[str] = None):
+    viewer_id = viewer_from(token)
+    if since is None:
+        # Start of a sync session: load the feeds after taking this token
+        return SyncResponse(token=await changelog.head(), reset=True)
+    
+    entries, new_token, reset, more = await changelog.since(since, viewer_id)
+    if reset:
+        return SyncResponse(token=new_token, reset=True)
+    
+    inserted, counts, followed, tombstones = [], {}, [], []
+    for entry in entries:
+        if entry['type'] == "insert":
+            inserted.append(entry)
+        elif entry['type'] == "likes":
+            change = counts.setdefault(entry['animation_id'], {"id": entry['animation_id'], "delta": 0})
+            change['delta'] += entry['delta']
+            change['likes_count'] = entry['likes_count']
+        elif entry['type'] == "follow":
+            followed.append(entry['target_id'])
+        else:
+            tombstones.append(Tombstone(type="follow", id=entry['target_id']))
+    
+    following_inserts = []
+    animations = []
+    if inserted:
+        found = await load_animations([entry['animation_id'] for entry in reversed(inserted)])
+        animations = [prepare_animation(found[entry['animation_id']]) for entry in reversed(inserted) if entry['animation_id'] in found]
+        animations = await present_animations(animations, viewer_id)
+        if viewer_id:
+            viewer = await db.users.find_one({"id": viewer_id}, {"_id": 0, "following": 1}) or {}
+            following = set(viewer.get('following', []))
+            following_inserts = [anim['id'] for anim in animations if anim['user_id'] in following]
+    
+    return SyncResponse(
+        token=new_token, more=more, inserts=animations, following_inserts=following_inserts,
+        counts=[LikeCountChange(**change) for change in counts.values()],
+        followed=followed, tombstones=tombstones
+    )
+
+# Notification Routes
+@api_router.get("/notifications", response_model=NotificationPage)
+async def get_notifications(token: str, limit: int = 20, cursor: Optional[str] = None):
+    user_id = decode_token(token)
+    
+    try:
+        groups, next_cursor = await notifications.page(user_id, limit, cursor)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    actors = await load_user_profiles(list({actor_id for group in groups for actor_id in group['recent_actors']}))
+    
+    items = []
+    for group in groups:
+        group_actors = [actors[actor_id] for actor_id in group['recent_actors'] if actor_id in actors]
+        items.append(Notification(
+            **group,
+            actors=[NotificationActor(**actor) for actor in group_actors],
+            summary=summary(group['kind'], [actor['username'] for actor in group_actors], group['count'], group.get('target_title'))
+        ))
+    
+    return NotificationPage(notifications=items, unread=await notifications.unread(user_id), next_cursor=next_cursor)
+
+@api_router.get("/notifications/unread")
+async def get_unread_notifications(token: str):
+    user_id = decode_token(token)
+    return {"unread": await notifications.unread(user_id)}
+
+@api_router.post("/notifications/read")
+async def mark_notifications_read(request: MarkReadRequest, token: str):
+    user_id = decode_token(token)
+    return {"unread": await notifications.mark_read(user_id, request.ids)}
 
 @api_router.get("/animations/categories/list")
 async def get_categories():
-    return {
-        "categories": [
-            "Fade",
-            "Slide",
-            "Rotate",
-            "Bounce",
-            "Scale",
-            "Special Effects"
-        ]
-    }
+    return {"categories": category_catalog.names()}
+
+@api_router.get("/animations/categories/facets")
+async def get_category_facets():
+    return {"facets": await category_catalog.facets()}
+
+# Live updates (Server-Sent Events)
+@api_router.get("/stream")
+async def stream_updates(
+    request: Request,
+    animations: str = "",
+    feeds: str = "",
+    token: Optional[str] = None
+):
+    animation_ids = set(filter(None, animations.split(",")))
+    feed_names = set(filter(None, feeds.split(",")))
+    if len(animation_ids) > MAX_STREAM_ANIMATIONS or len(feed_names) > MAX_STREAM_FEEDS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"At most {MAX_STREAM_ANIMATIONS} animations and {MAX_STREAM_FEEDS} feeds per stream"
+        )
+    topics = {animation_topic(animation_id) for animation_id in animation_ids}
+    
+    for feed in feed_names:
+        if feed == "following":
+            if not token:
+                raise HTTPException(status_code=401, detail="Token required for the following feed")
+            user_doc = await db.users.find_one({"id": decode_token(token)}, {"_id": 0, "following": 1})
+            if not user_doc:
+                raise HTTPException(status_code=404, detail="User not found")
+            topics.update(feed_topic(f"user:{followed_id}") for followed_id in user_doc.get('following', []))
+        else:
+            topics.add(feed_topic(feed))
+    
+    if not topics:
+        raise HTTPException(status_code=400, detail="Nothing to subscribe to")
+    
+    subscription = realtime.subscribe(topics)
+    return StreamingResponse(
+        realtime.stream(subscription, request.is_disconnected),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+# Admin profiling (enabled by PROFILE_ADMINS)
+def require_profile_admin(token: Optional[str]):
+    if not profiler.enabled:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if not profiler.is_admin(token):
+        raise HTTPException(status_code=403, detail="Admin access required")
+
+@api_router.post("/admin/profiles/sample")
+async def sample_profile(token: Optional[str] = None, seconds: float = 10):
+    require_profile_admin(token)
+    if profiler.sampling:
+        raise HTTPException(status_code=409, detail="A sampling profile is already running")
+    
+    name, samples = await profiler.sample(seconds)
+    return {"id": name, "samples": samples, "url": f"/api/admin/profiles/{name}"}
+
+@api_router.get("/admin/profiles")
+async def list_profiles(token: Optional[str] = None):
+    require_profile_admin(token)
+    return await run_in_threadpool(profiler.list)
+
+@api_router.get("/admin/profiles/{name}")
+async def download_profile(name: str, token: Optional[str] = None):
+    require_profile_admin(token)
+    path = profiler.path(name)
+    if path is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return FileResponse(path, media_type="application/octet-stream", filename=name)
+
+# Liveness: the process is up. Readiness: startup finished and caches are warm.
+@app.get("/healthz")
+async def healthz():
+    return {"status": "ok"}
+
+@app.get("/readyz")
+async def readyz():
+    if not app.state.ready:
+        return JSONResponse({"status": "starting"}, status_code=503)
+    return {"status": "ready", "startup": startup_profile.report(log=False)}
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    return admission.metrics()
 
 # Include router
 app.include_router(api_router)
 
+app.add_middleware(ProfilingMiddleware, profiler=profiler)
+
+app.add_middleware(AdmissionMiddleware, controller=admission)
+
 app.add_middleware(
     CORSMiddleware,
     allow_credentials=True,
@@ -372,6 +969,73 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Runs once per worker before it accepts traffic
+@app.on_event("startup")
+async def warm_worker():
+    with phase("mongo_connect"):
+        db.connect(os.environ['MONGO_URL'], os.environ['DB_NAME'])
+    with phase("password_backend"):
+        await run_in_threadpool(load_password_backend)
+    with phase("indexes"):
+        await ensure_indexes()
+        await trending.ensure_indexes()
+        await category_catalog.ensure_indexes()
+        await recommendations.ensure_indexes()
+        await archive_tier.ensure_indexes()
+        await partitions.ensure_indexes()
+        await idempotency.ensure_indexes()
+        await notifications.ensure_indexes()
+        await changelog.ensure_indexes()
+    with phase("seed"):
+        seeded = await ensure_seed_data(db) if SEED_ON_STARTUP else 0
+    with phase("partitions"):
+        await partitions.refresh()
+        if not partitions.ready:
+            logger.warning("Some animations have no bucket; feeds are unpartitioned until `python partitions.py migrate` runs")
+    with phase("availability_filter"):
+        await taken_names.rebuild()
+    with phase("categories"):
+        await category_catalog.seed()
+        if seeded:
+            await category_catalog.rebuild_counts()
+            await invalidate_feeds()
+        await category_catalog.refresh()
+    with phase("background_tasks"):
+        trending.start()
+        category_catalog.start()
+        await realtime.start()
+        like_buffer.start()
+        admission.lag_monitor.start()
+        taken_names.start()
+        catalog.start()
+        changelog.start()
+    with phase("feed_warmup"):
+        for page in range(WARM_FEED_PAGES):
+            await load_feed_page(DEFAULT_FEED_LIMIT, page * DEFAULT_FEED_LIMIT)
+    app.state.ready = True
+    asyncio.create_task(ensure_similarity_index())
+    logger.info("Worker %s ready (seeded %d animations, warmed %d feed pages)", os.getpid(), seeded, WARM_FEED_PAGES)
+    startup_profile.report()
+
+async def ensure_similarity_index():
+    try:
+        if not await run_in_threadpool(len, similarity_index):
+            count = await build_index(db, similarity_index)
+            logger.info("Built similarity index with %d animations", count)
+    except Exception:
+        logger.exception("Similarity index build failed")
+
 @app.on_event("shutdown")
 async def shutdown_db_client():
-    client.close()
+    # Out of the load balancer before anything stops
+    app.state.ready = False
+    await like_buffer.stop()
+    await admission.lag_monitor.stop()
+    await taken_names.stop()
+    await catalog.stop()
+    await changelog.stop()
+    await trending.stop()
+    await category_catalog.stop()
+    await realtime.stop()
+    await cache.close()
+    db.close()
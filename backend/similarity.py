@@ -0,0 +1,276 @@
+import asyncio
+import fcntl
+import hashlib
+import logging
+import math
+import os
+import re
+from contextlib import contextmanager
+from pathlib import Path
+
+from css import DECLARATION, KEYFRAMES, STOP
+
+logger = logging.getLogger(__name__)
+
+# "More like this"
+#
+# Each animation is turned into a fixed-length feature vector describing
+# what its CSS does (animated properties, transform kinds, keyframe count,
+# duration, easing, iteration) plus hashed category and shape buckets.
+# Unit-length vectors live in a float32 matrix on disk (vectors.f32) with
+# row ids in ids.txt; workers memory-map it and answer queries with one
+# matrix-vector product. New animations are appended under a file lock and
+# other workers pick them up on their next query, remapping the matrix
+# whenever either file was replaced or grew. `python similarity.py
+# rebuild` regenerates both files from the database, keeping rows appended
+# while it read.
+
+INDEX_DIR = Path(os.environ.get('SIMILARITY_DIR', Path(__file__).parent / 'data' / 'similarity'))
+INITIAL_CAPACITY = 1024
+
+PROPERTIES = [
+    ("opacity", ("opacity",)),
+    ("transform", ("transform",)),
+    ("background", ("background", "background-color")),
+    ("color", ("color",)),
+    ("size", ("width", "height")),
+    ("shadow", ("box-shadow", "text-shadow")),
+    ("filter", ("filter", "backdrop-filter")),
+    ("radius", ("border-radius",)),
+    ("clip", ("clip-path",)),
+    ("position", ("top", "left", "right", "bottom", "margin")),
+    ("border", ("border", "border-color", "border-width", "outline")),
+]
+TRANSFORMS = [
+    ("translate", re.compile(r"translate[xy]?\(", re.I)),
+    ("rotate", re.compile(r"rotate[z]?\(", re.I)),
+    ("scale", re.compile(r"scale[xy]?\(", re.I)),
+    ("skew", re.compile(r"skew[xy]?\(", re.I)),
+    ("3d", re.compile(r"(rotate[xy]|translate3d|translatez|scale3d|rotate3d|perspective|matrix3d)\(", re.I)),
+]
+EASINGS = ["linear", "ease", "ease-in", "ease-out", "ease-in-out", "cubic-bezier", "steps"]
+CATEGORY_BUCKETS = 8
+SHAPE_BUCKETS = 4
+
+# Group weights: what the animation does matters more than how it is labelled
+WEIGHTS = (
+    [1.0] * len(PROPERTIES)
+    + [1.0] * len(TRANSFORMS)
+    + [0.7, 0.7]                 # keyframe count, duration
+    + [0.5] * len(EASINGS)
+    + [0.5, 0.5]                 # infinite, alternate
+    + [0.8] * CATEGORY_BUCKETS
+    + [0.3] * SHAPE_BUCKETS
+)
+DIMENSIONS = len(WEIGHTS)
+
+ANIMATION_DECL = re.compile(r"animation(?:-duration|-timing-function|-iteration-count|-direction)?\s*:\s*([^;}]+)", re.I)
+TIME = re.compile(r"(\d*\.?\d+)(ms|s)\b")
+
+
+def _bucket(value: str, buckets: int) -> int:
+    return int(hashlib.md5((value or "").lower().encode()).hexdigest(), 16) % buckets
+
+
+def extract_features(css_code: str, category: str, shape_type: str) -> list:
+    properties, transform_text, stops = set(), [], 0
+    for _, block in KEYFRAMES.findall(css_code):
+        for selectors, body in STOP.findall(block):
+            stops += len(selectors.split(","))
+            for name, value in DECLARATION.findall(body):
+                name = name.lower()
+                properties.add(name)
+                if name == "transform":
+                    transform_text.append(value)
+    transforms = " ".join(transform_text)
+
+    duration, easing, infinite, alternate = 0.0, None, False, False
+    for declaration in ANIMATION_DECL.findall(css_code):
+        declaration = declaration.lower()
+        time_match = TIME.search(declaration)
+        if time_match and not duration:
+            duration = float(time_match.group(1)) / (1000 if time_match.group(2) == "ms" else 1)
+        for candidate in sorted(EASINGS, key=len, reverse=True):
+            if easing is None and re.search(rf"(?<![\w-]){re.escape(candidate)}(?![\w-])", declaration):
+                easing = candidate
+        infinite = infinite or "infinite" in declaration
+        alternate = alternate or "alternate" in declaration
+
+    vector = [float(any(name in properties for name in names)) for _, names in PROPERTIES]
+    vector += [float(bool(pattern.search(transforms))) for _, pattern in TRANSFORMS]
+    vector.append(math.log1p(stops) / math.log(11))
+    vector.append(math.log1p(duration) / math.log1p(10))
+    vector += [float(easing == candidate) for candidate in EASINGS]
+    vector += [float(infinite), float(alternate)]
+    category_vector = [0.0] * CATEGORY_BUCKETS
+    category_vector[_bucket(category, CATEGORY_BUCKETS)] = 1.0
+    shape_vector = [0.0] * SHAPE_BUCKETS
+    shape_vector[_bucket(shape_type, SHAPE_BUCKETS)] = 1.0
+    vector += category_vector + shape_vector
+
+    vector = [value * weight for value, weight in zip(vector, WEIGHTS)]
+    norm = math.sqrt(sum(value * value for value in vector)) or 1.0
+    return [value / norm for value in vector]
+
+
+def animation_features(anim: dict) -> list:
+    return extract_features(anim.get("css_code", ""), anim.get("category", ""), anim.get("shape_type", ""))
+
+
+class SimilarityIndex:
+    def __init__(self, directory: Path = INDEX_DIR):
+        self.directory = Path(directory)
+        self._matrix = None
+        self._ids = []
+        self._ids_offset = 0
+        # ((ids inode, size), (vectors inode, size)) as of the last reload
+        self._stats = None
+
+    @property
+    def vectors_path(self) -> Path:
+        return self.directory / "vectors.f32"
+
+    @property
+    def ids_path(self) -> Path:
+        return self.directory / "ids.txt"
+
+    @contextmanager
+    def _locked(self, mode: int = fcntl.LOCK_EX):
+        self.directory.mkdir(parents=True, exist_ok=True)
+        with open(self.directory / ".lock", "w") as lock:
+            fcntl.flock(lock, mode)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def __len__(self):
+        self._sync()
+        return len(self._ids)
+
+    def _file_stats(self):
+        try:
+            return tuple((stat.st_ino, stat.st_size) for stat in (os.stat(self.ids_path), os.stat(self.vectors_path)))
+        except FileNotFoundError:
+            return None
+
+    def _sync(self):
+        """Pick up rows appended or rebuilt by any process since the last call."""
+        if self._file_stats() == self._stats:
+            return
+        # Shared lock: the ids and vectors read must come from the same add or rebuild
+        with self._locked(fcntl.LOCK_SH):
+            self._reload()
+
+    def _reload(self):
+        """Bring ids and the vector map up to date; the caller holds the lock."""
+        import numpy as np
+
+        stats = self._file_stats()
+        if stats is None:
+            self._matrix, self._ids, self._ids_offset, self._stats = None, [], 0, None
+            return
+        (ids_inode, _), (vectors_inode, vectors_size) = stats
+        previous = self._stats
+        if previous is None or previous[0][0] != ids_inode:
+            self._ids, self._ids_offset = [], 0
+        with open(self.ids_path, "r") as ids_file:
+            ids_file.seek(self._ids_offset)
+            chunk = ids_file.read()
+        complete, _, _ = chunk.rpartition("\n")
+        if complete:
+            self._ids.extend(complete.split("\n"))
+            self._ids_offset += len(complete.encode()) + 1
+        rows = vectors_size // (4 * DIMENSIONS)
+        if previous is None or previous[1] != stats[1] or self._matrix is None:
+            # A rebuild at the same capacity keeps the size but not the inode
+            self._matrix = np.memmap(self.vectors_path, dtype=np.float32, mode="r",
+                                     shape=(rows, DIMENSIONS)) if rows else None
+        self._stats = stats
+
+    def add(self, animation_id: str, vector: list):
+        import numpy as np
+
+        with self._locked():
+            self._reload()
+            count = len(self._ids)
+            rows = 0 if self._matrix is None else self._matrix.shape[0]
+            if count >= rows:
+                with open(self.vectors_path, "ab") as vectors_file:
+                    vectors_file.truncate(max(INITIAL_CAPACITY, rows * 2) * 4 * DIMENSIONS)
+                rows = max(INITIAL_CAPACITY, rows * 2)
+            matrix = np.memmap(self.vectors_path, dtype=np.float32, mode="r+", shape=(rows, DIMENSIONS))
+            matrix[count] = np.asarray(vector, dtype=np.float32)
+            matrix.flush()
+            del matrix
+            with open(self.ids_path, "a") as ids_file:
+                ids_file.write(animation_id + "\n")
+
+    def rebuild(self, rows: list, carried_from: int = None):
+        """Replace the index with (animation_id, vector) rows.
+
+        With `carried_from`, rows the current index gained past that count
+        (animations added while `rows` was read from the database) are kept.
+        """
+        import numpy as np
+
+        with self._locked():
+            if carried_from is not None:
+                self._reload()
+                known = {animation_id for animation_id, _ in rows}
+                stored = 0 if self._matrix is None else self._matrix.shape[0]
+                rows = rows + [
+                    (animation_id, np.array(self._matrix[i]))
+                    for i, animation_id in enumerate(self._ids[carried_from:stored], carried_from)
+                    if animation_id not in known
+                ]
+            capacity = max(INITIAL_CAPACITY, 1 << max(len(rows) - 1, 1).bit_length())
+            matrix = np.zeros((capacity, DIMENSIONS), dtype=np.float32)
+            for i, (_, vector) in enumerate(rows):
+                matrix[i] = vector
+            vectors_tmp = self.directory / "vectors.f32.tmp"
+            ids_tmp = self.directory / "ids.txt.tmp"
+            matrix.tofile(vectors_tmp)
+            ids_tmp.write_text("".join(animation_id + "\n" for animation_id, _ in rows))
+            os.replace(vectors_tmp, self.vectors_path)
+            os.replace(ids_tmp, self.ids_path)
+        return len(rows)
+
+    def query(self, vector: list, limit: int = 8, exclude: str = None) -> list:
+        """Top-`limit` (animation_id, cosine similarity) pairs."""
+        import numpy as np
+
+        self._sync()
+        count = min(len(self._ids), 0 if self._matrix is None else self._matrix.shape[0])
+        if not count:
+            return []
+        scores = self._matrix[:count] @ np.asarray(vector, dtype=np.float32)
+        wanted = min(count, limit + 1)
+        best = np.argpartition(-scores, wanted - 1)[:wanted]
+        best = best[np.argsort(-scores[best], kind="stable")]
+        return [(self._ids[i], float(scores[i])) for i in best if self._ids[i] != exclude][:limit]
+
+
+async def build_index(db, index: SimilarityIndex) -> int:
+    # Rows appended from here on may belong to animations the scan misses
+    carried_from = await asyncio.to_thread(len, index)
+    rows = []
+    cursor = db.animations.find({}, {"_id": 0, "id": 1, "css_code": 1, "category": 1, "shape_type": 1})
+    async for anim in cursor:
+        rows.append((anim["id"], animation_features(anim)))
+    return await asyncio.to_thread(index.rebuild, rows, carried_from)
+
+
+if __name__ == "__main__":
+    from dotenv import load_dotenv
+    from motor.motor_asyncio import AsyncIOMotorClient
+
+    load_dotenv(Path(__file__).parent / '.env')
+
+    async def main():
+        client = AsyncIOMotorClient(os.environ['MONGO_URL'])
+        count = await build_index(client[os.environ['DB_NAME']], SimilarityIndex())
+        print(f"✓ Rebuilt similarity index with {count} animations")
+        client.close()
+
+    asyncio.run(main())
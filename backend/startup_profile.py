@@ -0,0 +1,91 @@
+import importlib.abc
+import logging
+import os
+import sys
+import time
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+# Startup profiling
+#
+# With STARTUP_PROFILE=1 every module import executed after install() is
+# timed (self time, excluding nested imports) and startup phases can be
+# wrapped in phase(). report() logs both, slowest first. When disabled,
+# install() and phase() cost nothing beyond a flag check.
+
+ENABLED = os.environ.get('STARTUP_PROFILE', '').lower() in ('1', 'true')
+
+_import_times = {}
+_phase_times = {}
+_stack = []
+_started_at = time.perf_counter()
+
+
+class _TimedLoader(importlib.abc.Loader):
+    def __init__(self, loader, name):
+        self._loader = loader
+        self._name = name
+
+    def create_module(self, spec):
+        return self._loader.create_module(spec)
+
+    def exec_module(self, module):
+        started = time.perf_counter()
+        _stack.append(0.0)
+        try:
+            self._loader.exec_module(module)
+        finally:
+            nested = _stack.pop()
+            total = time.perf_counter() - started
+            _import_times[self._name] = total - nested
+            if _stack:
+                _stack[-1] += total
+
+    def __getattr__(self, name):
+        return getattr(self._loader, name)
+
+
+class _TimingFinder(importlib.abc.MetaPathFinder):
+    def find_spec(self, fullname, path, target=None):
+        for finder in sys.meta_path:
+            if finder is self or not hasattr(finder, "find_spec"):
+                continue
+            spec = finder.find_spec(fullname, path, target)
+            if spec is not None:
+                if spec.loader is not None and hasattr(spec.loader, "exec_module"):
+                    spec.loader = _TimedLoader(spec.loader, fullname)
+                return spec
+        return None
+
+
+def install():
+    if ENABLED and not any(isinstance(finder, _TimingFinder) for finder in sys.meta_path):
+        sys.meta_path.insert(0, _TimingFinder())
+
+
+@contextmanager
+def phase(name: str):
+    if not ENABLED:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        _phase_times[name] = time.perf_counter() - started
+
+
+def report(top: int = 25, log: bool = True) -> dict:
+    if not ENABLED:
+        return {}
+    imports = sorted(_import_times.items(), key=lambda item: item[1], reverse=True)
+    summary = {
+        "elapsed_ms": round((time.perf_counter() - _started_at) * 1000, 1),
+        "imports_ms": round(sum(_import_times.values()) * 1000, 1),
+        "slowest_imports_ms": {name: round(seconds * 1000, 1) for name, seconds in imports[:top]},
+        "phases_ms": {name: round(seconds * 1000, 1) for name, seconds in _phase_times.items()},
+    }
+    if log:
+        logger.info("Startup profile: %s", summary)
+    return summary
@@ -0,0 +1,40 @@
+from typing import AsyncIterator, List
+
+from fastapi.responses import StreamingResponse
+
+# Streaming JSON
+#
+# Large listings are written out batch by batch as the database cursor
+# yields them, so a request holds one batch in memory no matter how many
+# documents it returns and the first bytes leave before the last document
+# is read. Items arrive already encoded; they are framed either as one JSON
+# array or as newline-delimited JSON (one document per line).
+
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+
+
+async def _json_array(batches: AsyncIterator[List[bytes]]) -> AsyncIterator[bytes]:
+    yield b"["
+    first = True
+    async for batch in batches:
+        if not batch:
+            continue
+        yield (b"" if first else b",") + b",".join(batch)
+        first = False
+    yield b"]"
+
+
+async def _ndjson(batches: AsyncIterator[List[bytes]]) -> AsyncIterator[bytes]:
+    async for batch in batches:
+        if batch:
+            yield b"\n".join(batch) + b"\n"
+
+
+def wants_ndjson(accept: str) -> bool:
+    return NDJSON_MEDIA_TYPE in (accept or "")
+
+
+def stream_json(batches: AsyncIterator[List[bytes]], ndjson: bool = False) -> StreamingResponse:
+    if ndjson:
+        return StreamingResponse(_ndjson(batches), media_type=NDJSON_MEDIA_TYPE)
+    return StreamingResponse(_json_array(batches), media_type="application/json")
@@ -0,0 +1,290 @@
+import asyncio
+import heapq
+import logging
+import os
+import zlib
+from datetime import datetime, timedelta, timezone
+
+from bson import Binary
+from pymongo import DeleteOne
+from pymongo.errors import BulkWriteError, DuplicateKeyError
+
+from changelog import ChangeLog
+from partitions import PartitionRouter, bucket_of
+
+logger = logging.getLogger(__name__)
+
+# Hot/cold tiering
+#
+# Animations older than ARCHIVE_AGE_DAYS that have at most ARCHIVE_MAX_LIKES
+# likes and are not in the monthly trending ranking are moved from
+# `animations` to `animations_archive`. Archived documents store css_code
+# zlib-compressed, so they stay small and out of the hot collection's
+# working set. Reads go to the hot tier first and fall through to the
+# archive only for ids it does not have; feed pages are merged by
+# created_at once they reach back past the newest archived animation (the
+# hot tier keeps old animations that are popular or were restored). Liking
+# or unliking an archived animation restores it to the hot tier first. An
+# animation is only removed from the hot tier if its likes have not changed
+# since the job read it. Both moves are written to the change log so the
+# API workers' catalogues follow them.
+
+ARCHIVE_AGE_DAYS = int(os.environ.get('ARCHIVE_AGE_DAYS', '180'))
+ARCHIVE_MAX_LIKES = int(os.environ.get('ARCHIVE_MAX_LIKES', '5'))
+# Animations scoring above this in the monthly ranking stay hot; longer
+# windows may rank archived ones, which reads find in the archive
+TRENDING_KEEP_SCORE = 1
+BATCH_SIZE = 500
+
+
+def compact_animation(anim: dict, archived_at: str) -> dict:
+    return {
+        "id": anim["id"],
+        "title": anim["title"],
+        "css_z": Binary(zlib.compress(anim.get("css_code", "").encode(), 9)),
+        "category": anim.get("category"),
+        "shape_type": anim.get("shape_type"),
+        "user_id": anim.get("user_id"),
+        "username": anim.get("username"),
+        "user_profile_picture": anim.get("user_profile_picture", ""),
+        "created_at": anim.get("created_at"),
+        # At most ARCHIVE_MAX_LIKES ids, kept so a restored animation can still be unliked
+        "likes": anim.get("likes", []),
+        "likes_count": len(anim.get("likes", [])),
+        "archived_at": archived_at,
+    }
+
+
+def expand_animation(doc: dict) -> dict:
+    doc = dict(doc)
+    doc["css_code"] = zlib.decompress(doc.pop("css_z")).decode()
+    doc.pop("archived_at", None)
+    doc.setdefault("likes", [])
+    doc["archived"] = True
+    return doc
+
+
+def _created_at(doc: dict):
+    return doc["created_at"]
+
+
+async def _merge_newest_first(*iterators):
+    # Async iterators already in created_at-descending order
+    heads = []
+    for position, iterator in enumerate(iterators):
+        doc = await anext(iterator, None)
+        if doc is not None:
+            heads.append((doc, position))
+    while heads:
+        doc, position = max(heads, key=lambda head: _created_at(head[0]))
+        heads.remove((doc, position))
+        yield doc
+        following = await anext(iterators[position], None)
+        if following is not None:
+            heads.append((following, position))
+
+
+class ArchiveTier:
+    def __init__(self, db, partitions=None, changelog=None):
+        self.db = db
+        self.partitions = partitions
+        self.changelog = changelog
+
+    @property
+    def archive(self):
+        return self.db.animations_archive
+
+    async def ensure_indexes(self):
+        await self.archive.create_index("id", unique=True)
+        await self.archive.create_index([("created_at", -1)])
+        await self.archive.create_index([("user_id", 1), ("created_at", -1)])
+        await self.archive.create_index([("category", 1), ("created_at", -1)])
+
+    # Reads
+
+    async def find_by_ids(self, ids: list) -> list:
+        if not ids:
+            return []
+        docs = await self.archive.find({"id": {"$in": ids}}, {"_id": 0}).to_list(len(ids))
+        return [expand_animation(doc) for doc in docs]
+
+    async def find_page(self, query: dict, skip: int, limit: int, projection: dict = None) -> list:
+        """A created_at-descending page over both tiers."""
+        projection = projection or {"_id": 0}
+        if self.partitions is not None:
+            hot = await self.partitions.find_page(query, skip, limit, projection)
+        else:
+            hot = await self.db.animations.find(
+                query, projection
+            ).sort("created_at", -1).skip(skip).limit(limit).to_list(limit)
+        newest_archived = await self.archive.find_one(query, {"_id": 0, "created_at": 1}, sort=[("created_at", -1)])
+        if newest_archived is None:
+            return hot
+        boundary = newest_archived["created_at"]
+        if len(hot) == limit and hot[-1]["created_at"] > boundary:
+            # Everything on the page is newer than anything archived
+            return hot
+
+        # Hot animations newer than the archive rank first; the rest interleave with it
+        newer = await self.db.animations.count_documents({**query, "created_at": {"$gt": boundary}})
+        head = hot[:max(0, newer - skip)]
+        region_skip = max(0, skip - newer)
+        wanted = region_skip + limit - len(head)
+        older_hot = await self.db.animations.find(
+            {**query, "created_at": {"$lte": boundary}}, projection
+        ).sort("created_at", -1).limit(wanted).to_list(wanted)
+        archived = await self.archive.find(query, {"_id": 0}).sort("created_at", -1).limit(wanted).to_list(wanted)
+        # A copy left in the archive (an interrupted move or restore) never shows up twice
+        hot_ids = {doc["id"] for doc in head} | {doc["id"] for doc in older_hot}
+        archived = [expand_animation(doc) for doc in archived if doc["id"] not in hot_ids]
+        merged = heapq.merge(older_hot, archived, key=_created_at, reverse=True)
+        return head + list(merged)[region_skip:wanted]
+
+    async def iter_batches(self, query: dict, projection: dict = None, batch_size: int = 100):
+        """Yield created_at-descending lists of up to batch_size documents from both tiers."""
+        hot = self.db.animations.find(query, projection or {"_id": 0}).sort("created_at", -1).batch_size(batch_size)
+        archived = self.archive.find(query, {"_id": 0}).sort("created_at", -1).batch_size(batch_size)
+
+        async def expanded():
+            async for doc in archived:
+                yield expand_animation(doc)
+
+        batch = []
+        async for doc in _merge_newest_first(hot.__aiter__(), expanded()):
+            batch.append(doc)
+            if len(batch) == batch_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+    async def restore(self, animation_id: str):
+        """Move an archived animation back to the hot tier; returns its hot document, or None."""
+        doc = await self.archive.find_one({"id": animation_id}, {"_id": 0})
+        if doc is None:
+            return None
+        anim = expand_animation(doc)
+        del anim["archived"]
+        anim["bucket"] = bucket_of(anim["created_at"])
+        try:
+            await self.db.animations.insert_one(dict(anim))
+        except DuplicateKeyError:
+            # Already hot (restored concurrently, or never removed): that copy wins
+            anim = await self.db.animations.find_one({"id": animation_id}, {"_id": 0}) or anim
+        await self.archive.delete_one({"id": animation_id})
+        if self.partitions is not None:
+            await self.partitions.buckets_changed({anim["bucket"]})
+        if self.changelog is not None:
+            await self.changelog.animation_restored(animation_id)
+        return anim
+
+    async def count_by_user(self, user_ids: list) -> dict:
+        rows = await self.archive.aggregate([
+            {"$match": {"user_id": {"$in": user_ids}}},
+            {"$group": {"_id": "$user_id", "count": {"$sum": 1}}}
+        ]).to_list(None)
+        return {row["_id"]: row["count"] for row in rows}
+
+    # Archival job
+
+    async def working_set(self) -> dict:
+        stats = {}
+        for name in ("animations", "animations_archive"):
+            try:
+                coll_stats = await self.db.command("collStats", name)
+            except Exception:
+                continue
+            stats[name] = {
+                "count": coll_stats.get("count", 0),
+                "data_bytes": coll_stats.get("size", 0),
+                "storage_bytes": coll_stats.get("storageSize", 0),
+                "index_bytes": coll_stats.get("totalIndexSize", 0),
+            }
+        return stats
+
+    async def _trending_ids(self) -> set:
+        docs = await self.db.trending.find(
+            {"window": "month", "score": {"$gt": TRENDING_KEEP_SCORE}}, {"_id": 0, "animation_id": 1}
+        ).to_list(None)
+        return {doc["animation_id"] for doc in docs}
+
+    async def run(self, age_days: int = ARCHIVE_AGE_DAYS, max_likes: int = ARCHIVE_MAX_LIKES,
+                  dry_run: bool = False) -> dict:
+        before = await self.working_set()
+        now = datetime.now(timezone.utc)
+        cutoff = (now - timedelta(days=age_days)).isoformat()
+        still_trending = await self._trending_ids()
+
+        cursor = self.db.animations.find(
+            {"created_at": {"$lt": cutoff}, f"likes.{max_likes}": {"$exists": False}},
+            {"_id": 0}
+        ).batch_size(BATCH_SIZE)
+        moved = 0
+        batch = []
+        async for anim in cursor:
+            if anim["id"] in still_trending:
+                continue
+            batch.append(compact_animation(anim, now.isoformat()))
+            if len(batch) >= BATCH_SIZE:
+                moved += await self._move(batch, dry_run)
+                batch = []
+        if batch:
+            moved += await self._move(batch, dry_run)
+
+        return {"moved": moved, "dry_run": dry_run, "before": before, "after": await self.working_set()}
+
+    async def _move(self, batch: list, dry_run: bool) -> int:
+        if dry_run:
+            return len(batch)
+        try:
+            await self.archive.insert_many(batch, ordered=False)
+        except BulkWriteError as exc:
+            # Already archived by an earlier, interrupted run
+            if any(error.get("code") != 11000 for error in exc.details.get("writeErrors", [])):
+                raise
+        # Only where the likes are still what was archived; a like since keeps it hot
+        result = await self.db.animations.bulk_write([
+            DeleteOne({"id": doc["id"], "likes": doc["likes"]} if doc["likes"]
+                      else {"id": doc["id"], "$or": [{"likes": {"$exists": False}}, {"likes": {"$size": 0}}]})
+            for doc in batch
+        ], ordered=False)
+        moved = [doc["id"] for doc in batch]
+        if result.deleted_count < len(batch):
+            kept = await self.db.animations.find({"id": {"$in": moved}}, {"_id": 0, "id": 1}).to_list(len(moved))
+            kept_ids = {doc["id"] for doc in kept}
+            await self.archive.delete_many({"id": {"$in": list(kept_ids)}})
+            moved = [animation_id for animation_id in moved if animation_id not in kept_ids]
+        if moved and self.partitions is not None:
+            await self.partitions.buckets_changed({bucket_of(doc["created_at"]) for doc in batch})
+        if moved and self.changelog is not None:
+            await self.changelog.animations_archived(moved)
+        return result.deleted_count
+
+
+if __name__ == "__main__":
+    import argparse
+    import json
+    from pathlib import Path
+    from dotenv import load_dotenv
+    from motor.motor_asyncio import AsyncIOMotorClient
+
+    load_dotenv(Path(__file__).parent / '.env')
+
+    parser = argparse.ArgumentParser(description="Move old, inactive animations to the archive tier")
+    parser.add_argument("--age-days", type=int, default=ARCHIVE_AGE_DAYS)
+    parser.add_argument("--max-likes", type=int, default=ARCHIVE_MAX_LIKES)
+    parser.add_argument("--dry-run", action="store_true")
+    args = parser.parse_args()
+
+    async def main():
+        client = AsyncIOMotorClient(os.environ['MONGO_URL'])
+        db = client[os.environ['DB_NAME']]
+        # Tells the API workers which months' cached feed counts to drop and
+        # which animations to take out of their catalogues
+        tier = ArchiveTier(db, PartitionRouter(db), ChangeLog(db))
+        await tier.ensure_indexes()
+        report = await tier.run(args.age_days, args.max_likes, args.dry_run)
+        print(json.dumps(report, indent=2))
+        client.close()
+
+    asyncio.run(main())
@@ -0,0 +1,258 @@
+import asyncio
+import logging
+import math
+import os
+import time
+from datetime import datetime, timezone
+from typing import Optional
+
+from pymongo import UpdateOne
+
+logger = logging.getLogger(__name__)
+
+# Trending rankings
+#
+# Every like adds 2 ** ((t - epoch) / half_life) to the animation's score in
+# each window, so older likes weigh exponentially less than new ones without
+# ever rewriting past events. "all" never decays and is the plain top-liked
+# ranking. The epoch is derived from the clock (every worker agrees on it) and
+# rolls forward every EPOCH_HALF_LIVES half-lives; increments rescale a stale
+# document inline and the compaction job rescales the rest. Until it has,
+# top() reads each stale epoch separately and rescales it before merging.
+#
+# An unlike takes back exactly what its like added, so the time of every
+# like is kept in `trending_likes` for LIKE_TIME_TTL seconds, after which
+# its weight in every decayed window is negligible. An unlike whose like
+# time is unknown (expired, or a like from before rebuild()) only comes off
+# the "all" ranking.
+
+HALF_LIVES = {
+    "day": 4 * 3600,
+    "week": 24 * 3600,
+    "month": 7 * 24 * 3600,
+    "all": None,
+}
+DEFAULT_WINDOW = "week"
+EPOCH_HALF_LIVES = 16
+# Decayed scores below this (relative to the current epoch) are dropped
+MIN_SCORE = 1e-3
+COMPACT_INTERVAL = int(os.environ.get('TRENDING_COMPACT_INTERVAL', '600'))
+LIKE_TIME_TTL = EPOCH_HALF_LIVES * max(half_life for half_life in HALF_LIVES.values() if half_life)
+
+
+def current_epoch(window: str, now: float = None) -> float:
+    half_life = HALF_LIVES[window]
+    if half_life is None:
+        return 0.0
+    now = time.time() if now is None else now
+    period = half_life * EPOCH_HALF_LIVES
+    return math.floor(now / period) * period
+
+
+def like_weight(window: str, now: float = None) -> float:
+    half_life = HALF_LIVES[window]
+    if half_life is None:
+        return 1.0
+    now = time.time() if now is None else now
+    return 2 ** ((now - current_epoch(window, now)) / half_life)
+
+
+def event_weight(window: str, at: Optional[float], epoch: float) -> float:
+    """Weight of a like made at `at`, in units of `epoch`; 0 when `at` is unknown."""
+    half_life = HALF_LIVES[window]
+    if half_life is None:
+        return 1.0
+    if at is None:
+        return 0.0
+    return 2 ** ((at - epoch) / half_life)
+
+
+def rescale(window: str, score: float, from_epoch: float, to_epoch: float) -> float:
+    half_life = HALF_LIVES[window]
+    if half_life is None:
+        return score
+    return score * 2 ** ((from_epoch - to_epoch) / half_life)
+
+
+def _rescaled_score(window: str, epoch: float):
+    # Aggregation expression: the stored score carried over to `epoch`
+    half_life = HALF_LIVES[window]
+    score = {"$ifNull": ["$score", 0]}
+    if half_life is None:
+        return score
+    return {"$multiply": [
+        score,
+        {"$pow": [2, {"$divide": [{"$subtract": [{"$ifNull": ["$epoch", epoch]}, epoch]}, half_life]}]},
+    ]}
+
+
+class TrendingEngine:
+    def __init__(self, db):
+        self.db = db
+        self._compactor: Optional[asyncio.Task] = None
+
+    @property
+    def rankings(self):
+        return self.db.trending
+
+    @property
+    def like_times(self):
+        return self.db.trending_likes
+
+    async def ensure_indexes(self):
+        await self.rankings.create_index([("animation_id", 1), ("window", 1)], unique=True)
+        await self.rankings.create_index([("window", 1), ("epoch", 1), ("score", -1)])
+        await self.rankings.create_index([("window", 1), ("category", 1), ("epoch", 1), ("score", -1)])
+        await self.like_times.create_index([("animation_id", 1), ("user_id", 1)], unique=True)
+        await self.like_times.create_index("at", expireAfterSeconds=LIKE_TIME_TTL)
+
+    def _like_update(self, animation_id: str, category: str, window: str, weight: float, now: float):
+        epoch = current_epoch(window, now)
+        return UpdateOne(
+            {"animation_id": animation_id, "window": window},
+            [{"$set": {
+                "score": {"$add": [_rescaled_score(window, epoch), weight]},
+                "epoch": epoch,
+                "category": category,
+            }}],
+            upsert=True,
+        )
+
+    async def record_likes(self, animation_id: str, category: str, liked_by=(), unliked_by=()):
+        """Apply likes by `liked_by` and unlikes by `unliked_by` to every window."""
+        if not liked_by and not unliked_by:
+            return
+        now = time.time()
+        liked_at = {}
+        if unliked_by:
+            query = {"animation_id": animation_id, "user_id": {"$in": list(unliked_by)}}
+            async for doc in self.like_times.find(query, {"_id": 0, "user_id": 1, "at": 1}):
+                liked_at[doc["user_id"]] = doc["at"].replace(tzinfo=timezone.utc).timestamp()
+            await self.like_times.delete_many(query)
+        if liked_by:
+            at = datetime.fromtimestamp(now, timezone.utc)
+            await self.like_times.bulk_write([
+                UpdateOne({"animation_id": animation_id, "user_id": user_id}, {"$set": {"at": at}}, upsert=True)
+                for user_id in liked_by
+            ], ordered=False)
+
+        operations = []
+        for window in HALF_LIVES:
+            epoch = current_epoch(window, now)
+            weight = len(liked_by) * event_weight(window, now, epoch)
+            weight -= sum(event_weight(window, liked_at.get(user_id), epoch) for user_id in unliked_by)
+            operations.append(self._like_update(animation_id, category, window, weight, now))
+        await self.rankings.bulk_write(operations, ordered=False)
+
+    async def top(self, window: str = DEFAULT_WINDOW, category: str = None, limit: int = 20, skip: int = 0) -> list:
+        """Ranked (animation_id, score) pairs; one indexed range read per epoch present."""
+        epoch = current_epoch(window)
+        query = {"window": window}
+        if category:
+            query["category"] = category
+        # Normally only the current epoch; older ones until compaction catches up
+        epochs = await self.rankings.distinct("epoch", query)
+        ranked = []
+        for stored_epoch in epochs or [epoch]:
+            entries = await self.rankings.find(
+                {**query, "epoch": stored_epoch, "score": {"$gt": 0}},
+                {"_id": 0, "animation_id": 1, "score": 1}
+            ).sort("score", -1).limit(skip + limit).to_list(skip + limit)
+            ranked += [(entry["animation_id"], rescale(window, entry["score"], stored_epoch, epoch))
+                       for entry in entries]
+        if len(epochs) > 1:
+            ranked.sort(key=lambda pair: pair[1], reverse=True)
+        return ranked[skip:skip + limit]
+
+    async def compact(self) -> dict:
+        """Carry every score over to the current epoch and drop faded entries."""
+        now = time.time()
+        stats = {}
+        for window, half_life in HALF_LIVES.items():
+            epoch = current_epoch(window, now)
+            rescaled = await self.rankings.update_many(
+                {"window": window, "epoch": {"$ne": epoch}},
+                [{"$set": {"score": _rescaled_score(window, epoch), "epoch": epoch}}],
+            )
+            floor = MIN_SCORE if half_life is not None else 0
+            dropped = await self.rankings.delete_many({"window": window, "score": {"$lte": floor}})
+            stats[window] = {"rescaled": rescaled.modified_count, "dropped": dropped.deleted_count}
+        return stats
+
+    async def rebuild(self) -> int:
+        """Recompute every ranking from the animations' likes arrays.
+
+        Individual like times are not stored, so the animation's created_at
+        stands in as the event time for the decayed windows.
+        """
+        now = time.time()
+        await self.rankings.delete_many({})
+        operations = []
+        count = 0
+        cursor = self.db.animations.find(
+            {"likes.0": {"$exists": True}},
+            {"_id": 0, "id": 1, "category": 1, "created_at": 1, "likes_count": {"$size": "$likes"}}
+        )
+        async for anim in cursor:
+            created_at = anim.get("created_at")
+            if isinstance(created_at, str):
+                created_at = datetime.fromisoformat(created_at)
+            event_time = created_at.timestamp() if created_at else now
+            for window, half_life in HALF_LIVES.items():
+                epoch = current_epoch(window, now)
+                if half_life is None:
+                    score = float(anim["likes_count"])
+                else:
+                    score = anim["likes_count"] * 2 ** ((event_time - epoch) / half_life)
+                operations.append(UpdateOne(
+                    {"animation_id": anim["id"], "window": window},
+                    {"$set": {"score": score, "epoch": epoch, "category": anim.get("category")}},
+                    upsert=True,
+                ))
+            count += 1
+            if len(operations) >= 1000:
+                await self.rankings.bulk_write(operations, ordered=False)
+                operations = []
+        if operations:
+            await self.rankings.bulk_write(operations, ordered=False)
+        await self.compact()
+        return count
+
+    async def _compact_forever(self):
+        while True:
+            await asyncio.sleep(COMPACT_INTERVAL)
+            try:
+                stats = await self.compact()
+                logger.info("Trending compaction: %s", stats)
+            except Exception:
+                logger.exception("Trending compaction failed")
+
+    def start(self):
+        if self._compactor is None:
+            self._compactor = asyncio.create_task(self._compact_forever())
+
+    async def stop(self):
+        if self._compactor is not None:
+            self._compactor.cancel()
+            self._compactor = None
+
+
+if __name__ == "__main__":
+    import sys
+    from pathlib import Path
+    from dotenv import load_dotenv
+    from motor.motor_asyncio import AsyncIOMotorClient
+
+    load_dotenv(Path(__file__).parent / '.env')
+
+    async def main(command: str):
+        client = AsyncIOMotorClient(os.environ['MONGO_URL'])
+        engine = TrendingEngine(client[os.environ['DB_NAME']])
+        await engine.ensure_indexes()
+        if command == "rebuild":
+            print(f"✓ Rebuilt rankings for {await engine.rebuild()} animations")
+        else:
+            print(f"✓ Compacted rankings: {await engine.compact()}")
+        client.close()
+
+    asyncio.run(main(sys.argv[1] if len(sys.argv) > 1 else "compact"))
@@ -5,7 +5,7 @@ import { ThemeProvider } from "@/components/ThemeProvider";
 import { Toaster } from "@/components/ui/sonner";
 import Navbar from "@/components/Navbar";
 import LandingPage from "@/pages/LandingPage";
-import Dashboard from "@/pages/Dashboard";
+import Dashboard, { FEED_CACHE_KEY } from "@/pages/Dashboard";
 import UserProfile from "@/pages/UserProfile";
 import AnimationViewer from "@/pages/AnimationViewer";
 
@@ -33,6 +33,7 @@ function App() {
     setUser(null);
     localStorage.removeItem('token');
     localStorage.removeItem('user');
+    localStorage.removeItem(FEED_CACHE_KEY);
   };
 
   if (loading) {
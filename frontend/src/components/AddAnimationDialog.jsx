@@ -1,4 +1,4 @@
-import { useState } from "react";
+import { useRef, useState } from "react";
 import {
   Dialog,
   DialogContent,
@@ -47,6 +47,8 @@ const AddAnimationDialog = ({ open, onClose, onSuccess }) => {
     shape_type: "cube"
   });
   const [loading, setLoading] = useState(false);
+  // Resubmitting the same form reuses its key so the server creates it once
+  const pendingSubmit = useRef(null);
 
   const handleSubmit = async (e) => {
     e.preventDefault();
@@ -54,10 +56,16 @@ const AddAnimationDialog = ({ open, onClose, onSuccess }) => {
     
     try {
       const token = localStorage.getItem('token');
+      const body = JSON.stringify(formData);
+      if (pendingSubmit.current?.body !== body) {
+        pendingSubmit.current = { body, key: crypto.randomUUID() };
+      }
       await axios.post(
         `${API}/animations?token=${token}`,
-        formData
+        formData,
+        { headers: { "Idempotency-Key": pendingSubmit.current.key } }
       );
+      pendingSubmit.current = null;
       toast.success("Animation created successfully!");
       setFormData({
         title: "",
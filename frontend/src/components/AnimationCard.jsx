@@ -1,3 +1,4 @@
+import { useState } from "react";
 import { Card, CardContent } from "@/components/ui/card";
 import { Avatar, AvatarFallback, AvatarImage } from "@/components/ui/avatar";
 import { Button } from "@/components/ui/button";
@@ -6,23 +7,46 @@ import { useNavigate } from "react-router-dom";
 import AnimationPreview from "@/components/AnimationPreview";
 import { formatDistanceToNow } from "date-fns";
 
-const AnimationCard = ({ animation, currentUserId, onLike }) => {
+const BACKEND_URL = process.env.REACT_APP_BACKEND_URL;
+const API = `${BACKEND_URL}/api`;
+
+const AnimationCard = ({ animation, onLike }) => {
   const navigate = useNavigate();
-  const isLiked = animation.likes?.includes(currentUserId);
+  const isLiked = animation.liked_by_me;
+  // Show the static poster until the card is hovered, so a feed page
+  // doesn't run every animation at once
+  const [hovered, setHovered] = useState(false);
+  const [posterFailed, setPosterFailed] = useState(false);
+  const showPoster = animation.poster_hash && !hovered && !posterFailed;
 
   return (
     <Card 
       className="overflow-hidden hover:shadow-lg transition-shadow cursor-pointer"
       data-testid={`animation-card-${animation.id}`}
     >
-      <div onClick={() => navigate(`/animation/${animation.id}`)}>
+      <div
+        onClick={() => navigate(`/animation/${animation.id}`)}
+        onMouseEnter={() => setHovered(true)}
+        onMouseLeave={() => setHovered(false)}
+      >
         <div className="aspect-video bg-muted flex items-center justify-center p-4">
-          <AnimationPreview
-            cssCode={animation.css_code}
-            shape={animation.shape_type}
-            isPlaying={true}
-            small={true}
-          />
+          {showPoster ? (
+            <img
+              src={`${API}/posters/${animation.id}/${animation.poster_hash}.svg`}
+              alt={animation.title}
+              loading="lazy"
+              className="w-full h-full object-contain"
+              onError={() => setPosterFailed(true)}
+              data-testid={`animation-poster-${animation.id}`}
+            />
+          ) : (
+            <AnimationPreview
+              cssCode={animation.css_code}
+              shape={animation.shape_type}
+              isPlaying={true}
+              small={true}
+            />
+          )}
         </div>
       </div>
 
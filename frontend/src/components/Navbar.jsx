@@ -1,9 +1,9 @@
 import { Link, useNavigate } from "react-router-dom";
-import { Moon, Sun, LogOut, User, Search } from "lucide-react";
+import { Moon, Sun, LogOut, User, Search, Bell } from "lucide-react";
 import { useTheme } from "@/components/ThemeProvider";
 import { Button } from "@/components/ui/button";
 import { Input } from "@/components/ui/input";
-import { useState } from "react";
+import { useEffect, useState } from "react";
 import axios from "axios";
 import {
   DropdownMenu,
@@ -22,6 +22,30 @@ const Navbar = ({ user, onLogout }) => {
   const [searchQuery, setSearchQuery] = useState("");
   const [searchResults, setSearchResults] = useState([]);
   const [showResults, setShowResults] = useState(false);
+  const [unread, setUnread] = useState(0);
+  const [notifications, setNotifications] = useState([]);
+
+  useEffect(() => {
+    const token = localStorage.getItem('token');
+    axios.get(`${API}/notifications/unread?token=${token}`)
+      .then((response) => setUnread(response.data.unread))
+      .catch((error) => console.error("Notifications error:", error));
+  }, []);
+
+  const handleNotificationsOpen = async (open) => {
+    if (!open) return;
+    try {
+      const token = localStorage.getItem('token');
+      const response = await axios.get(`${API}/notifications?token=${token}&limit=10`);
+      setNotifications(response.data.notifications);
+      if (response.data.unread > 0) {
+        await axios.post(`${API}/notifications/read?token=${token}`, {});
+        setUnread(0);
+      }
+    } catch (error) {
+      console.error("Notifications error:", error);
+    }
+  };
 
   const handleSearch = async (query) => {
     setSearchQuery(query);
@@ -108,6 +132,40 @@ const Navbar = ({ user, onLogout }) => {
             {theme === "dark" ? <Sun className="h-5 w-5" /> : <Moon className="h-5 w-5" />}
           </Button>
 
+          <DropdownMenu onOpenChange={handleNotificationsOpen}>
+            <DropdownMenuTrigger asChild>
+              <Button variant="ghost" size="icon" className="relative" data-testid="notifications-btn">
+                <Bell className="h-5 w-5" />
+                {unread > 0 && (
+                  <span className="absolute -top-1 -right-1 min-w-[1.25rem] h-5 px-1 rounded-full bg-red-500 text-white text-xs flex items-center justify-center">
+                    {unread > 99 ? "99+" : unread}
+                  </span>
+                )}
+              </Button>
+            </DropdownMenuTrigger>
+            <DropdownMenuContent align="end" className="w-80">
+              {notifications.length === 0 ? (
+                <p className="p-3 text-sm text-muted-foreground">No notifications yet</p>
+              ) : (
+                notifications.map((notification) => (
+                  <DropdownMenuItem
+                    key={notification.id}
+                    data-testid={`notification-${notification.id}`}
+                    onClick={() => navigate(
+                      notification.kind === "like"
+                        ? `/animation/${notification.target_id}`
+                        : `/profile/${notification.actors[0]?.id || user.id}`
+                    )}
+                  >
+                    <span className={notification.read ? "text-muted-foreground" : "font-medium"}>
+                      {notification.summary}
+                    </span>
+                  </DropdownMenuItem>
+                ))
+              )}
+            </DropdownMenuContent>
+          </DropdownMenu>
+
           <DropdownMenu>
             <DropdownMenuTrigger asChild>
               <Button variant="ghost" size="icon" data-testid="user-menu-btn">
@@ -0,0 +1,38 @@
+import { useEffect, useRef } from "react";
+
+const BACKEND_URL = process.env.REACT_APP_BACKEND_URL;
+const API = `${BACKEND_URL}/api`;
+
+// Subscribes to the backend's Server-Sent Events stream for like counts of
+// the given animations and "new posts" notices for the given feeds. The
+// backend accepts at most MAX_LIVE_ANIMATIONS ids, so only the first ones
+// (the top of the list) are followed.
+const MAX_LIVE_ANIMATIONS = 100;
+
+export function useLiveUpdates({ animationIds = [], feeds = [], onLikes, onNewPosts }) {
+  const handlers = useRef({ onLikes, onNewPosts });
+  handlers.current = { onLikes, onNewPosts };
+
+  const animationsKey = animationIds.slice(0, MAX_LIVE_ANIMATIONS).sort().join(",");
+  const feedsKey = feeds.join(",");
+
+  useEffect(() => {
+    if (!animationsKey && !feedsKey) return undefined;
+
+    const params = new URLSearchParams();
+    if (animationsKey) params.set("animations", animationsKey);
+    if (feedsKey) params.set("feeds", feedsKey);
+    const token = localStorage.getItem("token");
+    if (token) params.set("token", token);
+
+    const source = new EventSource(`${API}/stream?${params}`);
+    source.addEventListener("likes", (event) => {
+      handlers.current.onLikes?.(JSON.parse(event.data));
+    });
+    source.addEventListener("new_posts", (event) => {
+      handlers.current.onNewPosts?.(JSON.parse(event.data));
+    });
+
+    return () => source.close();
+  }, [animationsKey, feedsKey]);
+}
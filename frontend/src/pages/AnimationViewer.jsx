@@ -8,6 +8,7 @@ import axios from "axios";
 import { toast } from "sonner";
 import { Tabs, TabsContent, TabsList, TabsTrigger } from "@/components/ui/tabs";
 import AnimationPreview from "@/components/AnimationPreview";
+import { useLiveUpdates } from "@/hooks/use-live-updates";
 
 const BACKEND_URL = process.env.REACT_APP_BACKEND_URL;
 const API = `${BACKEND_URL}/api`;
@@ -19,14 +20,17 @@ const AnimationViewer = ({ user }) => {
   const [isPlaying, setIsPlaying] = useState(true);
   const [selectedShape, setSelectedShape] = useState("cube");
   const [loading, setLoading] = useState(true);
+  const [similarAnimations, setSimilarAnimations] = useState([]);
 
   useEffect(() => {
     loadAnimation();
+    loadSimilarAnimations();
   }, [animationId]);
 
   const loadAnimation = async () => {
     try {
-      const response = await axios.get(`${API}/animations/${animationId}`);
+      const token = localStorage.getItem('token');
+      const response = await axios.get(`${API}/animations/${animationId}?token=${token}`);
       setAnimation(response.data);
       setSelectedShape(response.data.shape_type);
       setLoading(false);
@@ -36,6 +40,21 @@ const AnimationViewer = ({ user }) => {
     }
   };
 
+  useLiveUpdates({
+    animationIds: [animationId],
+    onLikes: ({ likes_count }) => setAnimation(prev => prev && { ...prev, likes_count }),
+  });
+
+  const loadSimilarAnimations = async () => {
+    try {
+      const token = localStorage.getItem('token');
+      const response = await axios.get(`${API}/animations/${animationId}/similar?limit=6&token=${token}`);
+      setSimilarAnimations(response.data);
+    } catch (error) {
+      console.error("Error loading similar animations:", error);
+    }
+  };
+
   const handleCopyCode = () => {
     if (animation) {
       navigator.clipboard.writeText(animation.css_code);
@@ -50,9 +69,7 @@ const AnimationViewer = ({ user }) => {
       setAnimation(prev => ({
         ...prev,
         likes_count: response.data.likes_count,
-        likes: response.data.liked 
-          ? [...(prev.likes || []), user.id]
-          : (prev.likes || []).filter(id => id !== user.id)
+        liked_by_me: response.data.liked
       }));
     } catch (error) {
       console.error("Error liking animation:", error);
@@ -67,7 +84,7 @@ const AnimationViewer = ({ user }) => {
     );
   }
 
-  const isLiked = animation.likes?.includes(user.id);
+  const isLiked = animation.liked_by_me;
 
   const shapes = [
     { id: "cube", label: "Cube" },
@@ -169,6 +186,25 @@ const AnimationViewer = ({ user }) => {
             </Card>
           </div>
         </div>
+
+        {similarAnimations.length > 0 && (
+          <div className="mt-12" data-testid="similar-animations">
+            <h2 className="text-2xl font-bold mb-4">More like this</h2>
+            <div className="grid grid-cols-2 md:grid-cols-3 lg:grid-cols-6 gap-4">
+              {similarAnimations.map((similar) => (
+                <Card
+                  key={similar.id}
+                  className="p-4 cursor-pointer hover:shadow-lg transition-shadow"
+                  onClick={() => navigate(`/animation/${similar.id}`)}
+                  data-testid={`similar-animation-${similar.id}`}
+                >
+                  <p className="font-medium truncate">{similar.title}</p>
+                  <p className="text-xs text-muted-foreground">{similar.category}</p>
+                </Card>
+              ))}
+            </div>
+          </div>
+        )}
       </div>
     </div>
   );
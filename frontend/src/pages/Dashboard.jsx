@@ -1,4 +1,4 @@
-import { useState, useEffect } from "react";
+import { useState, useEffect, useRef } from "react";
 import { Tabs, TabsContent, TabsList, TabsTrigger } from "@/components/ui/tabs";
 import { Button } from "@/components/ui/button";
 import { Plus } from "lucide-react";
@@ -6,9 +6,26 @@ import axios from "axios";
 import AnimationCard from "@/components/AnimationCard";
 import AddAnimationDialog from "@/components/AddAnimationDialog";
 import { toast } from "sonner";
+import { useLiveUpdates } from "@/hooks/use-live-updates";
 
 const BACKEND_URL = process.env.REACT_APP_BACKEND_URL;
 const API = `${BACKEND_URL}/api`;
+export const FEED_CACHE_KEY = "dashboardFeeds";
+const FEED_SIZE = 50;
+
+const readFeedCache = (userId) => {
+  try {
+    const cached = JSON.parse(localStorage.getItem(FEED_CACHE_KEY));
+    return cached && cached.userId === userId ? cached : null;
+  } catch {
+    return null;
+  }
+};
+
+const mergeInserts = (animations, inserts) => {
+  const known = new Set(animations.map((animation) => animation.id));
+  return [...inserts.filter((animation) => !known.has(animation.id)), ...animations].slice(0, FEED_SIZE);
+};
 
 const Dashboard = ({ user }) => {
   const [globalAnimations, setGlobalAnimations] = useState([]);
@@ -16,11 +33,22 @@ const Dashboard = ({ user }) => {
   const [showAddDialog, setShowAddDialog] = useState(false);
   const [loading, setLoading] = useState(true);
   const [activeTab, setActiveTab] = useState("global");
+  const [newGlobalPosts, setNewGlobalPosts] = useState(0);
+  const [newFollowingPosts, setNewFollowingPosts] = useState(0);
+  const [syncToken, setSyncToken] = useState(null);
+  const syncTokenRef = useRef(null);
+
+  const saveSyncToken = (token) => {
+    syncTokenRef.current = token;
+    setSyncToken(token);
+  };
 
   const loadGlobalAnimations = async () => {
     try {
-      const response = await axios.get(`${API}/animations`);
+      const token = localStorage.getItem('token');
+      const response = await axios.get(`${API}/animations?token=${token}`);
       setGlobalAnimations(response.data);
+      setNewGlobalPosts(0);
     } catch (error) {
       console.error("Error loading animations:", error);
       toast.error("Failed to load animations");
@@ -32,37 +60,135 @@ const Dashboard = ({ user }) => {
       const token = localStorage.getItem('token');
       const response = await axios.get(`${API}/animations/following?token=${token}`);
       setFollowingAnimations(response.data);
+      setNewFollowingPosts(0);
     } catch (error) {
       console.error("Error loading following animations:", error);
     }
   };
 
+  // Full load; the sync token is taken first so nothing written meanwhile is missed
+  const loadFeeds = async () => {
+    const token = localStorage.getItem('token');
+    const response = await axios.get(`${API}/sync?token=${token}`);
+    await Promise.all([loadGlobalAnimations(), loadFollowingAnimations()]);
+    saveSyncToken(response.data.token);
+  };
+
+  // Apply only what changed since the last sync to the cached feeds
+  const syncFeeds = async () => {
+    if (syncTokenRef.current === null) {
+      await loadFeeds();
+      return;
+    }
+    const token = localStorage.getItem('token');
+    let more = true;
+    while (more) {
+      const { data } = await axios.get(`${API}/sync?since=${syncTokenRef.current}&token=${token}`);
+      if (data.reset) {
+        await loadFeeds();
+        return;
+      }
+      if (data.inserts.length) {
+        const following = new Set(data.following_inserts);
+        setGlobalAnimations((current) => mergeInserts(current, data.inserts));
+        setFollowingAnimations((current) =>
+          mergeInserts(current, data.inserts.filter((animation) => following.has(animation.id)))
+        );
+      }
+      data.counts.forEach(({ id, likes_count }) => patchAnimation(id, () => ({ likes_count })));
+      if (data.followed.length || data.tombstones.length) {
+        await loadFollowingAnimations();
+      }
+      saveSyncToken(data.token);
+      more = data.more;
+    }
+    setNewGlobalPosts(0);
+    setNewFollowingPosts(0);
+  };
+
   useEffect(() => {
     const loadData = async () => {
-      setLoading(true);
-      await Promise.all([loadGlobalAnimations(), loadFollowingAnimations()]);
-      setLoading(false);
+      const cached = readFeedCache(user?.id);
+      try {
+        if (cached) {
+          setGlobalAnimations(cached.global);
+          setFollowingAnimations(cached.following);
+          saveSyncToken(cached.token);
+          setLoading(false);
+          await syncFeeds();
+        } else {
+          setLoading(true);
+          await loadFeeds();
+          setLoading(false);
+        }
+      } catch (error) {
+        console.error("Error syncing animations:", error);
+        setLoading(false);
+      }
     };
     loadData();
   }, []);
 
+  useEffect(() => {
+    if (syncToken !== null && user) {
+      localStorage.setItem(FEED_CACHE_KEY, JSON.stringify({
+        userId: user.id,
+        token: syncToken,
+        global: globalAnimations,
+        following: followingAnimations,
+      }));
+    }
+  }, [syncToken, globalAnimations, followingAnimations]);
+
   const handleAnimationAdded = () => {
-    loadGlobalAnimations();
-    loadFollowingAnimations();
+    syncFeeds().catch((error) => console.error("Error syncing animations:", error));
     setShowAddDialog(false);
   };
 
+  const patchAnimation = (animationId, patch) => {
+    const apply = (animations) =>
+      animations.map((animation) =>
+        animation.id === animationId ? { ...animation, ...patch(animation) } : animation
+      );
+    setGlobalAnimations(apply);
+    setFollowingAnimations(apply);
+  };
+
   const handleLike = async (animationId) => {
     try {
       const token = localStorage.getItem('token');
-      await axios.post(`${API}/animations/${animationId}/like?token=${token}`);
-      loadGlobalAnimations();
-      loadFollowingAnimations();
+      const response = await axios.post(`${API}/animations/${animationId}/like?token=${token}`);
+      patchAnimation(animationId, () => ({
+        likes_count: response.data.likes_count,
+        liked_by_me: response.data.liked
+      }));
     } catch (error) {
       console.error("Error liking animation:", error);
     }
   };
 
+  useLiveUpdates({
+    animationIds: [...new Set([...globalAnimations, ...followingAnimations].map((animation) => animation.id))],
+    feeds: ["all", "following"],
+    onLikes: ({ animation_id, likes_count }) => patchAnimation(animation_id, () => ({ likes_count })),
+    onNewPosts: ({ feed, count }) => {
+      if (feed === "all") {
+        setNewGlobalPosts((current) => current + count);
+      } else if (feed.startsWith("user:")) {
+        setNewFollowingPosts((current) => current + count);
+      }
+    },
+  });
+
+  const newPostsBanner = (count, onClick, testId) =>
+    count > 0 && (
+      <div className="flex justify-center mb-6">
+        <Button variant="outline" size="sm" onClick={onClick} data-testid={testId}>
+          {count === 1 ? "1 new post" : `${count} new posts`}
+        </Button>
+      </div>
+    );
+
   return (
     <div className="min-h-screen bg-background">
       <div className="container mx-auto px-4 py-8">
@@ -84,6 +210,7 @@ const Dashboard = ({ user }) => {
           </TabsList>
 
           <TabsContent value="global" data-testid="global-feed-content">
+            {newPostsBanner(newGlobalPosts, syncFeeds, "global-new-posts-btn")}
             {loading ? (
               <div className="text-center py-12">Loading animations...</div>
             ) : globalAnimations.length === 0 ? (
@@ -96,7 +223,6 @@ const Dashboard = ({ user }) => {
                   <AnimationCard
                     key={animation.id}
                     animation={animation}
-                    currentUserId={user.id}
                     onLike={handleLike}
                   />
                 ))}
@@ -105,6 +231,7 @@ const Dashboard = ({ user }) => {
           </TabsContent>
 
           <TabsContent value="following" data-testid="following-feed-content">
+            {newPostsBanner(newFollowingPosts, syncFeeds, "following-new-posts-btn")}
             {loading ? (
               <div className="text-center py-12">Loading animations...</div>
             ) : followingAnimations.length === 0 ? (
@@ -117,7 +244,6 @@ const Dashboard = ({ user }) => {
                   <AnimationCard
                     key={animation.id}
                     animation={animation}
-                    currentUserId={user.id}
                     onLike={handleLike}
                   />
                 ))}
@@ -1,4 +1,4 @@
-import { useState } from "react";
+import { useEffect, useState } from "react";
 import { Button } from "@/components/ui/button";
 import { Input } from "@/components/ui/input";
 import { Label } from "@/components/ui/label";
@@ -22,6 +22,27 @@ const LandingPage = ({ onLogin }) => {
     profile_picture: ""
   });
   const [loading, setLoading] = useState(false);
+  const [available, setAvailable] = useState({});
+
+  // Check availability once typing pauses
+  useEffect(() => {
+    const params = new URLSearchParams();
+    if (registerData.username) params.set("username", registerData.username);
+    if (registerData.email.includes("@")) params.set("email", registerData.email);
+    if (!params.toString()) {
+      setAvailable({});
+      return;
+    }
+    const timer = setTimeout(async () => {
+      try {
+        const response = await axios.get(`${API}/auth/available?${params}`);
+        setAvailable(response.data);
+      } catch (error) {
+        setAvailable({});
+      }
+    }, 500);
+    return () => clearTimeout(timer);
+  }, [registerData.username, registerData.email]);
 
   const handleLogin = async (e) => {
     e.preventDefault();
@@ -139,6 +160,9 @@ const LandingPage = ({ onLogin }) => {
                           onChange={(e) => setRegisterData({ ...registerData, username: e.target.value })}
                           required
                         />
+                        {available.username === false && (
+                          <p className="text-xs text-destructive mt-1" data-testid="register-username-taken">Username already exists</p>
+                        )}
                       </div>
                       <div>
                         <Label htmlFor="register-email">Email</Label>
@@ -150,6 +174,9 @@ const LandingPage = ({ onLogin }) => {
                           onChange={(e) => setRegisterData({ ...registerData, email: e.target.value })}
                           required
                         />
+                        {available.email === false && (
+                          <p className="text-xs text-destructive mt-1" data-testid="register-email-taken">Email already exists</p>
+                        )}
                       </div>
                       <div>
                         <Label htmlFor="register-password">Password</Label>
@@ -41,7 +41,8 @@ const UserProfile = ({ currentUser }) => {
 
   const loadAnimations = async () => {
     try {
-      const response = await axios.get(`${API}/users/${userId}/animations`);
+      const token = localStorage.getItem('token');
+      const response = await axios.get(`${API}/users/${userId}/animations?token=${token}`);
       setAnimations(response.data);
     } catch (error) {
       console.error("Error loading animations:", error);
@@ -84,8 +85,14 @@ const UserProfile = ({ currentUser }) => {
   const handleLike = async (animationId) => {
     try {
       const token = localStorage.getItem('token');
-      await axios.post(`${API}/animations/${animationId}/like?token=${token}`);
-      loadAnimations();
+      const response = await axios.post(`${API}/animations/${animationId}/like?token=${token}`);
+      setAnimations((current) =>
+        current.map((animation) =>
+          animation.id === animationId
+            ? { ...animation, likes_count: response.data.likes_count, liked_by_me: response.data.liked }
+            : animation
+        )
+      );
     } catch (error) {
       console.error("Error liking animation:", error);
     }
@@ -165,7 +172,6 @@ const UserProfile = ({ currentUser }) => {
                 <AnimationCard
                   key={animation.id}
                   animation={animation}
-                  currentUserId={currentUser.id}
                   onLike={handleLike}
                 />
               ))}
@@ -0,0 +1,86 @@
+import sys
+import uuid
+from contextlib import contextmanager
+from pathlib import Path
+
+import pytest
+
+# Backend modules are imported by their flat names, as server.py does
+BACKEND_DIR = Path(__file__).resolve().parent.parent / "backend"
+if str(BACKEND_DIR) not in sys.path:
+    sys.path.insert(0, str(BACKEND_DIR))
+
+
+def computed_projection(projection) -> bool:
+    return isinstance(projection, dict) and any(
+        isinstance(value, dict) and "$slice" not in value for value in projection.values()
+    )
+
+
+def emulate_projections(monkeypatch):
+    """Let mongomock's find() take expression projections such as likes_count: {$size: ...}.
+
+    The matching documents are projected with $project, which mongomock does
+    evaluate, and copied to a scratch collection so the caller can still
+    sort, skip and limit the cursor.
+    """
+    import mongomock
+    from mongomock.collection import Collection
+
+    find = Collection.find
+    scratch = mongomock.MongoClient()["projections"]
+
+    def find_with_expressions(self, filter=None, projection=None, *args, **kwargs):
+        if not computed_projection(projection):
+            return find(self, filter, projection, *args, **kwargs)
+        docs = list(self.aggregate([{"$match": filter or {}}, {"$project": projection}]))
+        for position, doc in enumerate(docs):
+            doc["_id"] = position
+        projected = scratch[uuid.uuid4().hex]
+        if docs:
+            projected.insert_many(docs)
+        return find(projected, {}, {"_id": 0} if projection.get("_id", 1) == 0 else None, *args, **kwargs)
+
+    monkeypatch.setattr(Collection, "find", find_with_expressions)
+
+
+@contextmanager
+def serve(monkeypatch):
+    """Start the app on an in-memory database and yield a TestClient; shuts it down on exit.
+
+    Admission control is off: it has its own tests, and the auth bucket
+    would otherwise turn every sixth registration into a 429.
+    """
+    from fastapi.testclient import TestClient
+    from mongomock_motor import AsyncMongoMockClient
+
+    import server
+
+    emulate_projections(monkeypatch)
+    client = AsyncMongoMockClient()
+    monkeypatch.setattr(server.db, "connect", lambda *args, **kwargs: None)
+    monkeypatch.setattr(server.db, "close", lambda: None)
+    monkeypatch.setattr(server.db, "_client", client)
+    monkeypatch.setattr(server.db, "_db", client["api_test"])
+    monkeypatch.setattr(server.admission, "enabled", False)
+    with TestClient(server.app) as test_client:
+        yield test_client
+
+
+@pytest.fixture(scope="module")
+def api():
+    """The app, started once per test module, behind a TestClient."""
+    pytest.importorskip("mongomock_motor")
+    with pytest.MonkeyPatch.context() as monkeypatch, serve(monkeypatch) as test_client:
+        yield test_client
+
+
+@pytest.fixture
+def register(api):
+    """Registers a fresh user and returns (token, user id)."""
+    def register_user():
+        name = f"user{uuid.uuid4().hex[:12]}"
+        response = api.post("/api/auth/register", json={"username": name, "email": f"{name}@example.com", "password": "pw"})
+        assert response.status_code == 200, response.text
+        return response.json()["token"], response.json()["user"]["id"]
+    return register_user
@@ -0,0 +1,109 @@
+"""Admission control: client keys, route classes and token buckets."""
+import asyncio
+
+import jwt
+import pytest
+from fastapi import HTTPException
+
+from admission import ROUTE_CLASSES, AdmissionController, classify, forwarded_client
+from ratelimit import TokenBuckets
+
+SECRET = "admission-test-secret-of-32-bytes"
+
+
+def scope(forwarded=(), client=("10.0.0.1", 1234)):
+    return {"headers": [(b"x-forwarded-for", value.encode()) for value in forwarded], "client": client}
+
+
+def test_forwarded_for_is_ignored_unless_trusted():
+    controller = AdmissionController(SECRET, "HS256")
+    assert controller.client_key(scope(["1.2.3.4"]), {}) == "ip:10.0.0.1"
+
+
+def test_trusted_forwarded_for_uses_the_entry_the_proxy_appended():
+    controller = AdmissionController(SECRET, "HS256", trust_forwarded_for=True)
+    # The client chose "6.6.6.6"; the proxy appended the address it saw
+    assert controller.client_key(scope(["6.6.6.6, 1.2.3.4"]), {}) == "ip:1.2.3.4"
+    assert controller.client_key(scope(), {}) == "ip:10.0.0.1"
+
+
+def test_forwarded_client_counts_hops_from_the_right_across_headers():
+    headers = scope(["6.6.6.6, 1.2.3.4", "172.16.0.9"])
+    assert forwarded_client(headers, hops=1) == "172.16.0.9"
+    assert forwarded_client(headers, hops=2) == "1.2.3.4"
+    assert forwarded_client(headers, hops=4) is None
+
+
+def test_tokens_key_by_user():
+    controller = AdmissionController(SECRET, "HS256")
+    token = jwt.encode({"user_id": "u1"}, SECRET, algorithm="HS256")
+    assert controller.client_key(scope(), {"token": [token]}) == "user:u1"
+    assert controller.client_key(scope(), {"token": ["not-a-token"]}) == "ip:10.0.0.1"
+
+
+def test_classify():
+    assert classify("POST", "/api/auth/login", {}) == ("auth", False)
+    assert classify("GET", "/api/auth/available", {"username": ["ann"]}) == ("availability", False)
+    assert classify("GET", "/api/animations", {"skip": ["1000"]}) == ("feed", True)
+    assert classify("GET", "/api/users/u1/animations", {}) == ("feed", False)
+    assert classify("POST", "/api/animations/a/like", {}) == ("write", False)
+
+
+def test_token_bucket_refills_at_its_rate():
+    buckets = TokenBuckets(rate=1, burst=2, max_keys=2)
+    assert buckets.take("k", now=0) == 0
+    assert buckets.take("k", now=0) == 0
+    assert buckets.take("k", now=0) == 1
+    assert buckets.take("k", now=1.5) == 0
+    buckets.take("other", now=2)
+    buckets.take("third", now=2)
+    assert len(buckets) == 2
+
+
+def test_guard_rate_limits_the_named_class():
+    controller = AdmissionController(SECRET, "HS256", enabled=True)
+    request = {**scope(), "method": "GET", "path": "/api/posters/a/h.svg"}
+
+    async def fetch():
+        async with controller.guard(request, "posters"):
+            return controller.limiters["posters"].in_flight
+
+    burst = ROUTE_CLASSES["posters"].burst
+    assert [asyncio.run(fetch()) for _ in range(burst)] == [1] * burst
+    assert controller.limiters["posters"].in_flight == 0
+    with pytest.raises(HTTPException) as raised:
+        asyncio.run(fetch())
+    assert raised.value.status_code == 429
+    assert raised.value.headers["Retry-After"] == "1"
+
+
+def test_only_admin_sampling_runs_skip_admission():
+    admin = jwt.encode({"user_id": "admin"}, SECRET, algorithm="HS256")
+    other = jwt.encode({"user_id": "u1"}, SECRET, algorithm="HS256")
+    controller = AdmissionController(SECRET, "HS256", is_admin=lambda token: token == admin)
+
+    def request(path, token=None):
+        return {**scope(), "method": "POST", "path": path,
+                "query_string": f"token={token}".encode() if token else b""}
+
+    assert controller.exempt(request("/api/admin/profiles/sample", admin))
+    assert not controller.exempt(request("/api/admin/profiles/sample", other))
+    assert not controller.exempt(request("/api/admin/profiles/sample"))
+    assert not controller.exempt(request("/api/admin/profiles", admin))
+    assert controller.exempt(request("/api/posters/a/h.svg"))
+
+
+def test_availability_checks_leave_the_auth_budget_alone():
+    controller = AdmissionController(SECRET, "HS256", enabled=True)
+
+    async def admit(method, path):
+        route_class = await controller.admit({**scope(), "method": method, "path": path})
+        controller.release(route_class)
+        return route_class
+
+    async def sign_up():
+        for _ in range(ROUTE_CLASSES["auth"].burst * 2):
+            await admit("GET", "/api/auth/available")
+        return await admit("POST", "/api/auth/register")
+
+    assert asyncio.run(sign_up()) == "auth"
@@ -0,0 +1,70 @@
+"""Batch multi-get routes: order, missing ids, the size limit and parity with the single routes."""
+import uuid
+
+import pytest
+
+CSS = "@keyframes f { from { opacity: 0; } to { opacity: 1; } } .animated-element { animation: f 1s infinite; }"
+
+
+@pytest.fixture
+def animations(api, register):
+    """Three animations by one author, liked by a second user; returns (viewer token, ids)."""
+    author_token, _ = register()
+    viewer_token, _ = register()
+    ids = []
+    for title in ("first", "second", "third"):
+        response = api.post(f"/api/animations?token={author_token}",
+                            json={"title": title, "css_code": CSS, "category": "Fade", "shape_type": "square"})
+        assert response.status_code == 200, response.text
+        ids.append(response.json()["id"])
+    api.post(f"/api/animations/{ids[1]}/like?token={viewer_token}")
+    return viewer_token, ids
+
+
+def test_animations_come_back_in_request_order_with_missing_ids(api, animations):
+    _, (first, second, third) = animations
+    unknown = str(uuid.uuid4())
+
+    response = api.post("/api/animations/batch", json={"ids": [third, unknown, first, second, third]})
+
+    assert response.status_code == 200
+    body = response.json()
+    assert [anim["id"] for anim in body["animations"]] == [third, first, second]
+    assert body["missing"] == [unknown]
+
+
+def test_batches_are_limited(api):
+    import server
+
+    ids = [str(uuid.uuid4()) for _ in range(server.MAX_BATCH_IDS + 1)]
+
+    assert api.post("/api/animations/batch", json={"ids": ids}).status_code == 400
+    assert api.post("/api/users/batch", json={"ids": ids}).status_code == 400
+    at_limit = api.post("/api/animations/batch", json={"ids": ids[:-1]})
+    assert at_limit.status_code == 200
+    assert len(at_limit.json()["missing"]) == server.MAX_BATCH_IDS
+
+
+@pytest.mark.parametrize("query", ["", "?token={token}", "?token={token}&include_likes=true"])
+def test_batch_entries_match_the_single_route(api, animations, query):
+    token, ids = animations
+    query = query.format(token=token)
+
+    batch = api.post(f"/api/animations/batch{query}", json={"ids": ids}).json()["animations"]
+
+    assert batch == [api.get(f"/api/animations/{animation_id}{query}").json() for animation_id in ids]
+    if token in query:
+        assert [anim["liked_by_me"] for anim in batch] == [False, True, False]
+    else:
+        assert all("liked_by_me" not in anim for anim in batch)
+
+
+def test_user_profiles_match_the_single_route(api, register):
+    (_, first), (_, second) = register(), register()
+    unknown = str(uuid.uuid4())
+
+    body = api.post("/api/users/batch", json={"ids": [second, unknown, first]}).json()
+
+    assert [user["id"] for user in body["users"]] == [second, first]
+    assert body["missing"] == [unknown]
+    assert body["users"] == [api.get(f"/api/users/{user_id}").json() for user_id in (second, first)]
@@ -0,0 +1,41 @@
+"""Availability filter: no false negatives, and a database lookup only for maybe-taken names."""
+import asyncio
+
+import pytest
+
+from bloom import BloomFilter, TakenNames
+
+pytest.importorskip("mongomock_motor")
+from mongomock_motor import AsyncMongoMockClient  # noqa: E402
+
+
+def test_filter_has_no_false_negatives_and_few_false_positives():
+    bloom = BloomFilter(1000, error_rate=0.01)
+    added = [f"user{i}" for i in range(1000)]
+    for value in added:
+        bloom.add(value)
+    assert all(value in bloom for value in added)
+    false_positives = sum(f"other{i}" in bloom for i in range(10000))
+    assert false_positives < 300
+
+
+def test_taken_names_confirm_maybe_taken_names_in_the_database():
+    async def scenario():
+        db = AsyncMongoMockClient()["bloom_test"]
+        await db.users.insert_one({"username": "ann", "email": "ann@example.com"})
+        names = TakenNames(db)
+        assert await names.username_taken("ann")
+        assert names.db_checks == 1
+        assert await names.rebuild() == 2
+
+        assert await names.username_taken("ann")
+        assert await names.email_taken("ann@example.com")
+        assert not await names.username_taken("bob")
+        assert names.filter_answers == 1
+
+        # Registered by this worker: the filter answers "maybe" at once
+        await db.users.insert_one({"username": "bob", "email": "bob@example.com"})
+        names.add("bob", "bob@example.com")
+        assert await names.username_taken("bob")
+
+    asyncio.run(scenario())
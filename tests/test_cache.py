@@ -0,0 +1,80 @@
+"""Cache backends that run without a server: InMemoryCache and LocalSharedCache."""
+import asyncio
+import time
+
+import pytest
+
+import cache
+from cache import InMemoryCache, LocalSharedCache, create_cache
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+@pytest.fixture(autouse=True)
+def empty_shared_store():
+    LocalSharedCache.reset()
+    yield
+    LocalSharedCache.reset()
+
+
+def test_values_round_trip_as_json_copies():
+    store = InMemoryCache()
+    value = {"ids": [1, 2], "title": "Spin"}
+    run(store.set("k", value))
+    first = run(store.get("k"))
+    first["ids"].append(3)
+    assert run(store.get("k")) == value
+
+
+def test_entries_expire_after_ttl(monkeypatch):
+    store = InMemoryCache()
+    now = time.monotonic()
+    monkeypatch.setattr(cache.time, "monotonic", lambda: now)
+    run(store.set("short", 1, ttl=5))
+    run(store.set("forever", 2))
+    monkeypatch.setattr(cache.time, "monotonic", lambda: now + 6)
+    assert run(store.get("short")) is None
+    assert run(store.get_many(["short", "forever"])) == {"forever": 2}
+
+
+def test_incr_and_delete():
+    store = InMemoryCache()
+    assert run(store.incr("feed:generation")) == 1
+    assert run(store.incr("feed:generation")) == 2
+    run(store.delete("feed:generation", "missing"))
+    assert run(store.get("feed:generation")) is None
+
+
+def test_memory_caches_are_private_to_each_instance():
+    first, second = InMemoryCache(), InMemoryCache()
+    run(first.set("k", 1))
+    assert run(second.get("k")) is None
+
+
+def test_local_shared_cache_is_seen_by_every_instance():
+    first, second = LocalSharedCache(), LocalSharedCache()
+    run(first.set_many({"a": 1, "b": 2}))
+    assert run(second.get_many(["a", "b", "c"])) == {"a": 1, "b": 2}
+    run(second.incr("feed:generation"))
+    assert run(first.get("feed:generation")) == 1
+    run(first.delete("a"))
+    assert run(second.get("a")) is None
+
+
+def test_local_shared_cache_reset_clears_every_instance():
+    store = LocalSharedCache()
+    run(store.set("k", 1))
+    LocalSharedCache.reset()
+    assert run(LocalSharedCache().get("k")) is None
+
+
+@pytest.mark.parametrize("backend, expected", [
+    ("memory", InMemoryCache), ("local", LocalSharedCache), ("redis", InMemoryCache),
+])
+def test_create_cache_selects_backend(monkeypatch, backend, expected):
+    # redis without REDIS_URL falls back to memory
+    monkeypatch.setenv("CACHE_BACKEND", backend)
+    monkeypatch.delenv("REDIS_URL", raising=False)
+    assert type(create_cache()) is expected
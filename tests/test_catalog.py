@@ -0,0 +1,80 @@
+"""In-process catalogue: paging and following the change log."""
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from catalog import Catalog, CatalogEntry, CatalogIndex
+
+pytest.importorskip("mongomock_motor")
+from mongomock_motor import AsyncMongoMockClient  # noqa: E402
+
+import changelog as changelog_module  # noqa: E402
+from changelog import ChangeLog  # noqa: E402
+from tiering import ArchiveTier  # noqa: E402
+
+NOW = datetime.now(timezone.utc)
+# mongomock cannot project likes_count with $size, so the documents carry it
+PROJECTION = {"_id": 0, "likes": 0}
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+def animation(i: int, days_old: int = 0, category: str = "Fade", likes=()) -> dict:
+    return {
+        "id": f"a{i}", "title": f"a{i}", "css_code": "", "category": category, "shape_type": "cube",
+        "user_id": "u1", "username": "u1", "created_at": (NOW - timedelta(days=days_old, minutes=i)).isoformat(),
+        "likes": list(likes), "likes_count": len(likes),
+    }
+
+
+def ids(page) -> list:
+    return None if page is None else [anim["id"] for anim in page]
+
+
+def test_index_pages_newest_first_and_stops_at_the_oldest():
+    index = CatalogIndex(CatalogEntry(animation(i, category="Rotate" if i % 2 else "Fade")) for i in range(6))
+    assert ids(index.page(0, 3)) == ["a0", "a1", "a2"]
+    assert ids(index.page(3, 3)) == ["a3", "a4", "a5"]
+    assert index.page(4, 3) is None
+    assert ids(index.page(1, 2, "Rotate")) == ["a3", "a5"]
+
+    index.remove("a3")
+    index.remove("missing")
+    assert ids(index.page(0, 5)) == ["a0", "a1", "a2", "a4", "a5"]
+    assert ids(index.page(0, 2, "Rotate")) == ["a1", "a5"]
+    index.add(CatalogEntry(animation(3, category="Rotate")))
+    assert ids(index.page(0, 3, "Rotate")) == ["a1", "a3", "a5"]
+
+
+def test_catch_up_follows_inserts_likes_and_tier_moves(monkeypatch):
+    monkeypatch.setattr(changelog_module, "SYNC_SETTLE", 0)
+
+    async def scenario():
+        db = AsyncMongoMockClient()["catalog_test"]
+        log = ChangeLog(db)
+        await log.ensure_indexes()
+        tier = ArchiveTier(db, changelog=log)
+        await tier.ensure_indexes()
+        await db.animations.insert_many([animation(i, days_old=400 if i >= 3 else 0) for i in range(5)])
+        catalog = Catalog(db, log, PROJECTION, enabled=False)
+        await catalog.load()
+        assert len(catalog.index) == 5
+
+        await db.animations.insert_one(animation(9, days_old=-1))
+        await log.animation_created("a9", "u1")
+        await db.animations.update_one({"id": "a0"}, {"$set": {"likes": ["u2", "u3"]}})
+        await log.likes_changed([("a0", 2, 2)])
+        assert (await tier.run(age_days=180))["moved"] == 2
+        await catalog.catch_up()
+        assert ids(catalog.page(0, 4)) == ["a9", "a0", "a1", "a2"]
+        assert catalog.page(0, 5) is None
+        assert catalog.get_many(["a0"])["a0"]["likes_count"] == 2
+
+        assert await tier.restore("a4") is not None
+        await catalog.catch_up()
+        assert ids(catalog.page(0, 5)) == ["a9", "a0", "a1", "a2", "a4"]
+
+    run(scenario())
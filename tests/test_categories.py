@@ -0,0 +1,93 @@
+"""Category counters: rebuilds are per-key upserts that several workers can run at once."""
+import asyncio
+
+import pytest
+
+pytest.importorskip("mongomock_motor")
+from mongomock_motor import AsyncMongoMockClient  # noqa: E402
+
+from categories import CategoryCatalog  # noqa: E402
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+async def counts(db) -> dict:
+    rows = await db.category_counts.find({}).to_list(None)
+    return {(row["category"], row["shape_type"]): row["count"] for row in rows}
+
+
+@pytest.fixture
+def db():
+    db = AsyncMongoMockClient()["categories_test"]
+    run(CategoryCatalog(db).ensure_indexes())
+    run(db.animations.insert_many([
+        {"id": "1", "category": "Fade", "shape_type": "cube"},
+        {"id": "2", "category": "Fade", "shape_type": "cube"},
+        {"id": "3", "category": "Spin", "shape_type": "sphere"},
+    ]))
+    return db
+
+
+def test_concurrent_seeds_agree(db):
+    async def seed_from_workers():
+        await asyncio.gather(*(CategoryCatalog(db).seed() for _ in range(4)))
+
+    run(seed_from_workers())
+    assert run(counts(db)) == {("Fade", "cube"): 2, ("Spin", "sphere"): 1}
+    assert run(db.categories.count_documents({})) == 6
+
+
+def test_rebuild_keeps_the_counter_documents(db):
+    catalog = CategoryCatalog(db)
+    run(catalog.rebuild_counts())
+    ids = {row["_id"] for row in run(db.category_counts.find({}).to_list(None))}
+    run(db.animations.insert_one({"id": "4", "category": "Fade", "shape_type": "cube"}))
+    run(catalog.rebuild_counts())
+    assert {row["_id"] for row in run(db.category_counts.find({}).to_list(None))} == ids
+    assert run(counts(db))[("Fade", "cube")] == 3
+
+
+def test_rebuild_drops_emptied_keys(db):
+    catalog = CategoryCatalog(db)
+    run(catalog.rebuild_counts())
+    run(db.animations.delete_one({"id": "3"}))
+    run(catalog.rebuild_counts())
+    assert run(counts(db)) == {("Fade", "cube"): 2}
+    run(catalog.record_created("Fade", "cube"))
+    assert run(counts(db)) == {("Fade", "cube"): 3}
+
+
+def test_rebuild_counts_archived_animations(db):
+    run(db.animations_archive.insert_one({"id": "5", "category": "Spin", "shape_type": "sphere"}))
+    run(CategoryCatalog(db).rebuild_counts())
+    assert run(counts(db)) == {("Fade", "cube"): 2, ("Spin", "sphere"): 2}
+
+
+class CreateDuringCount:
+    """A database whose animation count is followed by a create, as a concurrent request would."""
+
+    def __init__(self, db):
+        self.db = db
+        self.animations = self
+
+    def __getattr__(self, name):
+        return getattr(self.db, name)
+
+    def aggregate(self, pipeline):
+        self.pipeline = pipeline
+        return self
+
+    async def to_list(self, length):
+        rows = await self.db.animations.aggregate(self.pipeline).to_list(length)
+        await self.db.animations.insert_one({"id": "6", "category": "Fade", "shape_type": "cube"})
+        await CategoryCatalog(self.db).record_created("Fade", "cube")
+        return rows
+
+
+def test_creates_during_a_rebuild_are_kept(db):
+    run(CategoryCatalog(db).rebuild_counts())
+    run(db.animations.delete_one({"id": "1"}))
+    run(CategoryCatalog(CreateDuringCount(db)).rebuild_counts())
+    assert run(counts(db)) == {("Fade", "cube"): 2, ("Spin", "sphere"): 1}
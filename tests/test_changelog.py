@@ -0,0 +1,125 @@
+"""Change log: gaps left by unfinished writes, trimming and resets."""
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from pymongo.errors import PyMongoError
+
+pytest.importorskip("mongomock_motor")
+from mongomock_motor import AsyncMongoMockClient  # noqa: E402
+
+import changelog as changelog_module  # noqa: E402
+from changelog import ChangeLog  # noqa: E402
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+@pytest.fixture
+def log():
+    log = ChangeLog(AsyncMongoMockClient()["changelog_test"])
+    run(log.ensure_indexes())
+    return log
+
+
+class CountingCounters:
+    """db.counters, counting the sequence number allocations."""
+
+    def __init__(self, counters):
+        self.counters = counters
+        self.allocations = 0
+
+    def __getattr__(self, name):
+        return getattr(self.counters, name)
+
+    async def find_one_and_update(self, *args, **kwargs):
+        self.allocations += 1
+        return await self.counters.find_one_and_update(*args, **kwargs)
+
+
+class CountingDb:
+    def __init__(self, db):
+        self.db = db
+        self.counters = CountingCounters(db.counters)
+
+    def __getattr__(self, name):
+        return getattr(self.db, name)
+
+
+def seqs(result) -> list:
+    entries, token, reset, more = result
+    return [entry["seq"] for entry in entries], token, reset
+
+
+async def lose_next_write(log):
+    # A sequence number was handed out but its entry never written
+    await log.db.counters.update_one({"_id": "changes"}, {"$inc": {"seq": 1}}, upsert=True)
+
+
+def test_unwritten_first_entry_is_not_taken_for_expiry(log, monkeypatch):
+    run(lose_next_write(log))
+    run(log.animation_created("a1", "u1"))
+    # Too recent to tell a lost write from a slow one
+    assert seqs(run(log.since(0))) == ([], 0, False)
+
+    monkeypatch.setattr(changelog_module, "SYNC_SETTLE", 0)
+    assert seqs(run(log.since(0))) == ([2], 2, False)
+
+
+def test_gaps_hide_later_entries_until_settled(log, monkeypatch):
+    run(log.animation_created("a1", "u1"))
+    run(lose_next_write(log))
+    run(log.likes_changed([("a1", 1, 1)]))
+    assert seqs(run(log.since(0))) == ([1], 1, False)
+    monkeypatch.setattr(changelog_module, "SYNC_SETTLE", 0)
+    assert seqs(run(log.since(1))) == ([3], 3, False)
+
+
+def test_follows_are_only_returned_to_their_user(log):
+    run(log.follow_changed("u1", "u2", True))
+    run(log.animation_created("a1", "u2"))
+    assert seqs(run(log.since(0, "u1"))) == ([1, 2], 2, False)
+    assert seqs(run(log.since(0, "u3"))) == ([2], 2, False)
+
+
+def test_trimmed_tokens_reset(log):
+    for i in range(3):
+        run(log.animation_created(f"a{i}", "u1"))
+    old = datetime.now(timezone.utc) - timedelta(days=30)
+    run(log.changes.update_many({"seq": {"$lte": 2}}, {"$set": {"at": old}}))
+
+    assert run(log.trim()) == 2
+    assert seqs(run(log.since(1))) == ([], 3, True)
+    assert seqs(run(log.since(2))) == ([3], 3, False)
+    assert run(log.trim()) == 0
+
+
+def test_ttl_index_is_replaced(log):
+    run(log.changes.drop_index("at_1"))
+    run(log.changes.create_index("at", expireAfterSeconds=60))
+    run(log.ensure_indexes())
+    assert "expireAfterSeconds" not in run(log.changes.index_information())["at_1"]
+
+
+def test_a_flush_takes_its_sequence_numbers_in_one_update():
+    db = CountingDb(AsyncMongoMockClient()["changelog_test"])
+    log = ChangeLog(db)
+    run(log.ensure_indexes())
+
+    run(log.likes_changed([("a1", 1, 1), ("a2", -1, 0), ("a3", 2, 5)]))
+    run(log.animation_created("a4", "u1"))
+
+    assert db.counters.allocations == 2
+    entries, token, _, _ = run(log.since(0))
+    assert [(entry["seq"], entry["animation_id"]) for entry in entries] == [(1, "a1"), (2, "a2"), (3, "a3"), (4, "a4")]
+    assert token == 4
+    run(log.likes_changed([]))
+    assert db.counters.allocations == 2
+
+
+def test_write_failures_reach_the_caller(log):
+    run(log.changes.insert_one({"seq": 2, "at": datetime.now(timezone.utc), "type": "insert"}))
+
+    with pytest.raises(PyMongoError):
+        run(log.likes_changed([("a1", 1, 1), ("a2", 1, 1)]))
@@ -0,0 +1,51 @@
+"""Fragment cache: assembled responses decode to the full documents."""
+import json
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+
+from fragments import MUTABLE_FIELDS, FragmentCache  # noqa: E402
+
+
+def encode_fragment(anim: dict) -> bytes:
+    fixed = {key: value for key, value in anim.items() if key not in MUTABLE_FIELDS}
+    return json.dumps(fixed, separators=(",", ":")).encode()[:-1]
+
+
+def animation(i: int, **fields) -> dict:
+    return {"id": f"a{i}", "title": f"Spin {i}", "css_code": "@keyframes s { to { rotate: 1turn } }",
+            "category": "Rotate", "created_at": "2026-10-01T00:00:00+00:00", "likes_count": i, **fields}
+
+
+def test_responses_decode_to_the_documents():
+    cache = FragmentCache(encode_fragment)
+    animations = [
+        animation(0),
+        animation(1, liked_by_me=True),
+        animation(2, liked_by_me=False, likes=["u1", "ü2"]),
+    ]
+    assert json.loads(cache.encode_list(animations)) == animations
+    assert cache.encode_list([]) == b"[]"
+
+
+def test_fragments_are_reused_until_a_revision_field_changes():
+    cache = FragmentCache(encode_fragment)
+    cache.encode(animation(1))
+    assert json.loads(cache.encode(animation(1, likes_count=7, liked_by_me=True)))["likes_count"] == 7
+    assert (cache.hits, cache.misses) == (1, 1)
+
+    renamed = animation(1, title="Spin faster")
+    assert json.loads(cache.encode(renamed))["title"] == "Spin faster"
+    assert (cache.hits, cache.misses) == (1, 2)
+
+
+def test_cache_holds_at_most_max_bytes():
+    size = len(encode_fragment(animation(0)))
+    cache = FragmentCache(encode_fragment, max_bytes=size * 2)
+    for i in range(3):
+        cache.encode(animation(i))
+    assert cache.size <= size * 2
+    cache.encode(animation(2))
+    cache.encode(animation(0))
+    assert (cache.hits, cache.misses) == (1, 4)
@@ -0,0 +1,100 @@
+"""Idempotency keys: replay, conflicts and expired pending leases."""
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from fastapi import HTTPException
+
+pytest.importorskip("mongomock_motor")
+from mongomock_motor import AsyncMongoMockClient  # noqa: E402
+
+from idempotency import REPLAY_HEADER, IdempotencyStore  # noqa: E402
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+@pytest.fixture
+def store():
+    store = IdempotencyStore(AsyncMongoMockClient()["idempotency_test"], lease=30)
+    run(store.ensure_indexes())
+    return store
+
+
+def counting_handler():
+    calls = []
+
+    async def handler():
+        calls.append(1)
+        return {"liked": True, "calls": len(calls)}
+
+    return handler, calls
+
+
+def test_retry_replays_the_stored_response(store):
+    handler, calls = counting_handler()
+    assert run(store.run("k1", "u1:like:a", None, handler)) == {"liked": True, "calls": 1}
+    # From the database, as another worker would see it
+    store._recent.clear()
+    replay = run(store.run("k1", "u1:like:a", None, handler))
+    assert replay.headers[REPLAY_HEADER] == "true"
+    assert len(calls) == 1
+
+
+def test_reused_key_with_another_body_is_rejected(store):
+    handler, _ = counting_handler()
+    run(store.run("k1", "u1:create", {"title": "a"}, handler))
+    with pytest.raises(HTTPException) as exc:
+        run(store.run("k1", "u1:create", {"title": "b"}, handler))
+    assert exc.value.status_code == 422
+
+
+def test_pending_claim_conflicts_until_its_lease_expires(store):
+    handler, calls = counting_handler()
+    now = datetime.now(timezone.utc)
+    run(store.records.insert_one({
+        "key": "u1:like:a:k1", "fingerprint": "x", "state": "pending", "claim": "dead-worker",
+        "expires_at": now + timedelta(seconds=30), "created_at": now,
+    }))
+    with pytest.raises(HTTPException) as exc:
+        run(store.run("k1", "u1:like:a", None, handler))
+    assert exc.value.status_code == 409
+
+    run(store.records.update_one({"key": "u1:like:a:k1"}, {"$set": {"expires_at": now - timedelta(seconds=1)}}))
+    assert run(store.run("k1", "u1:like:a", None, handler))["calls"] == 1
+    record = run(store.records.find_one({"key": "u1:like:a:k1"}))
+    assert record["state"] == "done" and record["claim"] != "dead-worker"
+
+
+def test_stale_holder_cannot_overwrite_the_new_claim(store):
+    async def scenario():
+        release = asyncio.Event()
+
+        async def slow():
+            await release.wait()
+            return {"from": "stale"}
+
+        stale = asyncio.create_task(store.run("k1", "u1:like:a", None, slow))
+        await asyncio.sleep(0)
+        # The lease runs out and a retry takes the key over and finishes first
+        await store.records.update_one({}, {"$set": {"expires_at": datetime.now(timezone.utc) - timedelta(seconds=1)}})
+
+        async def fresh():
+            return {"from": "retry"}
+
+        await store.run("k1", "u1:like:a", None, fresh)
+        release.set()
+        await stale
+        return await store.records.find_one({"key": "u1:like:a:k1"})
+
+    assert run(scenario())["response"] == {"from": "retry"}
+
+
+def test_failed_handler_releases_the_key(store):
+    async def failing():
+        raise RuntimeError("boom")
+
+    with pytest.raises(RuntimeError):
+        run(store.run("k1", "u1:like:a", None, failing))
+    assert run(store.records.count_documents({})) == 0
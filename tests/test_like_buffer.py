@@ -0,0 +1,179 @@
+"""Write-behind likes: pending and in-flight intents as reads and toggles see them."""
+import asyncio
+
+import pytest
+
+from like_buffer import LikeBuffer
+
+
+class SlowAnimations:
+    """`db.animations` whose bulk_write waits for `release` and then fails or records the write."""
+
+    def __init__(self, fail: bool = False):
+        self.fail = fail
+        self.started = asyncio.Event()
+        self.release = asyncio.Event()
+        self.writes = []
+
+    async def bulk_write(self, operations, ordered=True):
+        self.started.set()
+        await self.release.wait()
+        if self.fail:
+            raise RuntimeError("write failed")
+        self.writes.append(operations)
+
+
+class FakeDb:
+    def __init__(self, animations):
+        self.animations = animations
+
+
+def buffer_with(animations) -> LikeBuffer:
+    return LikeBuffer(FakeDb(animations), enabled=True, max_pending=1000)
+
+
+def test_toggle_back_cancels_the_entry():
+    buffer = buffer_with(SlowAnimations())
+    assert buffer.toggle("a", "u1", stored_liked=False) is True
+    assert buffer.count_delta("a") == 1
+    assert buffer.toggle("a", "u1", stored_liked=False) is False
+    assert buffer.pending_count == 0
+    assert buffer.count_delta("a") == 0
+
+
+def test_apply_patches_counts_and_likes_arrays():
+    buffer = buffer_with(SlowAnimations())
+    buffer.toggle("a", "u1", stored_liked=False)
+    buffer.toggle("a", "u2", stored_liked=True)
+    assert buffer.apply({"id": "a", "likes_count": 3})["likes_count"] == 3
+    anim = buffer.apply({"id": "a", "likes": ["u2", "u3"]})
+    assert (sorted(anim["likes"]), anim["likes_count"]) == (["u1", "u3"], 2)
+
+
+def test_in_flight_intents_stay_visible_until_the_write_lands():
+    async def scenario():
+        animations = SlowAnimations()
+        buffer = buffer_with(animations)
+        buffer.toggle("a", "u1", stored_liked=False)
+        flush = asyncio.create_task(buffer.flush())
+        await animations.started.wait()
+
+        # The database still says "not liked" while the write is in flight
+        seen = (buffer.count_delta("a"), buffer.liked("a", "u1", stored=False),
+                buffer.apply({"id": "a", "likes_count": 0})["likes_count"])
+        # A second toggle is an unlike, not another like
+        unliked = buffer.toggle("a", "u1", stored_liked=False)
+        during = buffer.count_delta("a")
+
+        animations.release.set()
+        await flush
+        return seen, unliked, during, buffer._pending, animations.writes
+
+    seen, unliked, during, pending, writes = asyncio.run(scenario())
+    assert seen == (1, True, 1)
+    assert unliked is False
+    assert during == 0
+    assert pending == {"a": {"u1": (False, True)}}
+    assert len(writes) == 1
+
+
+def test_failed_write_puts_intents_back():
+    async def scenario():
+        animations = SlowAnimations(fail=True)
+        buffer = buffer_with(animations)
+        buffer.toggle("a", "u1", stored_liked=False)
+        buffer.toggle("b", "u1", stored_liked=False)
+        flush = asyncio.create_task(buffer.flush())
+        await animations.started.wait()
+        # Undone while in flight: nets out once the write is known to have failed
+        buffer.toggle("a", "u1", stored_liked=False)
+        animations.release.set()
+        with pytest.raises(RuntimeError):
+            await flush
+        return buffer
+
+    buffer = asyncio.run(scenario())
+    assert buffer._pending == {"b": {"u1": (True, False)}}
+    assert buffer.pending_count == 1
+    assert buffer.count_delta("a") == 0
+    assert buffer.liked("a", "u1", stored=False) is False
+
+
+def test_flush_reports_added_and_removed_users():
+    async def scenario():
+        animations = SlowAnimations()
+        animations.release.set()
+        buffer = buffer_with(animations)
+        reported = []
+
+        async def record(flushed):
+            reported.append(flushed)
+
+        buffer.on_flush(record)
+        buffer.toggle("a", "u1", stored_liked=False, category="Fade")
+        buffer.toggle("a", "u2", stored_liked=True)
+        buffer.toggle("b", "u1", stored_liked=False)
+        await buffer.flush()
+        return reported
+
+    # Once per flush, covering every animation written
+    assert asyncio.run(scenario()) == [[("a", "Fade", ["u1"], ["u2"]), ("b", None, ["u1"], [])]]
+
+
+def test_stop_waits_for_a_running_flush():
+    async def scenario():
+        animations = SlowAnimations()
+        buffer = LikeBuffer(FakeDb(animations), enabled=True, flush_interval=0.01)
+        buffer.start()
+        buffer.toggle("a", "u1", stored_liked=False)
+        await animations.started.wait()
+        stopping = asyncio.create_task(buffer.stop())
+        await asyncio.sleep(0.05)
+        assert not stopping.done()
+        animations.release.set()
+        await stopping
+        return buffer, animations.writes
+
+    buffer, writes = asyncio.run(scenario())
+    assert len(writes) == 1
+    assert (buffer._pending, buffer._in_flight) == ({}, {})
+
+
+def test_cancelled_write_puts_intents_back():
+    async def scenario():
+        animations = SlowAnimations()
+        buffer = buffer_with(animations)
+        buffer.toggle("a", "u1", stored_liked=False)
+        flush = asyncio.create_task(buffer.flush())
+        await animations.started.wait()
+        flush.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await flush
+        pending = dict(buffer._pending)
+        animations.release.set()
+        await buffer.stop()
+        return pending, buffer, animations.writes
+
+    pending, buffer, writes = asyncio.run(scenario())
+    assert pending == {"a": {"u1": (True, False)}}
+    assert len(writes) == 1
+    assert buffer._pending == {}
+
+
+def test_a_full_buffer_wakes_the_flusher_once():
+    async def scenario():
+        animations = SlowAnimations()
+        buffer = LikeBuffer(FakeDb(animations), enabled=True, flush_interval=60, max_pending=2)
+        buffer.start()
+        tasks = len(asyncio.all_tasks())
+        for user in range(5):
+            buffer.toggle("a", f"u{user}", stored_liked=False)
+        await asyncio.wait_for(animations.started.wait(), 1)
+        started_tasks = len(asyncio.all_tasks()) - tasks
+        animations.release.set()
+        await buffer.stop()
+        return started_tasks, animations.writes
+
+    started_tasks, writes = asyncio.run(scenario())
+    assert started_tasks == 0
+    assert len(writes) == 1
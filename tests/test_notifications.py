@@ -0,0 +1,48 @@
+"""Notifications: grouping and the unread count as groups are read or expire."""
+import asyncio
+
+import pytest
+
+pytest.importorskip("mongomock_motor")
+from mongomock_motor import AsyncMongoMockClient  # noqa: E402
+
+from notifications import NotificationCenter  # noqa: E402
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+@pytest.fixture
+def center():
+    center = NotificationCenter(AsyncMongoMockClient()["notifications_test"])
+    run(center.ensure_indexes())
+    return center
+
+
+def test_repeat_actors_are_counted_once(center):
+    for actor in ("bob", "cat", "bob"):
+        run(center.like("ann", actor, "a1", "Spin"))
+    run(center.like("ann", "ann", "a1", "Spin"))
+    groups, _ = run(center.page("ann"))
+    assert [(group["count"], group["recent_actors"]) for group in groups] == [(2, ["cat", "bob"])]
+    assert run(center.unread("ann")) == 1
+
+
+def test_unread_follows_reads_and_expiry(center):
+    run(center.like("ann", "bob", "a1", "Spin"))
+    run(center.like("ann", "bob", "a2", "Fade"))
+    run(center.follow("ann", "cat"))
+    assert run(center.unread("ann")) == 3
+
+    first = run(center.db.notifications.find_one({"target_id": "a1"}))
+    assert run(center.mark_read("ann", [first["id"]])) == 2
+    run(center.like("ann", "cat", "a1", "Spin"))
+    assert run(center.unread("ann")) == 3
+
+    # What the TTL monitor does to a group past NOTIFICATION_TTL
+    run(center.db.notifications.delete_one({"target_id": "a2"}))
+    assert run(center.unread("ann")) == 2
+    assert run(center.mark_read("ann")) == 0
+    assert run(center.unread("ann")) == 0
+
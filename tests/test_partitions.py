@@ -0,0 +1,76 @@
+"""Time-bucketed feeds: paging across months and cached bucket counts."""
+import asyncio
+import time
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+pytest.importorskip("mongomock_motor")
+from mongomock_motor import AsyncMongoMockClient  # noqa: E402
+
+from partitions import PartitionRouter, bucket_of  # noqa: E402
+from tiering import ArchiveTier  # noqa: E402
+
+NOW = datetime.now(timezone.utc)
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+def animation(i: int, days_old: int, category: str = "Fade") -> dict:
+    created_at = (NOW - timedelta(days=days_old, minutes=i)).isoformat()
+    return {
+        "id": f"a{i}", "title": f"a{i}", "css_code": "", "category": category, "shape_type": "cube",
+        "user_id": "u1", "username": "u1", "created_at": created_at, "bucket": bucket_of(created_at), "likes": [],
+    }
+
+
+@pytest.fixture
+def db():
+    db = AsyncMongoMockClient()["partitions_test"]
+    # Four months of posts, every third one in another category
+    run(db.animations.insert_many([
+        animation(i, days_old=(i // 5) * 31, category="Rotate" if i % 3 == 0 else "Fade") for i in range(20)
+    ]))
+    return db
+
+
+def expected(docs: list, skip: int, limit: int) -> list:
+    ordered = sorted(docs, key=lambda doc: doc["created_at"], reverse=True)
+    return [doc["id"] for doc in ordered[skip:skip + limit]]
+
+
+def test_pages_match_a_single_sorted_scan(db):
+    router = PartitionRouter(db)
+    docs = run(db.animations.find({}).to_list(None))
+    for query in ({}, {"category": "Rotate"}):
+        matching = [doc for doc in docs if all(doc[key] == value for key, value in query.items())]
+        for skip in (0, 3, 5, 7, 12, 25):
+            page = run(router.find_page(query, skip, 4))
+            assert [doc["id"] for doc in page] == expected(matching, skip, 4), (query, skip)
+    assert router.ready
+
+
+def test_unbucketed_animations_pass_through(db):
+    run(db.animations.update_one({"id": "a7"}, {"$unset": {"bucket": ""}}))
+    router = PartitionRouter(db)
+    page = run(router.find_page({}, 5, 4))
+    assert not router.ready
+    assert [doc["id"] for doc in page] == ["a5", "a6", "a7", "a8"]
+
+
+def test_archival_drops_cached_counts_in_every_router(db):
+    archiver, reader = PartitionRouter(db), PartitionRouter(db)
+    assert run(reader.find_page({}, 15, 1))[0]["id"] == "a15"
+    assert len(reader._counts) == 3
+
+    tier = ArchiveTier(db, archiver)
+    run(tier.ensure_indexes())
+    assert run(tier.run(age_days=40))["moved"] == 10
+    assert run(db.counters.find_one({"_id": "partitions"}))["generation"] == 1
+
+    # The reading worker drops its counts at its next refresh
+    reader._buckets_at = time.monotonic() - 3600
+    assert run(reader.find_page({}, 0, 20)) == run(tier.find_page({}, 0, 20))[:10]
+    assert reader._counts == {}
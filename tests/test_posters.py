@@ -0,0 +1,78 @@
+"""Poster SVGs: stable hashes, nothing from the user in the markup, and immutable responses."""
+import xml.etree.ElementTree as ET
+
+import pytest
+
+import posters
+from posters import STRIP_FRAMES, PosterRenderer, poster_hash, render_svg
+
+CSS = "@keyframes f { from { opacity: 0; } to { opacity: 1; transform: rotate(90deg); } } .animated-element { animation: f 1s infinite; }"
+HOSTILE = '</svg><script>alert("x")</script><svg onload="alert(1)">'
+IMMUTABLE = "public, max-age=31536000, immutable"
+
+
+def test_poster_hash_is_stable():
+    # Pinned: a change here invalidates every poster URL in every cache
+    assert poster_hash(".a{}", "cube") == "96dea386bf72af803737"
+    assert poster_hash(CSS, "cube") == poster_hash(CSS, "cube")
+
+
+def test_poster_hash_follows_css_shape_and_renderer(monkeypatch):
+    base = poster_hash(CSS, "cube")
+
+    assert poster_hash(CSS + " ", "cube") != base
+    assert poster_hash(CSS, "circle") != base
+    monkeypatch.setattr(posters, "RENDERER_VERSION", posters.RENDERER_VERSION + 1)
+    assert poster_hash(CSS, "cube") != base
+
+
+@pytest.mark.parametrize("frames", [1, STRIP_FRAMES])
+def test_user_css_never_reaches_the_markup(frames):
+    css = (f"/* {HOSTILE} */ @keyframes {HOSTILE} {{ from {{ transform: translateX({HOSTILE}) }} }} "
+           f".animated-element {{ animation: {HOSTILE} 1s; }}")
+
+    svg = render_svg(css, HOSTILE, frames)
+
+    root = ET.fromstring(svg)
+    assert all(element.tag.startswith("{http://www.w3.org/2000/svg}") for element in root.iter())
+    assert not any(name.startswith("on") for element in root.iter() for name in element.attrib)
+    assert "script" not in svg and "alert" not in svg
+
+
+def test_overlong_numbers_do_not_reach_the_markup():
+    css = f"@keyframes f {{ from {{ transform: translateX({'9' * 400}px) }} }} .animated-element {{ animation: f 1s; }}"
+
+    svg = render_svg(css, "cube", STRIP_FRAMES)
+
+    assert "nan" not in svg and "inf" not in svg
+    ET.fromstring(svg)
+
+
+def test_renders_are_memoized_and_rate_limited():
+    renderer = PosterRenderer(rate=0.001, burst=1)
+
+    svg, wait = renderer.render("a:1", CSS, "cube")
+    assert wait == 0 and renderer.renders == 1
+    assert renderer.render("a:1", CSS, "cube") == (svg, 0)
+    svg, wait = renderer.render("b:1", CSS, "circle")
+    assert svg is None and wait > 0
+
+
+def test_poster_responses_are_immutable(api, register):
+    token, _ = register()
+    title = f"<title>{HOSTILE}</title>"
+    created = api.post(f"/api/animations?token={token}",
+                       json={"title": title, "css_code": CSS, "category": "Fade", "shape_type": "circle"}).json()
+    poster = api.get(f"/api/animations/{created['id']}").json()["poster_hash"]
+    assert poster == poster_hash(CSS, "circle")
+
+    for filename in (f"{poster}.svg", f"{poster}.strip.svg", f"{poster}.svg"):
+        response = api.get(f"/api/posters/{created['id']}/{filename}")
+        assert response.status_code == 200
+        assert response.headers["cache-control"] == IMMUTABLE
+        assert response.headers["content-type"].startswith("image/svg+xml")
+        assert "alert" not in response.text
+        ET.fromstring(response.text)
+
+    assert api.get(f"/api/posters/{created['id']}/{poster_hash(CSS, 'cube')}.svg").status_code == 404
+    assert api.get(f"/api/posters/{created['id']}/{poster}.png").status_code == 404
@@ -0,0 +1,483 @@
+"""Query-plan regression tests.
+
+Seeds a throwaway database on a local MongoDB with a synthetic dataset, calls
+each route through the app and records every query it sends to MongoDB.
+Each recorded query is then explained with executionStats and checked:
+
+- the winning plan must not contain a COLLSCAN, and
+- keys/docs examined must stay within MAX_EXAMINED_RATIO x (docs returned
+  or matched) + EXAMINED_SLACK.
+
+The liked_by_me probe is the one read allowed to examine more than it
+returns: it is checked against the number of ids it asks about instead.
+
+With UPDATE_QUERY_PLANS=1 the rendered plans are written to
+tests/query_plans.json. When that file exists, a plan that differs from it
+fails with a diff, so a planner change is always a deliberate one.
+
+    MONGO_TEST_URL=mongodb://localhost:27017 python -m pytest tests/test_query_plans.py
+
+The module is skipped when no MongoDB answers at MONGO_TEST_URL. Bulk writes
+(trending scores, recommendation dirty marks) are not explained.
+"""
+import contextvars
+import difflib
+import json
+import os
+import random
+import sys
+import tempfile
+import uuid
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+import pytest
+from pymongo import MongoClient
+from pymongo.errors import PyMongoError
+
+MONGO_TEST_URL = os.environ.get("MONGO_TEST_URL", "mongodb://localhost:27017")
+TEST_DB = os.environ.get("QUERY_PLAN_DB", "css_animations_query_plans")
+BASELINE = Path(__file__).parent / "query_plans.json"
+UPDATE_BASELINE = os.environ.get("UPDATE_QUERY_PLANS") == "1"
+
+USERS = 300
+ANIMATIONS = 6000
+FOLLOWS_PER_USER = 20
+MAX_EXAMINED_RATIO = 2
+EXAMINED_SLACK = 25
+MAX_PAGE_IDS = 50
+PASSWORD = "query-plans"
+
+try:
+    _client = MongoClient(MONGO_TEST_URL, serverSelectionTimeoutMS=1000)
+    _client.admin.command("ping")
+except PyMongoError:
+    pytest.skip(f"No MongoDB at {MONGO_TEST_URL}", allow_module_level=True)
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent / "backend"
+sys.path.insert(0, str(BACKEND_DIR))
+os.environ.update({
+    "MONGO_URL": MONGO_TEST_URL,
+    "DB_NAME": TEST_DB,
+    "SEED_ON_STARTUP": "false",
+    "ADMISSION_ENABLED": "false",
+    "LIKE_WRITE_BEHIND": "false",
+    # Feed and single reads would be answered from memory
+    "CATALOG_ENABLED": "false",
+    "CACHE_BACKEND": "memory",
+    "WARM_FEED_PAGES": "0",
+    "SIMILARITY_DIR": tempfile.mkdtemp(prefix="similarity-"),
+})
+
+import server  # noqa: E402
+from cache import InMemoryCache  # noqa: E402
+from categories import DEFAULT_CATEGORIES  # noqa: E402
+from fastapi.testclient import TestClient  # noqa: E402
+from motor.motor_asyncio import AsyncIOMotorCollection  # noqa: E402
+
+# Queries issued by the request currently being served
+CAPTURED = contextvars.ContextVar("captured_queries", default=None)
+
+
+# Recording
+
+def _record(collection: str, op: str, **spec) -> dict:
+    query = {"collection": collection, "op": op, **spec}
+    captured = CAPTURED.get()
+    if captured is not None:
+        captured.append(query)
+    return query
+
+
+def _sort_spec(key_or_list, direction=None) -> dict:
+    if isinstance(key_or_list, str):
+        return {key_or_list: 1 if direction is None else direction}
+    return dict(key_or_list)
+
+
+class RecordingCursor:
+    def __init__(self, cursor, query: dict):
+        self._cursor = cursor
+        self._query = query
+
+    def sort(self, key_or_list, direction=None):
+        self._query["sort"] = _sort_spec(key_or_list, direction)
+        self._cursor = self._cursor.sort(key_or_list, direction)
+        return self
+
+    def skip(self, skip: int):
+        self._query["skip"] = skip
+        self._cursor = self._cursor.skip(skip)
+        return self
+
+    def limit(self, limit: int):
+        self._query["limit"] = limit
+        self._cursor = self._cursor.limit(limit)
+        return self
+
+    def batch_size(self, batch_size: int):
+        self._cursor = self._cursor.batch_size(batch_size)
+        return self
+
+    def to_list(self, length):
+        return self._cursor.to_list(length)
+
+    def __aiter__(self):
+        return self._cursor.__aiter__()
+
+
+class RecordingCollection:
+    def __init__(self, collection):
+        self._collection = collection
+        self._name = collection.name
+
+    def __getattr__(self, name):
+        return getattr(self._collection, name)
+
+    def find(self, filter=None, projection=None, *args, **kwargs):
+        query = _record(self._name, "find", filter=filter or {})
+        return RecordingCursor(self._collection.find(filter, projection, *args, **kwargs), query)
+
+    async def find_one(self, filter=None, *args, **kwargs):
+        _record(self._name, "find", filter=filter or {}, limit=1)
+        return await self._collection.find_one(filter, *args, **kwargs)
+
+    async def count_documents(self, filter, *args, **kwargs):
+        _record(self._name, "count", filter=filter)
+        return await self._collection.count_documents(filter, *args, **kwargs)
+
+    def aggregate(self, pipeline, *args, **kwargs):
+        _record(self._name, "aggregate", pipeline=pipeline)
+        return self._collection.aggregate(pipeline, *args, **kwargs)
+
+    async def update_one(self, filter, update, upsert=False, *args, **kwargs):
+        _record(self._name, "update", filter=filter, update=update, upsert=upsert, multi=False)
+        return await self._collection.update_one(filter, update, upsert, *args, **kwargs)
+
+    async def update_many(self, filter, update, upsert=False, *args, **kwargs):
+        _record(self._name, "update", filter=filter, update=update, upsert=upsert, multi=True)
+        return await self._collection.update_many(filter, update, upsert, *args, **kwargs)
+
+    async def find_one_and_update(self, filter, update, *args, **kwargs):
+        _record(self._name, "findAndModify", filter=filter, update=update,
+                upsert=kwargs.get("upsert", False), sort=kwargs.get("sort"))
+        return await self._collection.find_one_and_update(filter, update, *args, **kwargs)
+
+    async def delete_one(self, filter, *args, **kwargs):
+        _record(self._name, "delete", filter=filter, multi=False)
+        return await self._collection.delete_one(filter, *args, **kwargs)
+
+    async def delete_many(self, filter, *args, **kwargs):
+        _record(self._name, "delete", filter=filter, multi=True)
+        return await self._collection.delete_many(filter, *args, **kwargs)
+
+
+class RecordingDatabase:
+    def __init__(self, db):
+        self._db = db
+
+    def __getattr__(self, name):
+        value = getattr(self._db, name)
+        return RecordingCollection(value) if isinstance(value, AsyncIOMotorCollection) else value
+
+    def __getitem__(self, name):
+        return RecordingCollection(self._db[name])
+
+
+# Queries issued by the last completed request
+LAST_CAPTURE = []
+
+
+def recording_app(app):
+    async def wrapped(scope, receive, send):
+        if scope["type"] != "http":
+            await app(scope, receive, send)
+            return
+        captured = []
+        token = CAPTURED.set(captured)
+        try:
+            await app(scope, receive, send)
+        finally:
+            CAPTURED.reset(token)
+            LAST_CAPTURE[:] = captured
+    return wrapped
+
+
+# Explain
+
+def explain_command(query: dict) -> dict:
+    name, op = query["collection"], query["op"]
+    if op == "find":
+        command = {"find": name, "filter": query["filter"]}
+        for option in ("sort", "skip", "limit"):
+            if query.get(option) is not None:
+                command[option] = query[option]
+        return command
+    if op == "count":
+        return {"count": name, "query": query["filter"]}
+    if op == "aggregate":
+        return {"aggregate": name, "pipeline": query["pipeline"], "cursor": {}}
+    if op == "update":
+        return {"update": name, "updates": [
+            {"q": query["filter"], "u": query["update"], "upsert": query["upsert"], "multi": query["multi"]}
+        ]}
+    if op == "findAndModify":
+        command = {"findAndModify": name, "query": query["filter"], "update": query["update"], "upsert": query["upsert"]}
+        if query.get("sort"):
+            command["sort"] = _sort_spec(query["sort"])
+        return command
+    if op == "delete":
+        return {"delete": name, "deletes": [{"q": query["filter"], "limit": 0 if query["multi"] else 1}]}
+    raise ValueError(f"Cannot explain {op}")
+
+
+def _planner_output(explain: dict) -> dict:
+    """The part of an explain result holding queryPlanner/executionStats."""
+    if "queryPlanner" in explain:
+        return explain
+    for stage in explain.get("stages", []):
+        if "$cursor" in stage:
+            return stage["$cursor"]
+    raise AssertionError(f"Unrecognised explain output: {json.dumps(explain, default=str)[:500]}")
+
+
+def _children(stage: dict) -> list:
+    children = []
+    for key in ("inputStage", "outerStage", "innerStage", "thenStage", "elseStage"):
+        if key in stage:
+            children.append(stage[key])
+    children.extend(stage.get("inputStages", []))
+    return children
+
+
+def render_plan(stage: dict, depth: int = 0) -> list:
+    stage = stage.get("queryPlan", stage)
+    line = "  " * depth + stage.get("stage", "?")
+    if "indexName" in stage:
+        line += f" {stage['indexName']}"
+    if "sortPattern" in stage:
+        line += f" sort={json.dumps(stage['sortPattern'])}"
+    lines = [line]
+    for child in _children(stage):
+        lines += render_plan(child, depth + 1)
+    return lines
+
+
+def _stages(stage: dict) -> list:
+    stage = stage.get("queryPlan", stage)
+    names = [stage.get("stage")]
+    for child in _children(stage):
+        names += _stages(child)
+    return names
+
+
+def shape(value):
+    """The filter with its values replaced by '?', so keys are stable across runs."""
+    if isinstance(value, dict):
+        return {key: shape(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [shape(item) for item in value] if value and all(isinstance(item, dict) for item in value) else "?"
+    return "?"
+
+
+def query_label(route: str, index: int, query: dict) -> str:
+    spec = query.get("filter", query.get("pipeline"))
+    label = f"{route} #{index} {query['collection']}.{query['op']} {json.dumps(shape(spec), sort_keys=True)}"
+    if query.get("sort"):
+        label += f" sort={json.dumps(query['sort'])}"
+    return label
+
+
+def expected_results(db, query: dict, stats: dict) -> int:
+    """Documents the query legitimately touches: returned for reads, matched for writes and counts."""
+    op = query["op"]
+    if op == "find":
+        return stats.get("nReturned", 0)
+    if op == "aggregate":
+        first = query["pipeline"][0] if query["pipeline"] else {}
+        if "$match" in first:
+            return db[query["collection"]].count_documents(first["$match"])
+        return stats.get("nReturned", 0)
+    matched = db[query["collection"]].count_documents(query["filter"])
+    return matched if op == "count" or query.get("multi") else min(matched, 1)
+
+
+def is_liked_by_me(query: dict) -> bool:
+    # present_animations asks which of a page's animations the viewer liked:
+    # it probes every id on the page but returns only the liked ones
+    return (query["collection"] == "animations" and query["op"] == "find"
+            and shape(query["filter"]) == {"id": {"$in": "?"}, "likes": "?"})
+
+
+def check_liked_by_me(query: dict, stats: dict) -> list:
+    """The membership probe may touch each id on the page once, and pages are bounded."""
+    ids = len(query["filter"]["id"]["$in"])
+    problems = []
+    if ids > MAX_PAGE_IDS:
+        problems.append(f"probed {ids} ids (a page holds at most {MAX_PAGE_IDS})")
+    keys, docs = stats.get("totalKeysExamined", 0), stats.get("totalDocsExamined", 0)
+    if docs > ids:
+        problems.append(f"examined {docs} documents for {ids} ids")
+    if keys > MAX_EXAMINED_RATIO * ids + EXAMINED_SLACK:
+        problems.append(f"examined {keys} index keys for {ids} ids")
+    return problems
+
+
+def check_query(db, route: str, index: int, query: dict, unbounded_keys: tuple) -> tuple:
+    """Return (label, rendered plan, list of problems)."""
+    label = query_label(route, index, query)
+    explain = db.command("explain", explain_command(query), verbosity="executionStats")
+    planner = _planner_output(explain)
+    winning = planner["queryPlanner"]["winningPlan"]
+    stats = planner["executionStats"]
+    plan = render_plan(winning)
+
+    problems = []
+    if "COLLSCAN" in _stages(winning):
+        problems.append("winning plan scans the whole collection (COLLSCAN)")
+    if is_liked_by_me(query):
+        return label, plan, problems + check_liked_by_me(query, stats)
+    results = expected_results(db, query, stats)
+    allowed = MAX_EXAMINED_RATIO * max(results, 1) + EXAMINED_SLACK
+    keys, docs = stats.get("totalKeysExamined", 0), stats.get("totalDocsExamined", 0)
+    if docs > allowed:
+        problems.append(f"examined {docs} documents for {results} results (allowed {allowed})")
+    if keys > allowed and query["collection"] not in unbounded_keys:
+        problems.append(f"examined {keys} index keys for {results} results (allowed {allowed})")
+    return label, plan, problems
+
+
+# Synthetic dataset
+
+def seed(db) -> dict:
+    rng = random.Random(40)
+    for name in db.list_collection_names():
+        db.drop_collection(name)
+
+    password = server.hash_password(PASSWORD)
+    started = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    users = [{
+        "id": str(uuid.UUID(int=rng.getrandbits(128))),
+        "username": f"user{i:04d}",
+        "email": f"user{i:04d}@example.com",
+        "password": password,
+        "bio": "",
+        "profile_picture": "",
+        "joined_date": (started + timedelta(hours=i)).isoformat(),
+        "followers": [],
+        "following": [],
+    } for i in range(USERS)]
+    user_ids = [user["id"] for user in users]
+    for user in users:
+        for followed in rng.sample(user_ids, FOLLOWS_PER_USER):
+            if followed != user["id"]:
+                user["following"].append(followed)
+                users[user_ids.index(followed)]["followers"].append(user["id"])
+    db.users.insert_many(users)
+
+    animations, trending = [], []
+    for i in range(ANIMATIONS):
+        owner = users[int(rng.paretovariate(1.2)) % USERS]
+        animation = {
+            "id": str(uuid.UUID(int=rng.getrandbits(128))),
+            "title": f"Animation {i}",
+            "css_code": "@keyframes a { from { opacity: 0; } to { opacity: 1; } }",
+            "category": rng.choice(DEFAULT_CATEGORIES),
+            "shape_type": rng.choice(["cube", "square", "circle", "rectangle"]),
+            "user_id": owner["id"],
+            "username": owner["username"],
+            "user_profile_picture": "",
+            "created_at": (started + timedelta(minutes=10 * i)).isoformat(),
+            "bucket": (started + timedelta(minutes=10 * i)).strftime("%Y-%m"),
+            "likes": rng.sample(user_ids, rng.randint(0, 30)),
+            "likes_count": 0,
+        }
+        animations.append(animation)
+        if animation["likes"]:
+            for window in ("day", "week", "month", "all"):
+                trending.append({
+                    "animation_id": animation["id"], "window": window, "category": animation["category"],
+                    "score": float(len(animation["likes"])), "epoch": 0,
+                })
+    db.animations.insert_many(animations)
+    db.trending.insert_many(trending)
+    return {"users": users, "animations": animations}
+
+
+# Fixtures and routes
+
+@pytest.fixture(scope="module")
+def env():
+    db = _client[TEST_DB]
+    data = seed(db)
+    baseline = json.loads(BASELINE.read_text()) if BASELINE.exists() and not UPDATE_BASELINE else {}
+    plans = {}
+    with TestClient(recording_app(server.app)) as client:
+        server.db._db = RecordingDatabase(server.db._db)
+        yield {"db": db, "client": client, "data": data, "baseline": baseline, "plans": plans}
+    if UPDATE_BASELINE:
+        BASELINE.write_text(json.dumps(dict(sorted(plans.items())), indent=2) + "\n")
+    _client.drop_database(TEST_DB)
+
+
+def _viewer(data) -> dict:
+    # The most followed user has the busiest profile and a full following feed
+    return max(data["users"], key=lambda user: len(user["followers"]))
+
+
+def _popular_animation(data) -> dict:
+    return max(data["animations"], key=lambda animation: len(animation["likes"]))
+
+
+ROUTES = [
+    # (name, method, path builder, json body builder, collections whose key scans are unbounded)
+    ("feed", "GET", lambda d: "/api/animations?limit=50", None, ()),
+    ("feed_category", "GET", lambda d: "/api/animations?limit=50&category=Rotate", None, ()),
+    ("feed_following", "GET", lambda d: f"/api/animations/following?token={d['token']}&limit=50", None, ()),
+    ("feed_trending", "GET", lambda d: "/api/animations/trending?window=week&limit=20", None, ()),
+    ("user_animations", "GET", lambda d: f"/api/users/{d['viewer']['id']}/animations", None, ()),
+    ("animation", "GET", lambda d: f"/api/animations/{d['animation']['id']}", None, ()),
+    ("profile", "GET", lambda d: f"/api/users/{d['viewer']['id']}", None, ()),
+    ("me", "GET", lambda d: f"/api/auth/me?token={d['token']}", None, ()),
+    # An unanchored case-insensitive regex walks the whole username index
+    ("search", "GET", lambda d: "/api/users/search?q=user01", None, ("users",)),
+    ("like", "POST", lambda d: f"/api/animations/{d['animation']['id']}/like?token={d['token']}", None, ()),
+    ("follow", "POST", lambda d: f"/api/users/{d['target']['id']}/follow?token={d['token']}", None, ()),
+    ("unfollow", "POST", lambda d: f"/api/users/{d['target']['id']}/unfollow?token={d['token']}", None, ()),
+    ("notifications", "GET", lambda d: f"/api/notifications?token={d['token']}", None, ()),
+    ("register", "POST", lambda d: "/api/auth/register",
+     lambda d: {"username": f"new{uuid.uuid4().hex[:8]}", "email": f"{uuid.uuid4().hex[:8]}@example.com", "password": PASSWORD}, ()),
+    ("login", "POST", lambda d: "/api/auth/login",
+     lambda d: {"username": d["viewer"]["username"], "password": PASSWORD}, ()),
+]
+
+
+@pytest.mark.parametrize("name, method, path, body, unbounded_keys", ROUTES, ids=[route[0] for route in ROUTES])
+def test_route_query_plans(env, name, method, path, body, unbounded_keys):
+    data = env["data"]
+    viewer = _viewer(data)
+    context = {
+        "viewer": viewer,
+        "token": server.create_token(viewer["id"]),
+        "animation": _popular_animation(data),
+        "target": next(user for user in data["users"] if user["id"] not in viewer["following"] and user is not viewer),
+    }
+    # Every request must reach MongoDB rather than a warm cache
+    server.cache = InMemoryCache()
+
+    response = env["client"].request(method, path(context), json=body(context) if body else None)
+    assert response.status_code < 400, f"{method} {path(context)} -> {response.status_code}: {response.text}"
+    queries = list(LAST_CAPTURE)
+    assert queries, f"{name} issued no MongoDB queries"
+
+    failures = []
+    for index, query in enumerate(queries):
+        label, plan, problems = check_query(env["db"], name, index, query, unbounded_keys)
+        env["plans"][label] = plan
+        expected = env["baseline"].get(label)
+        if expected is not None and expected != plan:
+            diff = "\n".join(difflib.unified_diff(expected, plan, "baseline", "current", lineterm=""))
+            problems.append(f"plan changed from tests/{BASELINE.name}:\n{diff}")
+        if problems:
+            failures.append(f"{label}\n  " + "\n  ".join(problems) + "\n  plan:\n    " + "\n    ".join(plan))
+    assert not failures, "\n\n".join(failures)
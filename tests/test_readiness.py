@@ -0,0 +1,90 @@
+"""Readiness, the deferred database handle and startup profiling."""
+import sys
+
+import pytest
+
+import startup_profile
+from database import DeferredDatabase
+from tests.conftest import serve
+
+
+def test_database_is_unusable_before_it_is_connected():
+    db = DeferredDatabase()
+
+    assert not db.connected
+    with pytest.raises(RuntimeError):
+        db.animations
+    with pytest.raises(RuntimeError):
+        db["animations"]
+    # Private names never reach the database, bound or not
+    with pytest.raises(AttributeError):
+        db._anything
+    db.close()
+
+
+def test_database_forwards_once_bound():
+    pytest.importorskip("mongomock_motor")
+    from mongomock_motor import AsyncMongoMockClient
+
+    db = DeferredDatabase()
+    client = AsyncMongoMockClient()
+    db._client, db._db = client, client["deferred_test"]
+
+    assert db.connected
+    assert db.animations.name == "animations"
+    assert db["users"].name == "users"
+
+
+def test_readyz_answers_503_until_warmup_finishes(monkeypatch):
+    pytest.importorskip("mongomock_motor")
+    from fastapi.testclient import TestClient
+
+    import server
+
+    # Feed warmup is the last phase before the worker is marked ready
+    during_warmup = []
+    load_feed_page = server.load_feed_page
+
+    async def observe_readiness(*args):
+        during_warmup.append((await server.readyz()).status_code)
+        return await load_feed_page(*args)
+
+    monkeypatch.setattr(server, "load_feed_page", observe_readiness)
+    assert TestClient(server.app).get("/readyz").status_code == 503
+
+    with serve(monkeypatch) as client:
+        assert during_warmup and set(during_warmup) == {503}
+        response = client.get("/readyz")
+        assert response.status_code == 200
+        assert response.json()["status"] == "ready"
+
+    assert client.get("/readyz").status_code == 503
+
+
+def test_phases_are_timed_only_when_enabled(monkeypatch):
+    monkeypatch.setattr(startup_profile, "_phase_times", {})
+
+    monkeypatch.setattr(startup_profile, "ENABLED", False)
+    with startup_profile.phase("off"):
+        pass
+    assert startup_profile.report(log=False) == {}
+
+    monkeypatch.setattr(startup_profile, "ENABLED", True)
+    with startup_profile.phase("on"):
+        pass
+    assert list(startup_profile.report(log=False)["phases_ms"]) == ["on"]
+
+
+def test_install_times_later_imports(monkeypatch, tmp_path):
+    (tmp_path / "profiled_module.py").write_text("VALUE = 1\n")
+    monkeypatch.syspath_prepend(str(tmp_path))
+    monkeypatch.setattr(startup_profile, "ENABLED", True)
+    monkeypatch.setattr(startup_profile, "_import_times", {})
+    monkeypatch.setattr(sys, "meta_path", list(sys.meta_path))
+
+    startup_profile.install()
+    startup_profile.install()
+    import profiled_module  # noqa: F401
+
+    assert sum(isinstance(finder, startup_profile._TimingFinder) for finder in sys.meta_path) == 1
+    assert "profiled_module" in startup_profile.report(log=False)["slowest_imports_ms"]
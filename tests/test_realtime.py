@@ -0,0 +1,41 @@
+"""Live-update fan-out and broker selection."""
+import asyncio
+
+import pytest
+
+from realtime import LocalBroker, PubSub, RealtimeHub, animation_topic, create_broker
+
+
+def test_slow_subscription_drops_its_oldest_messages():
+    pubsub = PubSub()
+    subscription = pubsub.subscribe([animation_topic("a")], maxsize=2)
+    for count in range(3):
+        pubsub.publish(animation_topic("a"), {"likes_count": count})
+    assert subscription.dropped == 1
+    assert [subscription.queue.get_nowait()["likes_count"] for _ in range(2)] == [1, 2]
+    pubsub.unsubscribe(subscription)
+    assert pubsub.connection_count == 0
+
+
+def test_hub_coalesces_likes_per_animation():
+    async def scenario():
+        hub = RealtimeHub(LocalBroker())
+        await hub.broker.start(hub.pubsub.publish)
+        subscription = hub.subscribe([animation_topic("a")])
+        hub.like_changed("a", 1, 1)
+        hub.like_changed("a", 1, 2)
+        await hub.flush()
+        await hub.broker.stop()
+        return subscription.queue.get_nowait(), subscription.queue.empty()
+
+    message, drained = asyncio.run(scenario())
+    assert (message["delta"], message["likes_count"], drained) == (2, 2, True)
+
+
+def test_several_workers_require_the_redis_broker(monkeypatch):
+    monkeypatch.delenv("CACHE_BACKEND", raising=False)
+    monkeypatch.setenv("WEB_CONCURRENCY", "2")
+    with pytest.raises(RuntimeError):
+        create_broker()
+    monkeypatch.setenv("WEB_CONCURRENCY", "1")
+    assert isinstance(create_broker(), LocalBroker)
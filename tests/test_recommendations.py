@@ -0,0 +1,72 @@
+"""Who-to-follow scoring and the incremental job on a small graph."""
+import asyncio
+
+import pytest
+
+pytest.importorskip("scipy")
+pytest.importorskip("mongomock_motor")
+from mongomock_motor import AsyncMongoMockClient  # noqa: E402
+
+from recommendations import FollowGraph, RecommendationJob, mark_dirty  # noqa: E402
+
+# ann -> bob -> cat -> dan, eve -> ann; ann and fay both liked the same two animations
+FOLLOWING = {"ann": ["bob"], "bob": ["cat"], "cat": ["dan"], "dan": [], "eve": ["ann"], "fay": []}
+LIKES = [["ann", "fay"], ["ann", "fay", "cat"]]
+
+
+def users():
+    followers = {user_id: [] for user_id in FOLLOWING}
+    for user_id, following in FOLLOWING.items():
+        for followed_id in following:
+            followers[followed_id].append(user_id)
+    return [{"id": user_id, "username": user_id, "following": following, "followers": followers[user_id]}
+            for user_id, following in FOLLOWING.items()]
+
+
+def suggested(results, user_id):
+    return [suggestion["user_id"] for suggestion in results.get(user_id, [])]
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+@pytest.fixture
+def db():
+    db = AsyncMongoMockClient()["recommendations_test"]
+    run(db.users.insert_many(users()))
+    run(db.animations.insert_many([{"id": f"a{i}", "likes": likes} for i, likes in enumerate(LIKES)]))
+    return db
+
+
+def test_scores_second_hop_follows_and_colikes():
+    results = FollowGraph(users(), [{"likes": likes} for likes in LIKES]).recommend(["ann", "eve"])
+    # cat is both followed by bob and a co-liker; fay only co-likes
+    assert suggested(results, "ann") == ["cat", "fay"]
+    assert results["ann"][0]["mutual_follows"] == 1
+    assert results["ann"][1]["shared_likes"] == 2
+    assert suggested(results, "eve") == ["bob"]
+
+
+def test_neighbourhood_rows_match_the_full_graph(db):
+    job = RecommendationJob(db)
+    graph, targets = run(job.load_neighbourhood(["bob"]))
+    assert targets == ["ann", "bob"]
+    assert "eve" not in graph.index
+    full = run(job.load_graph()).recommend(targets)
+    assert graph.recommend(targets) == full
+
+
+def test_incremental_run_recomputes_followers_of_dirty_users(db):
+    job = RecommendationJob(db)
+    run(job.ensure_indexes())
+    run(job.run())
+    assert "dan" not in [suggestion["user_id"] for suggestion in run(job.suggestions("ann"))]
+
+    # bob now follows dan: ann (a follower of bob) should see dan without being marked
+    run(db.users.update_one({"id": "bob"}, {"$addToSet": {"following": "dan"}}))
+    run(db.users.update_one({"id": "dan"}, {"$addToSet": {"followers": "bob"}}))
+    run(mark_dirty(db, "bob", "dan"))
+    assert run(job.run(incremental=True)) == 4  # bob and dan, and their followers ann and cat
+    assert "dan" in [suggestion["user_id"] for suggestion in run(job.suggestions("ann"))]
+    assert run(db.recommendation_dirty.count_documents({})) == 0
@@ -0,0 +1,73 @@
+"""Similarity index: features, and files shared between processes through add and rebuild."""
+import pytest
+
+pytest.importorskip("numpy")
+from similarity import INITIAL_CAPACITY, SimilarityIndex, extract_features  # noqa: E402
+
+SPIN = "@keyframes spin { from { transform: rotate(0deg); } to { transform: rotate(360deg); } } .a { animation: spin 1s linear infinite; }"
+SPIN_SLOW = SPIN.replace("1s", "3s")
+FADE = "@keyframes fade { from { opacity: 0; } to { opacity: 1; } } .a { animation: fade 0.5s ease-in; }"
+
+
+def vector(css: str, category: str = "Rotate") -> list:
+    return extract_features(css, category, "cube")
+
+
+def ids(results) -> list:
+    return [animation_id for animation_id, _ in results]
+
+
+def test_features_rank_similar_css_first(tmp_path):
+    index = SimilarityIndex(tmp_path)
+    index.add("spin", vector(SPIN))
+    index.add("spin-slow", vector(SPIN_SLOW))
+    index.add("fade", vector(FADE, "Fade"))
+    assert ids(index.query(vector(SPIN), limit=2, exclude="spin")) == ["spin-slow", "fade"]
+
+
+def test_other_processes_see_appended_rows(tmp_path):
+    writer, reader = SimilarityIndex(tmp_path), SimilarityIndex(tmp_path)
+    writer.add("spin", vector(SPIN))
+    assert len(reader) == 1
+    writer.add("fade", vector(FADE, "Fade"))
+    assert ids(reader.query(vector(FADE, "Fade"), limit=1)) == ["fade"]
+
+
+def test_rebuild_at_the_same_capacity_is_remapped(tmp_path):
+    reader = SimilarityIndex(tmp_path)
+    SimilarityIndex(tmp_path).rebuild([("spin", vector(SPIN)), ("fade", vector(FADE, "Fade"))])
+    assert ids(reader.query(vector(SPIN), limit=1)) == ["spin"]
+
+    # Same row count and capacity, different rows: the old map would pair "fade" with the spin vector
+    SimilarityIndex(tmp_path).rebuild([("fade", vector(FADE, "Fade")), ("spin", vector(SPIN))])
+    top_id, score = reader.query(vector(FADE, "Fade"), limit=1)[0]
+    assert (top_id, score) == ("fade", pytest.approx(1.0))
+
+
+def test_add_after_rebuild_takes_the_next_row(tmp_path):
+    index = SimilarityIndex(tmp_path)
+    index.add("old", vector(FADE, "Fade"))
+    index.rebuild([("a", vector(SPIN)), ("b", vector(SPIN_SLOW))])
+    index.add("fade", vector(FADE, "Fade"))
+    assert len(index) == 3
+    assert index.query(vector(FADE, "Fade"), limit=1)[0] == ("fade", pytest.approx(1.0))
+
+
+def test_add_grows_past_the_initial_capacity(tmp_path):
+    index = SimilarityIndex(tmp_path)
+    for i in range(INITIAL_CAPACITY + 1):
+        index.add(f"a{i}", vector(SPIN))
+    assert len(index) == INITIAL_CAPACITY + 1
+    assert index.vectors_path.stat().st_size == 2 * INITIAL_CAPACITY * 4 * len(vector(SPIN))
+
+
+def test_rebuild_keeps_rows_added_while_it_read(tmp_path):
+    index = SimilarityIndex(tmp_path)
+    index.add("existing", vector(SPIN))
+    carried_from = len(index)
+    # Created during the database scan: one the scan saw, one it missed
+    index.add("seen", vector(SPIN_SLOW))
+    index.add("missed", vector(FADE, "Fade"))
+    index.rebuild([("existing", vector(SPIN)), ("seen", vector(SPIN_SLOW))], carried_from)
+    assert len(index) == 3
+    assert index.query(vector(FADE, "Fade"), limit=1)[0] == ("missed", pytest.approx(1.0))
@@ -0,0 +1,87 @@
+"""Streamed user listings: framing across batches, both tiers, and the in-memory cap."""
+import asyncio
+import json
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from streaming import NDJSON_MEDIA_TYPE, stream_json
+
+CSS = "@keyframes f { from { opacity: 0; } to { opacity: 1; } } .animated-element { animation: f 1s infinite; }"
+
+
+async def body_of(response) -> bytes:
+    return b"".join([chunk async for chunk in response.body_iterator])
+
+
+async def batches_of(*batches):
+    for batch in batches:
+        yield list(batch)
+
+
+@pytest.mark.parametrize("batches", [(), ([],), ([b'{"a":1}'],), ([], [b'{"a":1}', b'{"a":2}'], [], [b'{"a":3}'])])
+def test_framing_is_valid_json(batches):
+    items = [json.loads(item) for batch in batches for item in batch]
+
+    array = asyncio.run(body_of(stream_json(batches_of(*batches))))
+    lines = asyncio.run(body_of(stream_json(batches_of(*batches), ndjson=True)))
+
+    assert json.loads(array) == items
+    assert [json.loads(line) for line in lines.splitlines()] == items
+
+
+@pytest.fixture
+def catalogue(api, register, monkeypatch):
+    """Five animations by one user, the two oldest archived, streamed two at a time; returns (user id, ids newest first)."""
+    import server
+    from tiering import compact_animation
+
+    monkeypatch.setattr(server, "STREAM_BATCH_SIZE", 2)
+    token, user_id = register()
+    hot = []
+    for title in ("c", "d", "e"):
+        response = api.post(f"/api/animations?token={token}",
+                            json={"title": title, "css_code": CSS, "category": "Fade", "shape_type": "square"})
+        hot.append(response.json()["id"])
+    long_ago = datetime.now(timezone.utc) - timedelta(days=400)
+    archived = [
+        compact_animation({
+            "id": f"archived-{user_id}-{i}", "title": f"archived {i}", "css_code": CSS, "category": "Fade",
+            "shape_type": "square", "user_id": user_id, "username": "someone",
+            "created_at": (long_ago - timedelta(days=i)).isoformat(),
+        }, long_ago.isoformat())
+        for i in range(2)
+    ]
+    api.portal.call(server.db.animations_archive.insert_many, archived)
+    return user_id, hot[::-1] + [doc["id"] for doc in archived]
+
+
+def test_stream_spans_batches_and_tiers(api, catalogue):
+    user_id, ids = catalogue
+
+    array = api.get(f"/api/users/{user_id}/animations?stream=true")
+    lines = api.get(f"/api/users/{user_id}/animations", headers={"Accept": NDJSON_MEDIA_TYPE})
+
+    assert array.headers["content-type"] == "application/json"
+    assert [anim["id"] for anim in json.loads(array.content)] == ids
+    assert lines.headers["content-type"] == NDJSON_MEDIA_TYPE
+    assert [json.loads(line)["id"] for line in lines.content.splitlines()] == ids
+
+
+def test_stream_matches_the_buffered_listing(api, catalogue):
+    user_id, _ = catalogue
+
+    streamed = api.get(f"/api/users/{user_id}/animations?stream=true").json()
+
+    assert streamed == api.get(f"/api/users/{user_id}/animations").json()
+
+
+def test_listings_past_the_cap_are_streamed_in_full(api, catalogue, monkeypatch):
+    import server
+
+    user_id, ids = catalogue
+    monkeypatch.setattr(server, "MAX_USER_ANIMATIONS", 3)
+
+    response = api.get(f"/api/users/{user_id}/animations")
+
+    assert [anim["id"] for anim in response.json()] == ids
@@ -0,0 +1,123 @@
+"""Hot/cold tiering: merged paging, conditional archival and restore."""
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+pytest.importorskip("mongomock_motor")
+from mongomock_motor import AsyncMongoMockClient  # noqa: E402
+
+from tiering import ArchiveTier, compact_animation  # noqa: E402
+
+NOW = datetime(2026, 10, 1, tzinfo=timezone.utc)
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+def animation(name: str, days_old: int, likes=(), category="Fade") -> dict:
+    return {
+        "id": name, "title": name, "css_code": f".{name} {{}}", "category": category, "shape_type": "cube",
+        "user_id": "u1", "username": "u1", "created_at": (NOW - timedelta(days=days_old)).isoformat(),
+        "likes": list(likes),
+    }
+
+
+@pytest.fixture
+def tier():
+    db = AsyncMongoMockClient()["tiering_test"]
+    tier = ArchiveTier(db)
+    run(tier.ensure_indexes())
+    # Hot: new posts plus an old one kept hot by its likes; archive: old posts around it
+    run(db.animations.insert_many([
+        animation("new1", 1), animation("new2", 2), animation("new3", 3),
+        animation("popular", 250, likes=[f"u{i}" for i in range(10)]),
+    ]))
+    run(db.animations_archive.insert_many([
+        compact_animation(animation(name, days), NOW.isoformat())
+        for name, days in (("old1", 200), ("old2", 300), ("old3", 400))
+    ]))
+    return tier
+
+
+ORDER = ["new1", "new2", "new3", "old1", "popular", "old2", "old3"]
+
+
+def ids(docs) -> list:
+    return [doc["id"] for doc in docs]
+
+
+@pytest.mark.parametrize("skip, limit", [(0, 2), (0, 7), (2, 3), (3, 2), (4, 3), (6, 5), (8, 2)])
+def test_pages_interleave_both_tiers_by_created_at(tier, skip, limit):
+    page = run(tier.find_page({}, skip, limit, {"_id": 0}))
+    assert ids(page) == ORDER[skip:skip + limit]
+    assert all(doc.get("archived") for doc in page if doc["id"].startswith("old"))
+
+
+def test_batches_interleave_both_tiers(tier):
+    async def collect():
+        return [ids(batch) async for batch in tier.iter_batches({"user_id": "u1"}, batch_size=3)]
+
+    assert run(collect()) == [ORDER[0:3], ORDER[3:6], ORDER[6:]]
+
+
+def test_archival_skips_animations_liked_since_they_were_read(tier):
+    db = tier.db
+    run(db.animations.insert_many([animation("quiet", 365), animation("liked", 365)]))
+    batch = [compact_animation(anim, NOW.isoformat())
+             for anim in run(db.animations.find({"id": {"$in": ["quiet", "liked"]}}, {"_id": 0}).to_list(None))]
+    run(db.animations.update_one({"id": "liked"}, {"$addToSet": {"likes": "u9"}}))
+
+    assert run(tier._move(batch, dry_run=False)) == 1
+    assert run(db.animations.find_one({"id": "liked"})) is not None
+    assert run(db.animations_archive.find_one({"id": "liked"})) is None
+    assert run(db.animations_archive.find_one({"id": "quiet"})) is not None
+
+
+def test_run_archives_old_unpopular_animations(tier):
+    report = run(tier.run(age_days=180, max_likes=5))
+    assert report["moved"] == 0  # popular has 10 likes, the rest are recent
+    run(tier.db.animations.insert_one(animation("stale", 365, likes=["u2"])))
+    assert run(tier.run(age_days=180, max_likes=5))["moved"] == 1
+    assert ids(run(tier.find_by_ids(["stale"])))[0] == "stale"
+
+
+def test_restore_moves_an_animation_back_with_its_likes(tier):
+    run(tier.db.animations_archive.insert_one(compact_animation(animation("liked-old", 365, likes=["u2"]), "x")))
+    restored = run(tier.restore("liked-old"))
+    assert restored["likes"] == ["u2"]
+    assert restored["bucket"] == restored["created_at"][:7]
+    hot = run(tier.db.animations.find_one({"id": "liked-old"}, {"_id": 0}))
+    assert hot["css_code"] == ".liked-old {}" and "archived" not in hot
+    assert run(tier.find_by_ids(["liked-old"])) == []
+    assert run(tier.restore("missing")) is None
+
+
+def test_a_copy_in_both_tiers_is_returned_once(tier):
+    # The hot copy of old2 was re-created with a newer created_at
+    run(tier.db.animations.insert_one(animation("old2", 5)))
+    page = run(tier.find_page({}, 0, 10, {"_id": 0}))
+    assert ids(page) == ["new1", "new2", "new3", "old2", "old1", "popular", "old3"]
+    assert not page[3].get("archived")
+
+
+def test_restore_keeps_the_hot_copy(tier):
+    run(tier.db.animations.create_index("id", unique=True))
+    run(tier.db.animations.insert_one(animation("old1", 5, likes=["u3"])))
+    restored = run(tier.restore("old1"))
+    assert restored["likes"] == ["u3"]
+    assert run(tier.db.animations.count_documents({"id": "old1"})) == 1
+    assert run(tier.find_by_ids(["old1"])) == []
+
+
+def test_archived_seed_animations_are_not_seeded_again():
+    from seed_animations import animations as seeds, ensure_seed_data
+
+    db = AsyncMongoMockClient()["tiering_seed_test"]
+    tier = ArchiveTier(db)
+    run(tier.ensure_indexes())
+    assert run(ensure_seed_data(db)) == len(seeds)
+    assert run(tier.run(age_days=0))["moved"] == len(seeds)
+    assert run(ensure_seed_data(db)) == 0
+    assert run(db.animations.count_documents({})) == 0
@@ -0,0 +1,93 @@
+"""Trending scores: decay across epochs and unlikes that take back their like."""
+import asyncio
+
+import pytest
+
+pytest.importorskip("mongomock_motor")
+from mongomock_motor import AsyncMongoMockClient  # noqa: E402
+
+import trending  # noqa: E402
+from trending import HALF_LIVES, TrendingEngine, current_epoch, event_weight, rescale  # noqa: E402
+
+DAY = 24 * 3600
+# Just after a "week" epoch boundary, so adding days stays within one epoch
+START = current_epoch("week", 1.8e9) + 3600
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = {"t": START}
+    monkeypatch.setattr(trending.time, "time", lambda: now["t"])
+    return now
+
+
+@pytest.fixture
+def engine():
+    engine = TrendingEngine(AsyncMongoMockClient()["trending_test"])
+    run(engine.ensure_indexes())
+    return engine
+
+
+async def scores(engine, animation_id="a") -> dict:
+    docs = await engine.rankings.find({"animation_id": animation_id}).to_list(None)
+    return {doc["window"]: doc["score"] for doc in docs}
+
+
+def test_rescale_matches_scoring_in_the_later_epoch():
+    at = START + DAY
+    old, new = current_epoch("week", START), current_epoch("week", START) + 16 * HALF_LIVES["week"]
+    assert rescale("week", event_weight("week", at, old), old, new) == pytest.approx(event_weight("week", at, new))
+    assert rescale("all", 5.0, 0, 0) == 5.0
+
+
+def test_unlike_takes_back_what_its_like_added(clock, engine):
+    run(engine.record_likes("a", "Fade", liked_by=["early"]))
+    clock["t"] += 2 * DAY
+    run(engine.record_likes("a", "Fade", liked_by=["late"]))
+    clock["t"] += DAY
+    run(engine.record_likes("a", "Fade", unliked_by=["early"]))
+
+    epoch = current_epoch("week", clock["t"])
+    result = run(scores(engine))
+    assert result["week"] == pytest.approx(event_weight("week", START + 2 * DAY, epoch))
+    assert result["all"] == 1.0
+    assert run(engine.like_times.count_documents({})) == 1
+
+
+def test_unlike_without_a_like_time_only_leaves_all(clock, engine):
+    run(engine.record_likes("a", "Fade", liked_by=["u1"]))
+    run(engine.like_times.delete_many({}))
+    before = run(scores(engine))
+    run(engine.record_likes("a", "Fade", unliked_by=["u1"]))
+    after = run(scores(engine))
+    assert after["week"] == pytest.approx(before["week"])
+    assert after["all"] == 0
+
+
+def test_top_rescales_documents_left_in_an_older_epoch(clock, engine):
+    epoch = current_epoch("week", clock["t"])
+    stale = epoch - 16 * HALF_LIVES["week"]
+    # Equal raw scores, but the stale one is worth 2 ** -16 of the current one
+    run(engine.rankings.insert_many([
+        {"animation_id": "stale", "window": "week", "category": "Fade", "score": 10.0, "epoch": stale},
+        {"animation_id": "current", "window": "week", "category": "Fade", "score": 1.0, "epoch": epoch},
+    ]))
+    ranked = run(engine.top("week"))
+    assert [animation_id for animation_id, _ in ranked] == ["current", "stale"]
+    assert ranked[1][1] == pytest.approx(10.0 / 2 ** 16)
+    assert run(engine.top("week", limit=1, skip=1)) == ranked[1:]
+
+
+def test_compact_agrees_with_rescaling_on_read(clock, engine):
+    epoch = current_epoch("week", clock["t"])
+    run(engine.rankings.insert_one(
+        {"animation_id": "a", "window": "week", "category": "Fade", "score": 1e6, "epoch": epoch - 16 * DAY}
+    ))
+    before = run(engine.top("week"))
+    run(engine.compact())
+    assert run(engine.rankings.distinct("epoch", {"window": "week"})) == [epoch]
+    assert run(engine.top("week"))[0][1] == pytest.approx(before[0][1])